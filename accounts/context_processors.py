@@ -1,34 +1,5 @@
-from allauth.socialaccount.models import SocialAccount
 from django.apps import apps
-
-def is_google_user(user):
-    """
-    Check if a user registered via Google
-    Returns True if user registered with Google, False otherwise
-    """
-    if not user or user.is_anonymous:
-        return False
-    return SocialAccount.objects.filter(user=user, provider='google').exists()
-
-def get_social_provider(user):
-    """
-    Get the social provider name for a user
-    Returns provider name (e.g., 'google', 'github') or None if not social user
-    """
-    if not user or user.is_anonymous:
-        return None
-    social_account = SocialAccount.objects.filter(user=user).first()
-    return social_account.provider if social_account else None
-
-def get_user_registration_method(user):
-    """
-    Get the registration method for a user
-    Returns 'google', 'github', 'email', or None
-    """
-    if not user or user.is_anonymous:
-        return None
-    social_account = SocialAccount.objects.filter(user=user).first()
-    return social_account.provider if social_account else 'email'
+from .utils import is_google_user, get_social_provider, get_user_registration_method
 
 def user_registration_info(request):
     """
@@ -39,31 +10,16 @@ def user_registration_info(request):
     
     # Safely check if user is authenticated
     if hasattr(request, 'user') and request.user is not None and request.user.is_authenticated:
-        try:
-            # Check if SocialAccount model is available
-            if apps.is_installed('allauth.socialaccount'):
-                from allauth.socialaccount.models import SocialAccount
-                
-                user = request.user
-                
-                # Check if Google user
-                is_google = SocialAccount.objects.filter(user=user, provider='google').exists()
-                context['is_google_user'] = is_google
-                
-                # Get social provider
-                social_account = SocialAccount.objects.filter(user=user).first()
-                context['social_provider'] = social_account.provider if social_account else None
-                
-                # Get registration method
-                context['registration_method'] = social_account.provider if social_account else 'email'
-            else:
-                # Fallback if allauth is not available
-                context['is_google_user'] = False
-                context['social_provider'] = None
-                context['registration_method'] = 'email'
-                
-        except ImportError:
-            # Handle case where allauth is not properly installed
+        # Check if SocialAccount model is available
+        if apps.is_installed('allauth.socialaccount'):
+            user = request.user
+            
+            # All three values come from one memoized provider lookup
+            context['is_google_user'] = is_google_user(user)
+            context['social_provider'] = get_social_provider(user)
+            context['registration_method'] = get_user_registration_method(user)
+        else:
+            # Fallback if allauth is not available
             context['is_google_user'] = False
             context['social_provider'] = None
             context['registration_method'] = 'email'
@@ -73,4 +29,4 @@ def user_registration_info(request):
         context['social_provider'] = None
         context['registration_method'] = None
     
-    return context
\ No newline at end of file
+    return context
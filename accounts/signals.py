@@ -1,10 +1,12 @@
 # accounts/signals.py
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_save, post_delete
 from django.contrib.auth.models import User
 from allauth.account.models import EmailAddress
+from allauth.socialaccount.models import SocialAccount
 from django.contrib.auth.signals import user_logged_in
 from django.contrib import messages
+from .utils import invalidate_social_providers
 
 @receiver(user_logged_in)
 def user_logged_in_callback(sender, request, user, **kwargs):
@@ -16,4 +18,10 @@ def user_logged_in_callback(sender, request, user, **kwargs):
 @receiver(pre_delete, sender=User)
 def delete_allauth_email_addresses(sender, instance, **kwargs):
     """Delete AllAuth email addresses when a user is deleted"""
-    EmailAddress.objects.filter(user=instance).delete()
\ No newline at end of file
+    EmailAddress.objects.filter(user=instance).delete()
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def invalidate_social_provider_cache(sender, instance, **kwargs):
+    """Drop the cached social providers when a user's social accounts change"""
+    invalidate_social_providers(instance.user_id)
@@ -1,5 +1,5 @@
 from django import template
-from allauth.socialaccount.models import SocialAccount
+from accounts.utils import get_social_provider, is_google_user as user_is_google
 
 register = template.Library()
 
@@ -9,9 +9,7 @@ def is_google_user(user):
     Template filter to check if user is a Google user
     Usage: {% if user|is_google_user %}
     """
-    if not user or user.is_anonymous:
-        return False
-    return SocialAccount.objects.filter(user=user, provider='google').exists()
+    return user_is_google(user)
 
 @register.filter
 def social_provider(user):
@@ -19,10 +17,7 @@ def social_provider(user):
     Template filter to get social provider
     Usage: {{ user|social_provider }}
     """
-    if not user or user.is_anonymous:
-        return 'email'
-    social_account = SocialAccount.objects.filter(user=user).first()
-    return social_account.provider if social_account else 'email'
+    return get_social_provider(user) or 'email'
 
 @register.simple_tag
 def get_registration_badge(user):
@@ -33,10 +28,9 @@ def get_registration_badge(user):
     if not user or user.is_anonymous:
         return ''
     
-    social_account = SocialAccount.objects.filter(user=user).first()
+    provider = get_social_provider(user)
     
-    if social_account:
-        provider = social_account.provider
+    if provider:
         if provider == 'google':
             return '<span class="badge bg-danger">Google</span>'
         elif provider == 'github':
@@ -44,4 +38,4 @@ def get_registration_badge(user):
         else:
             return f'<span class="badge bg-info">{provider.title()}</span>'
     else:
-        return '<span class="badge bg-primary">Email</span>'
\ No newline at end of file
+        return '<span class="badge bg-primary">Email</span>'
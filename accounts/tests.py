@@ -1,3 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from allauth.socialaccount.models import SocialAccount
 
-# Create your tests here.
+from .utils import get_social_provider, get_user_registration_method, is_google_user
+
+
+class SocialProviderCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='social', password='pass')
+
+    def fresh_user(self):
+        # A new instance per "request", like request.user
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_lookup_is_memoized_and_cached(self):
+        SocialAccount.objects.create(user=self.user, provider='google', uid='1')
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_google_user(user))
+            self.assertEqual(get_social_provider(user), 'google')
+            self.assertEqual(get_user_registration_method(user), 'google')
+        next_request_user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_google_user(next_request_user))
+
+    def test_cache_is_invalidated_on_social_account_change(self):
+        self.assertEqual(get_user_registration_method(self.fresh_user()), 'email')
+        SocialAccount.objects.create(user=self.user, provider='github', uid='2')
+        self.assertEqual(get_user_registration_method(self.fresh_user()), 'github')
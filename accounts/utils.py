@@ -1,23 +1,54 @@
+from django.core.cache import cache
 from allauth.socialaccount.models import SocialAccount
 
+# Cross-request cache of each user's social providers, cleared by the
+# SocialAccount save/delete signals in accounts.signals. The clear reaches
+# every worker through the shared Redis cache configured in settings; with
+# a per-process cache other workers would serve the old providers for up
+# to SOCIAL_PROVIDERS_CACHE_TIMEOUT seconds
+SOCIAL_PROVIDERS_CACHE_KEY = 'accounts:social_providers:{}'
+SOCIAL_PROVIDERS_CACHE_TIMEOUT = 300
+
+def get_social_providers(user):
+    """
+    Get the providers of a user's social accounts, oldest first
+    Memoized on the user object for the rest of the request and cached
+    across requests, so a page render does at most one query
+    """
+    if not user or user.is_anonymous:
+        return []
+    providers = getattr(user, '_social_providers', None)
+    if providers is None:
+        cache_key = SOCIAL_PROVIDERS_CACHE_KEY.format(user.pk)
+        providers = cache.get(cache_key)
+        if providers is None:
+            providers = list(
+                SocialAccount.objects.filter(user=user).order_by('pk').values_list('provider', flat=True)
+            )
+            cache.set(cache_key, providers, SOCIAL_PROVIDERS_CACHE_TIMEOUT)
+        user._social_providers = providers
+    return providers
+
+def invalidate_social_providers(user_id):
+    """
+    Drop the cached social providers for a user
+    """
+    cache.delete(SOCIAL_PROVIDERS_CACHE_KEY.format(user_id))
+
 def is_google_user(user):
     """
     Check if a user registered via Google
     Returns True if user registered with Google, False otherwise
     """
-    if not user or user.is_anonymous:
-        return False
-    return SocialAccount.objects.filter(user=user, provider='google').exists()
+    return 'google' in get_social_providers(user)
 
 def get_social_provider(user):
     """
     Get the social provider name for a user
     Returns provider name (e.g., 'google', 'github') or None if not social user
     """
-    if not user or user.is_anonymous:
-        return None
-    social_account = SocialAccount.objects.filter(user=user).first()
-    return social_account.provider if social_account else None
+    providers = get_social_providers(user)
+    return providers[0] if providers else None
 
 def get_user_registration_method(user):
     """
@@ -26,5 +57,4 @@ def get_user_registration_method(user):
     """
     if not user or user.is_anonymous:
         return None
-    social_account = SocialAccount.objects.filter(user=user).first()
-    return social_account.provider if social_account else 'email'
\ No newline at end of file
+    return get_social_provider(user) or 'email'
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Event, EventAdmin, EventUser
+from .models import Event, EventAdmin, EventRoute, EventUser
 
 @admin.register(Event)
 class EventAdminPanel(admin.ModelAdmin):
@@ -64,6 +64,12 @@ class EventAdminPanel(admin.ModelAdmin):
                 'Location'
             )
         }),
+        ('Timing', {
+            'fields': (
+                'StartLine',
+                'FinishLine'
+            )
+        }),
         ('Files & Limits', {
             'fields': (
                 'GpxFile', 
@@ -403,6 +409,41 @@ class EventParticipantAdmin(admin.ModelAdmin):
     reset_participation.short_description = "Reset participation data"
 
 
+@admin.register(EventRoute)
+class EventRouteAdmin(admin.ModelAdmin):
+    list_display = [
+        'EventId',
+        'SourceName',
+        'PointCount',
+        'DistanceMeters',
+        'ElevationGain',
+        'ParsedTimestamp'
+    ]
+    
+    search_fields = [
+        'EventId__EventName',
+        'SourceName'
+    ]
+    
+    # The packed arrays are not editable by hand
+    exclude = ['Coordinates', 'Elevations']
+    
+    readonly_fields = [
+        'EventId',
+        'SourceName',
+        'PointCount',
+        'DistanceMeters',
+        'ElevationGain',
+        'MinLatitude',
+        'MinLongitude',
+        'MaxLatitude',
+        'MaxLongitude',
+        'ParsedTimestamp'
+    ]
+    
+    list_per_page = 25
+
+
 # Optional: Custom admin site header and title
 admin.site.site_header = "GEOStar Events Administration"
 admin.site.site_title = "GEOStar Events Admin"
@@ -7,6 +7,8 @@ from . import views
 app_name = 'events-api'
 
 urlpatterns = [
+    path('<int:event_id>/leaderboard/', views.EventLeaderboardView.as_view(), name='event-leaderboard'),
+    path('<int:event_id>/export/<str:export_format>/', views.EventTrackExportView.as_view(), name='event-export'),
     # path('events/', api_views.EventListCreate.as_view(), name='event-list'),
     # # ... API routes
 ]
\ No newline at end of file
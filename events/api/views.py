@@ -0,0 +1,65 @@
+# events/api/views.py
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from gpsinfo.services.export_services import EXPORT_FORMATS, export_track
+from gpsinfo.views import parse_time_window, streaming_export
+
+from ..models import Event, EventUser
+from ..services.leaderboard_services import get_leaderboard
+
+# Largest ranking returned by one leaderboard request
+MAX_LEADERBOARD_ROWS = 1000
+
+
+class EventLeaderboardView(APIView):
+    """
+    Live ranking of an ongoing event by distance covered along its GPX
+    course. Optional ?limit= (default 100). Updates are also pushed on
+    ws/events/<event_id>/leaderboard/.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, event_id):
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= MAX_LEADERBOARD_ROWS:
+            return Response({"error": f"limit must be between 1 and {MAX_LEADERBOARD_ROWS}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ranking = get_leaderboard(event_id, limit)
+        if ranking is None:
+            return Response({"error": "No live leaderboard for this event"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"event": event_id, "ranking": ranking}, status=status.HTTP_200_OK)
+
+
+class EventTrackExportView(APIView):
+    """
+    Download every participant's track during an event as GPX, CSV or
+    GeoJSON, streamed as it is read. Only the event's admins and staff may
+    export. Defaults to the event's start and end time; optional ?since= /
+    ?until= ISO 8601 bounds replace them.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, event_id, export_format):
+        if export_format not in EXPORT_FORMATS:
+            return Response({"error": f"Format must be one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_404_NOT_FOUND)
+        event = get_object_or_404(Event, pk=event_id)
+        user = request.user
+        if not (user.is_staff or event.AdminUser_id == user.pk or event.additional_admins.filter(UserId=user).exists()):
+            return Response({"error": "Only the event's admins can export its tracks"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            since, until = parse_time_window(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        since = since or event.StartTimestamp
+        until = until or event.EndTimestamp
+
+        user_ids = list(EventUser.objects.filter(EventId=event).values_list('UserId_id', flat=True))
+        chunks = export_track(export_format, user_ids, since, until)
+        return streaming_export(chunks, export_format, f'event-{event.pk}-tracks')
@@ -0,0 +1,33 @@
+# events/consumers.py
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .services.leaderboard_services import LEADERBOARD_SNAPSHOT_SIZE, get_leaderboard, leaderboard_group_name
+
+
+class LeaderboardConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live leaderboard of one event at ``ws/events/<event_id>/leaderboard/``.
+    Sends the current top of the ranking on connect, then one update per
+    participant who moves forward along the course.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        event_id = self.scope['url_route']['kwargs']['event_id']
+        self.group_name = leaderboard_group_name(event_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        ranking = await database_sync_to_async(get_leaderboard)(event_id, LEADERBOARD_SNAPSHOT_SIZE)
+        await self.send_json({'type': 'snapshot', 'ranking': ranking or []})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def leaderboard_update(self, event):
+        await self.send_json({'type': 'update', 'entry': event['entry']})
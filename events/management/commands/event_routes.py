@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+from events.services.route_services import build_event_route
+
+
+class Command(BaseCommand):
+    help = "Parse events' GPX courses into stored routes and update their distance and elevation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Events to parse (default: every event with a GPX file)')
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only parse events whose current GPX file has no stored route yet',
+        )
+
+    def handle(self, *args, **options):
+        events = Event.objects.exclude(GpxFile='').exclude(GpxFile__isnull=True).select_related('route')
+        if options['event_ids']:
+            events = events.filter(pk__in=options['event_ids'])
+            missing = set(options['event_ids']) - set(events.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f"No event with a GPX file: {', '.join(map(str, sorted(missing)))}")
+
+        parsed = 0
+        for event in events.order_by('pk'):
+            route = getattr(event, 'route', None)
+            if options['missing'] and route is not None and route.SourceName == event.GpxFile.name:
+                continue
+            try:
+                route = build_event_route(event)
+            except Exception as exc:
+                self.stderr.write(f'Event {event.pk}: cannot parse {event.GpxFile.name}: {exc}')
+                continue
+            parsed += 1
+            self.stdout.write(
+                f'Event {event.pk}: {route.PointCount} points, '
+                f'{event.Distance} km, {event.Elevation} m gain'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Parsed {parsed} event routes'))
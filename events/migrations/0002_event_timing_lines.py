@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='FinishLine',
+            field=models.JSONField(blank=True, help_text='Finish gate as [[lat, lon], [lat, lon]] (defaults to the start line for loop courses)', null=True, verbose_name='Finish Line'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='StartLine',
+            field=models.JSONField(blank=True, help_text="Start gate as [[lat, lon], [lat, lon]]; crossing it starts a participant's clock", null=True, verbose_name='Start Line'),
+        ),
+    ]
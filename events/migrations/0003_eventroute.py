@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_timing_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRoute',
+            fields=[
+                ('EventId', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='route', serialize=False, to='events.event', verbose_name='Event')),
+                ('SourceName', models.CharField(help_text='Name of the GpxFile the route was parsed from', max_length=255, verbose_name='Source GPX File')),
+                ('PointCount', models.PositiveIntegerField(default=0, verbose_name='Point Count')),
+                ('Coordinates', models.BinaryField(verbose_name='Packed Coordinates')),
+                ('Elevations', models.BinaryField(verbose_name='Packed Elevations')),
+                ('DistanceMeters', models.FloatField(default=0, verbose_name='Distance (m)')),
+                ('ElevationGain', models.FloatField(default=0, verbose_name='Elevation Gain (m)')),
+                ('MinLatitude', models.FloatField(blank=True, null=True)),
+                ('MinLongitude', models.FloatField(blank=True, null=True)),
+                ('MaxLatitude', models.FloatField(blank=True, null=True)),
+                ('MaxLongitude', models.FloatField(blank=True, null=True)),
+                ('ParsedTimestamp', models.DateTimeField(auto_now=True, verbose_name='Parsed Timestamp')),
+            ],
+            options={
+                'verbose_name': 'Event Route',
+                'verbose_name_plural': 'Event Routes',
+            },
+        ),
+    ]
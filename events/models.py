@@ -128,6 +128,21 @@ class Event(models.Model):
         help_text="Specific location or venue of the event"
     )
     
+    # Timing gates, each [[lat, lon], [lat, lon]]
+    StartLine = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Start Line",
+        help_text="Start gate as [[lat, lon], [lat, lon]]; crossing it starts a participant's clock"
+    )
+    
+    FinishLine = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name="Finish Line",
+        help_text="Finish gate as [[lat, lon], [lat, lon]] (defaults to the start line for loop courses)"
+    )
+    
     class Meta:
         verbose_name = "Event"
         verbose_name_plural = "Events"
@@ -338,4 +353,60 @@ class EventUser(models.Model):
         # Update event enrollment count on deletion
         self.EventId.Enrolled -= 1
         self.EventId.save()
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        super().delete(*args, **kwargs)
+
+class EventRoute(models.Model):
+    """
+    An event's GPX course parsed into packed arrays, with the distance,
+    elevation gain and bounding box computed from it
+    """
+    EventId = models.OneToOneField(
+        Event,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='route',
+        verbose_name="Event"
+    )
+    
+    SourceName = models.CharField(
+        max_length=255,
+        verbose_name="Source GPX File",
+        help_text="Name of the GpxFile the route was parsed from"
+    )
+    
+    PointCount = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Point Count"
+    )
+    
+    # zlib-compressed little-endian arrays: int32 (lat, lon) pairs in
+    # microdegrees, and float32 elevations in metres (NaN when missing)
+    Coordinates = models.BinaryField(verbose_name="Packed Coordinates")
+    Elevations = models.BinaryField(verbose_name="Packed Elevations")
+    
+    DistanceMeters = models.FloatField(
+        default=0,
+        verbose_name="Distance (m)"
+    )
+    
+    ElevationGain = models.FloatField(
+        default=0,
+        verbose_name="Elevation Gain (m)"
+    )
+    
+    MinLatitude = models.FloatField(null=True, blank=True)
+    MinLongitude = models.FloatField(null=True, blank=True)
+    MaxLatitude = models.FloatField(null=True, blank=True)
+    MaxLongitude = models.FloatField(null=True, blank=True)
+    
+    ParsedTimestamp = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Parsed Timestamp"
+    )
+    
+    class Meta:
+        verbose_name = "Event Route"
+        verbose_name_plural = "Event Routes"
+    
+    def __str__(self):
+        return f"{self.EventId.EventName} route ({self.PointCount} points)"
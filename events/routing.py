@@ -0,0 +1,8 @@
+# events/routing.py
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/events/<int:event_id>/leaderboard/', consumers.LeaderboardConsumer.as_asgi()),
+]
@@ -0,0 +1,228 @@
+# events/services/leaderboard_services.py
+"""
+Live event leaderboards ranked by distance covered along the course.
+
+Each process keeps, for every ongoing event with a GPX course, a sorted
+ranking that is updated in place as fixes arrive: a fix is projected onto
+the course near the participant's last matched segment, and the
+participant is moved in the ranking with two bisections. Progress never
+goes backwards, so GPS noise and doubling back do not cost places.
+
+Progress is written to EventUser.DistanceCompleted through the batched
+timing buffer, and a process reseeds its rankings from those rows every
+EVENT_TIMING_REGISTRY_TTL seconds, so fixes handled by other workers show
+up within a flush and a reload. Changes are pushed to the event's
+WebSocket group as they happen.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Event, EventUser
+from .route_services import load_route
+from .timing_services import timing_options
+
+logger = logging.getLogger(__name__)
+
+
+# Rows sent to a WebSocket viewer when it connects
+LEADERBOARD_SNAPSHOT_SIZE = 100
+
+
+def leaderboard_group_name(event_id):
+    return f'events.leaderboard.{event_id}'
+
+
+class Leaderboard:
+    """
+    Participants of one event, ordered by distance along the course.
+    """
+
+    def __init__(self, event_id, route):
+        self.event_id = event_id
+        self.route = route
+        self.entries = []
+        self.progress = {}
+
+    def add(self, user_id, username, event_user_pk, distance_m):
+        self.progress[user_id] = {
+            'username': username, 'event_user': event_user_pk,
+            'distance_m': distance_m, 'segment': None, 'updated_at': None,
+        }
+        insort(self.entries, (-distance_m, user_id))
+
+    def advance(self, user_id, fixes, max_offset_m):
+        """
+        Project (fix_time, lat, lon) tuples, oldest first, onto the course.
+        Returns the participant's progress when it moved forward, else None.
+        """
+        progress = self.progress[user_id]
+        best = progress['distance_m']
+        for fix_time, lat, lon in fixes:
+            match = self.route.project(lat, lon, hint=progress['segment'], max_offset_m=max_offset_m)
+            if match is None or match[1] > max_offset_m:
+                continue
+            progress['segment'] = match[2]
+            if match[0] > best:
+                best = match[0]
+                progress['updated_at'] = fix_time
+        if best <= progress['distance_m']:
+            return None
+
+        del self.entries[bisect_left(self.entries, (-progress['distance_m'], user_id))]
+        insort(self.entries, (-best, user_id))
+        progress['distance_m'] = best
+        return progress
+
+    def rank(self, user_id):
+        return bisect_left(self.entries, (-self.progress[user_id]['distance_m'], user_id)) + 1
+
+    def ranking(self, limit=None):
+        rows = []
+        for position, (_, user_id) in enumerate(self.entries[:limit], start=1):
+            progress = self.progress[user_id]
+            rows.append({
+                'rank': position,
+                'user_id': user_id,
+                'username': progress['username'],
+                'distance_m': round(progress['distance_m'], 1),
+                'updated_at': progress['updated_at'].isoformat() if progress['updated_at'] else None,
+            })
+        return rows
+
+
+class LeaderboardRegistry:
+    """
+    This process's leaderboards of ongoing events, reloaded periodically.
+    """
+
+    def __init__(self):
+        self._boards = {}
+        self._events_by_user = {}
+        self._loaded_at = None
+        # Guards loading and every change to the rankings
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        registry_ttl = timing_options()[0]
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > registry_ttl:
+            with self.lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > registry_ttl:
+                    self._load()
+                    self._loaded_at = time.monotonic()
+
+    def _load(self):
+        now = timezone.now()
+        events = Event.objects.filter(
+            Q(Active=True) | Q(StartTimestamp__lte=now, EndTimestamp__gte=now)
+        ).exclude(GpxFile='').exclude(GpxFile__isnull=True)
+        boards = {}
+        for event in events:
+            try:
+                route = load_route(event)
+            except Exception:
+                logger.exception("Cannot read the course of event %s", event.pk)
+                continue
+            if route is not None:
+                boards[event.pk] = Leaderboard(event.pk, route)
+
+        events_by_user = {}
+        participants = EventUser.objects.filter(EventId__in=list(boards)).select_related('UserId')
+        for participant in participants:
+            board = boards[participant.EventId_id]
+            user_id = participant.UserId_id
+            distance_m = float(participant.DistanceCompleted) * 1000
+            previous = self._boards.get(board.event_id)
+            local = previous.progress.get(user_id) if previous is not None else None
+            if local:
+                distance_m = max(distance_m, local['distance_m'])
+            board.add(user_id, participant.UserId.username, participant.pk, distance_m)
+            if local:
+                # Keep this process's segment hint for the next projection
+                board.progress[user_id]['segment'] = local['segment']
+                board.progress[user_id]['updated_at'] = local['updated_at']
+            events_by_user.setdefault(user_id, []).append(board.event_id)
+        self._boards = boards
+        self._events_by_user = events_by_user
+
+    def boards_for_user(self, user_id):
+        self._ensure_loaded()
+        return [self._boards[event_id] for event_id in self._events_by_user.get(user_id, ())]
+
+    def board(self, event_id):
+        self._ensure_loaded()
+        return self._boards.get(event_id)
+
+
+def update_leaderboards(user, locations):
+    """
+    Advance the user on the leaderboards of the events they are in.
+    Returns (event_user_updates, messages): DistanceCompleted changes for
+    the timing buffer and one push message per leaderboard that changed.
+    """
+    boards = leaderboard_registry.boards_for_user(user.pk)
+    if not boards:
+        return {}, []
+
+    max_offset_m = getattr(settings, 'EVENT_ROUTE_MAX_OFFSET_M', 200)
+    fixes = sorted((location.fix_time, location.latitude, location.longitude) for location in locations)
+    updates = {}
+    messages = []
+    with leaderboard_registry.lock:
+        for board in boards:
+            progress = board.advance(user.pk, fixes, max_offset_m)
+            if progress is None:
+                continue
+            updates[progress['event_user']] = {
+                'DistanceCompleted': (Decimal(progress['distance_m']) / 1000).quantize(Decimal('0.01')),
+            }
+            messages.append((board.event_id, {
+                'rank': board.rank(user.pk),
+                'user_id': user.pk,
+                'username': progress['username'],
+                'distance_m': round(progress['distance_m'], 1),
+                'updated_at': progress['updated_at'].isoformat(),
+            }))
+    return updates, messages
+
+
+def get_leaderboard(event_id, limit=None):
+    """
+    Current ranking of an ongoing event, or None when it has no live board.
+    """
+    board = leaderboard_registry.board(event_id)
+    if board is None:
+        return None
+    with leaderboard_registry.lock:
+        return board.ranking(limit)
+
+
+def broadcast_progress(messages):
+    """
+    Push participants' new positions to each event's leaderboard viewers.
+    A broken channel layer is logged and never fails the ingest request.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        for event_id, entry in messages:
+            async_to_sync(channel_layer.group_send)(
+                leaderboard_group_name(event_id), {'type': 'leaderboard.update', 'entry': entry},
+            )
+    except Exception:
+        logger.exception("Failed to broadcast leaderboard updates")
+
+
+leaderboard_registry = LeaderboardRegistry()
@@ -0,0 +1,330 @@
+# events/services/route_services.py
+"""
+Event courses parsed from Event.GpxFile.
+
+On upload the GPX is stream-parsed (iterparse, each point dropped once
+read, so memory stays bounded for large files) into packed coordinate and
+elevation arrays stored as an EventRoute, and the event's Distance and
+Elevation are filled in from it. Route-dependent features then load the
+packed arrays, never the XML.
+
+A Route keeps, per segment, its start point, its offset in metres in a
+flat projection around that point and the distance along the course at
+its start, so projecting a fix onto a segment is a few multiplications.
+Its SegmentIndex, a uniform grid of ROUTE_GRID_CELL_M cells listing the
+segments that pass through each, finds the nearest segment by searching
+outwards from the fix's cell instead of scanning the whole course.
+The GPX is parsed into an EventRoute once per upload, and load_route
+caches the Route built from it per process, keyed on the EventRoute's
+ParsedTimestamp so a re-parsed course is picked up by every worker.
+"""
+import math
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from gpsinfo.services.import_services import read_gpx
+from gpsinfo.utils import EARTH_RADIUS_M, haversine_m
+
+from ..models import Event, EventRoute
+
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+# Segments searched either side of a participant's last known segment
+ROUTE_SEARCH_WINDOW = 50
+
+# Side of a segment index cell in metres
+ROUTE_GRID_CELL_M = 100
+# Segments spanning more cells than this are registered along their length, not by bounding box
+MAX_SEGMENT_BBOX_CELLS = 16
+
+
+class SegmentIndex:
+    """
+    Uniform grid over the segments of a Route.
+    """
+
+    def __init__(self, route, cell_m=ROUTE_GRID_CELL_M):
+        self.route = route
+        self.cells = {}
+        self.cell_lat = cell_m / METRES_PER_DEGREE
+        # Cells are narrowest in metres at the course's highest latitude
+        widest = max((abs(lat) for lat in route.latitudes), default=0.0)
+        self.cell_lon = cell_m / (METRES_PER_DEGREE * max(math.cos(math.radians(min(widest, 89.0))), 1e-6))
+        for index in range(len(route.segments)):
+            for key in self._segment_cells(index):
+                self.cells.setdefault(key, []).append(index)
+        if self.cells:
+            rows = [row for row, _ in self.cells]
+            cols = [col for _, col in self.cells]
+            self.extent = (min(rows), min(cols), max(rows), max(cols))
+
+    def cell(self, lat, lon):
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def _segment_cells(self, index):
+        lat0, lon0 = self.route.latitudes[index], self.route.longitudes[index]
+        lat1, lon1 = self.route.latitudes[index + 1], self.route.longitudes[index + 1]
+        (row0, col0), (row1, col1) = self.cell(lat0, lon0), self.cell(lat1, lon1)
+        rows = range(min(row0, row1), max(row0, row1) + 1)
+        cols = range(min(col0, col1), max(col0, col1) + 1)
+        if len(rows) * len(cols) <= MAX_SEGMENT_BBOX_CELLS:
+            return {(row, col) for row in rows for col in cols}
+        # Sample every half cell; a sample's neighbours cover any cell the segment clips between samples
+        steps = 2 * max(len(rows), len(cols))
+        keys = set()
+        for step in range(steps + 1):
+            row, col = self.cell(lat0 + (lat1 - lat0) * step / steps, lon0 + (lon1 - lon0) * step / steps)
+            keys.update((row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+        return keys
+
+    def nearest(self, lat, lon, max_offset_m=None):
+        """
+        Nearest point of the course to a fix, as (along_m, offset_m, segment),
+        searching rings of cells outwards until no unvisited cell can hold a
+        closer segment. Returns None when nothing is within max_offset_m.
+        """
+        if not self.cells:
+            return None
+        row, col = self.cell(lat, lon)
+        # Metres covered by each ring, at the narrower of the two cell sides
+        ring_m = METRES_PER_DEGREE * min(self.cell_lat, self.cell_lon * math.cos(math.radians(lat)))
+        min_row, min_col, max_row, max_col = self.extent
+        last_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        if max_offset_m is not None:
+            last_ring = min(last_ring, math.ceil(max_offset_m / ring_m) + 1)
+
+        best = None
+        seen = set()
+        for ring in range(last_ring + 1):
+            for key in self._ring(row, col, ring):
+                for index in self.cells.get(key, ()):
+                    if index in seen:
+                        continue
+                    seen.add(index)
+                    along, offset = self.route.project_segment(index, lat, lon)
+                    if best is None or offset < best[1]:
+                        best = (along, offset, index)
+            # Cells beyond this ring are all at least ring * ring_m away
+            if best is not None and best[1] <= ring * ring_m:
+                break
+        if best is None or (max_offset_m is not None and best[1] > max_offset_m):
+            return None
+        return best
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for dc in range(-ring, ring + 1):
+            yield row - ring, col + dc
+            yield row + ring, col + dc
+        for dr in range(-ring + 1, ring):
+            yield row + dr, col - ring
+            yield row + dr, col + ring
+
+
+class Route:
+    """
+    A course polyline with cumulative distances.
+    """
+
+    def __init__(self, points):
+        self.latitudes = [lat for lat, _ in points]
+        self.longitudes = [lon for _, lon in points]
+        self.cumulative = [0.0]
+        self.segments = []
+        for (lat0, lon0), (lat1, lon1) in zip(points, points[1:]):
+            scale = math.cos(math.radians(lat0)) * METRES_PER_DEGREE
+            dx, dy = (lon1 - lon0) * scale, (lat1 - lat0) * METRES_PER_DEGREE
+            self.segments.append((lat0, lon0, scale, dx, dy, dx * dx + dy * dy))
+            self.cumulative.append(self.cumulative[-1] + haversine_m(lat0, lon0, lat1, lon1))
+        self.length_m = self.cumulative[-1]
+        self.index = SegmentIndex(self)
+
+    def project_segment(self, index, lat, lon):
+        """
+        (along_m, offset_m) of a point projected onto one segment.
+        """
+        lat0, lon0, scale, dx, dy, length2 = self.segments[index]
+        px, py = (lon - lon0) * scale, (lat - lat0) * METRES_PER_DEGREE
+        t = min(1.0, max(0.0, (px * dx + py * dy) / length2)) if length2 else 0.0
+        ox, oy = px - t * dx, py - t * dy
+        return self.cumulative[index] + t * (self.cumulative[index + 1] - self.cumulative[index]), math.hypot(ox, oy)
+
+    def project(self, lat, lon, hint=None, max_offset_m=None):
+        """
+        Nearest point of the course to a fix, as (along_m, offset_m, segment).
+        With a hint (the last segment matched), the segments just around it
+        are tried first, so a course that passes the same spot twice keeps
+        the participant on the leg they are running; otherwise, or when none
+        of those is within max_offset_m, the segment index is searched.
+        Returns None when no segment is within max_offset_m.
+        """
+        if not self.segments:
+            return None
+        if hint is not None:
+            candidates = range(max(0, hint - ROUTE_SEARCH_WINDOW), min(len(self.segments), hint + ROUTE_SEARCH_WINDOW + 1))
+            best = self._nearest(candidates, lat, lon)
+            if max_offset_m is None or best[1] <= max_offset_m:
+                return best
+        return self.index.nearest(lat, lon, max_offset_m)
+
+    def along_track(self, lat, lon, max_offset_m=None):
+        """
+        Distance along the course in metres of the point nearest a fix, or None.
+        """
+        match = self.index.nearest(lat, lon, max_offset_m)
+        return match[0] if match is not None else None
+
+    def point_at(self, distance_m):
+        """
+        (lat, lon) of the point distance_m along the course, clamped to its ends.
+        """
+        if not self.segments:
+            return (self.latitudes[0], self.longitudes[0]) if self.latitudes else None
+        index = min(max(bisect_right(self.cumulative, distance_m) - 1, 0), len(self.segments) - 1)
+        start, end = self.cumulative[index], self.cumulative[index + 1]
+        t = min(1.0, max(0.0, (distance_m - start) / (end - start))) if end > start else 0.0
+        lat0, lon0 = self.latitudes[index], self.longitudes[index]
+        return (
+            lat0 + t * (self.latitudes[index + 1] - lat0),
+            lon0 + t * (self.longitudes[index + 1] - lon0),
+        )
+
+    def _nearest(self, candidates, lat, lon):
+        best = None
+        for index in candidates:
+            along, offset = self.project_segment(index, lat, lon)
+            if best is None or offset < best[1]:
+                best = (along, offset, index)
+        return best
+
+
+def pack(values):
+    """
+    zlib-compressed little-endian bytes of an array.
+    """
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+
+def unpack(typecode, data):
+    """
+    The array packed by pack().
+    """
+    values = array(typecode)
+    values.frombytes(zlib.decompress(bytes(data)))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def parse_gpx_route(stream):
+    """
+    Stream a GPX file into packed arrays and course statistics.
+    Returns (coordinates, elevations, stats) where coordinates is an
+    array('i') of interleaved lat/lon microdegrees, elevations an
+    array('f') with NaN for points without <ele>, and stats holds the
+    distance, elevation gain and bounding box.
+    """
+    threshold = getattr(settings, 'EVENT_ROUTE_ELEVATION_THRESHOLD_M', 3)
+    coordinates = array('i')
+    elevations = array('f')
+    distance_m = gain_m = 0.0
+    elevation_ref = previous = None
+    min_lat = min_lon = math.inf
+    max_lat = max_lon = -math.inf
+    for record, _ in read_gpx(stream):
+        lat, lon = float(record['latitude']), float(record['longitude'])
+        altitude = float(record['altitude']) if record.get('altitude') not in (None, '') else None
+        coordinates.extend((round(lat * 1e6), round(lon * 1e6)))
+        elevations.append(math.nan if altitude is None else altitude)
+        if previous is not None:
+            distance_m += haversine_m(previous[0], previous[1], lat, lon)
+        previous = (lat, lon)
+        # Climb counts once it clears the noise threshold above the lowest point since the last climb
+        if altitude is not None:
+            if elevation_ref is None or altitude < elevation_ref:
+                elevation_ref = altitude
+            elif altitude - elevation_ref >= threshold:
+                gain_m += altitude - elevation_ref
+                elevation_ref = altitude
+        min_lat, max_lat = min(min_lat, lat), max(max_lat, lat)
+        min_lon, max_lon = min(min_lon, lon), max(max_lon, lon)
+
+    stats = {'distance_m': distance_m, 'elevation_gain_m': gain_m, 'bbox': None}
+    if previous is not None:
+        stats['bbox'] = (min_lat, min_lon, max_lat, max_lon)
+    return coordinates, elevations, stats
+
+
+def build_event_route(event):
+    """
+    Parse the event's GpxFile into its EventRoute and set the event's
+    Distance (km) and Elevation (m) from it. Returns the EventRoute.
+    """
+    with event.GpxFile.open('rb') as stream:
+        coordinates, elevations, stats = parse_gpx_route(stream)
+    min_lat, min_lon, max_lat, max_lon = stats['bbox'] or (None, None, None, None)
+    with transaction.atomic():
+        route, _ = EventRoute.objects.update_or_create(EventId=event, defaults={
+            'SourceName': event.GpxFile.name,
+            'PointCount': len(elevations),
+            'Coordinates': pack(coordinates),
+            'Elevations': pack(elevations),
+            'DistanceMeters': stats['distance_m'],
+            'ElevationGain': stats['elevation_gain_m'],
+            'MinLatitude': min_lat,
+            'MinLongitude': min_lon,
+            'MaxLatitude': max_lat,
+            'MaxLongitude': max_lon,
+        })
+        # update() rather than save(): saving the event would queue another parse
+        event.Distance = (Decimal(stats['distance_m']) / 1000).quantize(Decimal('0.01'))
+        event.Elevation = round(stats['elevation_gain_m'])
+        Event.objects.filter(pk=event.pk).update(Distance=event.Distance, Elevation=event.Elevation)
+    return route
+
+
+def route_points(event_route):
+    """
+    (lat, lon) tuples of a parsed EventRoute.
+    """
+    coordinates = unpack('i', event_route.Coordinates)
+    return [(coordinates[i] / 1e6, coordinates[i + 1] / 1e6) for i in range(0, len(coordinates), 2)]
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def load_route(event):
+    """
+    The event's course, or None without a GPX file. Built from the stored
+    EventRoute (parsing the GPX first if it has not been) and cached per
+    process until the route is parsed again.
+    """
+    if not event.GpxFile:
+        return None
+    parsed_at = EventRoute.objects.filter(
+        EventId=event, SourceName=event.GpxFile.name,
+    ).values_list('ParsedTimestamp', flat=True).first()
+    cached = _routes.get(event.pk)
+    if cached is not None and parsed_at is not None and cached[0] == parsed_at:
+        return cached[1]
+
+    event_route = build_event_route(event) if parsed_at is None else EventRoute.objects.get(EventId=event)
+    route = Route(route_points(event_route))
+    with _routes_lock:
+        _routes[event.pk] = (event_route.ParsedTimestamp, route)
+    return route
@@ -0,0 +1,236 @@
+# events/services/timing_services.py
+"""
+Automatic race timing from GPS start and finish line crossings.
+
+Every stored batch of fixes is checked against the timing gates of the
+events its user is running. Each process keeps a registry of unfinished
+participants in ongoing events with a start line, reloaded every
+EVENT_TIMING_REGISTRY_TTL seconds, so a fix from a user who is not racing
+costs one dict lookup. Each racer's previous fix is kept in the Django
+cache, which settings configure as one Redis store for every worker, so a
+step between two batches is checked whichever workers handled them.
+
+A crossing is timed by interpolating between the two fixes on either side
+of the gate. Re-crossing the start line restarts the clock until the
+participant finishes, and crossings before the event's scheduled start
+are ignored. The finish line (the start line on loop courses) only counts
+once EVENT_TIMING_MIN_SECONDS have passed since the start.
+
+Results are coalesced per participant and written to EventUser with one
+bulk_update per flush, every EVENT_TIMING_FLUSH_INTERVAL seconds (or
+immediately when the interval is 0), so a mass start does not turn into
+thousands of single-row updates. Another worker's registry only learns
+that a participant finished when it reloads, so a flush locks the rows it
+writes and drops changes to participants already marked Completed.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import EventUser
+from ..utils import crossing_fraction, parse_gate
+
+logger = logging.getLogger(__name__)
+
+LAST_FIX_CACHE_KEY = 'events:timing:last_fix:{}'
+LAST_FIX_CACHE_SECONDS = 3600
+
+# EventUser rows per UPDATE statement
+TIMING_BATCH_SIZE = 500
+
+
+def timing_options():
+    return (
+        getattr(settings, 'EVENT_TIMING_REGISTRY_TTL', 10),
+        getattr(settings, 'EVENT_TIMING_FLUSH_INTERVAL', 1.0),
+        getattr(settings, 'EVENT_TIMING_MIN_SECONDS', 60),
+    )
+
+
+class Participant:
+    """
+    Timing state of one EventUser in this process.
+    """
+    __slots__ = ('pk', 'start_gate', 'finish_gate', 'gun_time', 'started_at', 'finished')
+
+    def __init__(self, event_user, start_gate, finish_gate):
+        self.pk = event_user.pk
+        self.start_gate = start_gate
+        self.finish_gate = finish_gate
+        self.gun_time = event_user.EventId.StartTimestamp
+        self.started_at = event_user.StartTimestamp
+        self.finished = False
+
+
+class TimingRegistry:
+    """
+    Unfinished participants of ongoing timed events, by user id.
+    """
+
+    def __init__(self):
+        self._by_user = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def participants(self, user_id):
+        registry_ttl = timing_options()[0]
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > registry_ttl:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > registry_ttl:
+                    self._by_user = self._load()
+                    self._loaded_at = time.monotonic()
+        return self._by_user.get(user_id, ())
+
+    def _load(self):
+        now = timezone.now()
+        ongoing = Q(EventId__Active=True) | Q(EventId__StartTimestamp__lte=now, EventId__EndTimestamp__gte=now)
+        by_user = {}
+        event_users = (
+            EventUser.objects.select_related('EventId')
+            .filter(ongoing, Completed=False, EventId__StartLine__isnull=False)
+        )
+        for event_user in event_users:
+            start_gate = parse_gate(event_user.EventId.StartLine)
+            if start_gate is None:
+                continue
+            finish_gate = parse_gate(event_user.EventId.FinishLine) or start_gate
+            by_user.setdefault(event_user.UserId_id, []).append(Participant(event_user, start_gate, finish_gate))
+        return by_user
+
+
+def interpolate(t0, t1, fraction):
+    return t0 + (t1 - t0) * fraction
+
+
+def time_step(participant, previous, fix, min_seconds):
+    """
+    Check one step between consecutive fixes against a participant's gates.
+    Returns the EventUser fields to update, or None.
+    """
+    (t0, lat0, lon0), (t1, lat1, lon1) = previous, fix
+    if participant.started_at is not None:
+        fraction = crossing_fraction(participant.finish_gate, lat0, lon0, lat1, lon1)
+        if fraction is not None:
+            finished_at = interpolate(t0, t1, fraction)
+            if (finished_at - participant.started_at).total_seconds() >= min_seconds:
+                participant.finished = True
+                return {
+                    'StartTimestamp': participant.started_at,
+                    'EndTimestamp': finished_at,
+                    'NetTime': finished_at - participant.started_at,
+                    'Completed': True,
+                }
+
+    fraction = crossing_fraction(participant.start_gate, lat0, lon0, lat1, lon1)
+    if fraction is not None:
+        started_at = interpolate(t0, t1, fraction)
+        if participant.gun_time is None or started_at >= participant.gun_time:
+            participant.started_at = started_at
+            return {'StartTimestamp': started_at}
+    return None
+
+
+def detect_crossings(user, locations):
+    """
+    Time the gate crossings in newly stored GPSLocation rows of a user.
+    Returns {event_user_pk: fields} for the participants whose timing changed.
+    """
+    participants = timing_registry.participants(user.pk)
+    if not participants:
+        return {}
+
+    min_seconds = timing_options()[2]
+    key = LAST_FIX_CACHE_KEY.format(user.pk)
+    previous = cache.get(key)
+    updates = {}
+    for fix in sorted((location.fix_time, location.latitude, location.longitude) for location in locations):
+        if previous is not None:
+            if fix[0] <= previous[0]:
+                # Late fixes cannot be placed between steps already checked
+                continue
+            for participant in participants:
+                if not participant.finished:
+                    fields = time_step(participant, previous, fix, min_seconds)
+                    if fields:
+                        updates.setdefault(participant.pk, {}).update(fields)
+        previous = fix
+    cache.set(key, previous, LAST_FIX_CACHE_SECONDS)
+    return updates
+
+
+class TimingWriteBehindBuffer:
+    """
+    Coalesces EventUser timing changes and writes them in batches.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def put(self, updates):
+        with self._lock:
+            for pk, fields in updates.items():
+                self._pending.setdefault(pk, {}).update(fields)
+            if timing_options()[1] and self._flusher is None:
+                self._start_flusher()
+        if not timing_options()[1]:
+            self.flush()
+
+    def flush(self):
+        """
+        Write every buffered change with one bulk_update per set of changed
+        fields, skipping participants that are already Completed. On failure
+        the changes are put back under newer ones.
+        Returns the number of EventUser rows written.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            with transaction.atomic():
+                # Row locks order this flush after any other worker's write of a finish
+                completed = set(
+                    EventUser.objects.select_for_update()
+                    .filter(pk__in=list(batch), Completed=True).values_list('pk', flat=True)
+                )
+                groups = {}
+                for pk, fields in batch.items():
+                    if pk not in completed:
+                        groups.setdefault(tuple(sorted(fields)), []).append(EventUser(pk=pk, **fields))
+                for field_names, rows in groups.items():
+                    EventUser.objects.bulk_update(rows, field_names, batch_size=TIMING_BATCH_SIZE)
+        except Exception:
+            logger.exception("Failed to write %d buffered timing results", len(batch))
+            with self._lock:
+                for pk, fields in batch.items():
+                    self._pending[pk] = {**fields, **self._pending.get(pk, {})}
+            return 0
+        return len(batch) - len(completed)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._run, name='event-timing-flusher', daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(timing_options()[1] or 1.0)
+            close_old_connections()
+            self.flush()
+
+
+timing_registry = TimingRegistry()
+timing_buffer = TimingWriteBehindBuffer()
+atexit.register(timing_buffer.flush)
@@ -0,0 +1,59 @@
+# events/signals.py
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from gpsinfo.signals import fixes_recorded
+
+from .models import Event, EventRoute, EventUser
+from .services.leaderboard_services import broadcast_progress, leaderboard_registry, update_leaderboards
+from .services.route_services import build_event_route
+from .services.timing_services import detect_crossings, timing_buffer, timing_registry
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(fixes_recorded)
+def time_gate_crossings(sender, user, locations, **kwargs):
+    """Time start/finish line crossings and queue the results once committed"""
+    updates = detect_crossings(user, locations)
+    if updates:
+        transaction.on_commit(lambda: timing_buffer.put(updates))
+
+
+@receiver(fixes_recorded)
+def advance_leaderboards(sender, user, locations, **kwargs):
+    """Move the user up their live leaderboards and push the change once committed"""
+    updates, messages = update_leaderboards(user, locations)
+    if updates:
+        transaction.on_commit(lambda: timing_buffer.put(updates))
+        transaction.on_commit(lambda: broadcast_progress(messages))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventUser)
+@receiver(post_delete, sender=EventUser)
+def reload_event_registries(sender, **kwargs):
+    """Pick up changed events and enrollments on this process's next fix"""
+    timing_registry.invalidate()
+    leaderboard_registry.invalidate()
+
+
+@receiver(post_save, sender=Event)
+def parse_uploaded_course(sender, instance, **kwargs):
+    """Parse a newly uploaded GPX course once the event is committed"""
+    if not instance.GpxFile:
+        return
+    if EventRoute.objects.filter(EventId=instance, SourceName=instance.GpxFile.name).exists():
+        return
+
+    def parse():
+        try:
+            build_event_route(instance)
+        except Exception:
+            logger.exception("Cannot parse the GPX course of event %s", instance.pk)
+
+    transaction.on_commit(parse)
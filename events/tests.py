@@ -1,3 +1,205 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from gpsinfo.models import GPSLocation
+from gpsinfo.testing import FixPostingMixin
+
+from .models import Event, EventRoute, EventUser
+from .services.route_services import Route, route_points
+from .utils import crossing_fraction
+
+
+class EventTimingTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.runner = get_user_model().objects.create_user(username='runner', password='pass')
+        self.start = now = timezone.now()
+        self.event = Event.objects.create(
+            EventName='Harbour loop', AdminUser=self.runner, Type='R',
+            StartTimestamp=now - timedelta(hours=1), EndTimestamp=now + timedelta(hours=2),
+            # East-west gate across the course, shared by start and finish
+            StartLine=[[22.3, 114.099], [22.3, 114.101]],
+        )
+        self.participant = EventUser.objects.create(EventId=self.event, UserId=self.runner)
+        self.client.force_authenticate(user=self.runner)
+
+    @override_settings(EVENT_TIMING_FLUSH_INTERVAL=0)
+    def test_start_and_finish_are_interpolated(self):
+        # Crosses the line northbound halfway between the first two fixes
+        self.post_fixes([self.fix(-300, 22.2995), self.fix(-290, 22.3005), self.fix(-200, 22.302)], on_commit=True)
+        self.participant.refresh_from_db()
+        self.assertAlmostEqual((self.participant.StartTimestamp - self.start).total_seconds(), -295, places=3)
+        self.assertFalse(self.participant.Completed)
+
+        # Back over the line in the next batch, a quarter of the way between fixes
+        self.post_fixes([self.fix(-100, 22.3005), self.fix(-90, 22.2985)], on_commit=True)
+        self.participant.refresh_from_db()
+        self.assertTrue(self.participant.Completed)
+        self.assertAlmostEqual((self.participant.EndTimestamp - self.start).total_seconds(), -97.5, places=3)
+        self.assertEqual(self.participant.NetTime, self.participant.EndTimestamp - self.participant.StartTimestamp)
+
+    @override_settings(EVENT_TIMING_FLUSH_INTERVAL=0)
+    def test_finish_written_by_another_worker_is_kept(self):
+        self.post_fixes([self.fix(-300, 22.2995), self.fix(-290, 22.3005)], on_commit=True)
+        # Another worker timed the finish; this process's registry has not reloaded yet
+        finished_at = timezone.now() - timedelta(seconds=150)
+        EventUser.objects.filter(pk=self.participant.pk).update(Completed=True, EndTimestamp=finished_at)
+
+        self.post_fixes([self.fix(-100, 22.3005), self.fix(-90, 22.2985)], on_commit=True)
+        self.participant.refresh_from_db()
+        self.assertEqual(self.participant.EndTimestamp, finished_at)
+
+    def test_crossing_fraction(self):
+        gate = (22.0, 114.0, 22.0, 114.001)
+        self.assertAlmostEqual(crossing_fraction(gate, 21.999, 114.0005, 22.003, 114.0005), 0.25)
+        self.assertIsNone(crossing_fraction(gate, 22.001, 114.0005, 22.003, 114.0005))
+        self.assertIsNone(crossing_fraction(gate, 21.999, 114.002, 22.001, 114.002))
+
+
+GPX_COURSE = b"""<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">
+  <trk><trkseg>
+    <trkpt lat="22.30" lon="114.1"><ele>5</ele></trkpt>
+    <trkpt lat="22.31" lon="114.1"><ele>25</ele></trkpt>
+    <trkpt lat="22.32" lon="114.1"><ele>15</ele></trkpt>
+  </trkseg></trk>
+</gpx>"""
+
+
+@override_settings(EVENT_TIMING_FLUSH_INTERVAL=0)
+class EventLeaderboardTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        User = get_user_model()
+        self.runners = [User.objects.create_user(username=name, password='pass') for name in ('ann', 'bob')]
+        self.start = now = timezone.now()
+        self.event = Event.objects.create(
+            EventName='Hill run', AdminUser=self.runners[0], Type='R',
+            StartTimestamp=now - timedelta(hours=1), EndTimestamp=now + timedelta(hours=2),
+            GpxFile=SimpleUploadedFile('course.gpx', GPX_COURSE),
+        )
+        for runner in self.runners:
+            EventUser.objects.create(EventId=self.event, UserId=runner)
+
+    def test_ranking_follows_progress_along_the_course(self):
+        ann, bob = self.runners
+        self.post_fixes([self.fix(-60, 22.305)], user=ann, on_commit=True)
+        self.post_fixes([self.fix(-60, 22.312)], user=bob, on_commit=True)
+        # Drifting back down the course or far off it never costs distance
+        self.post_fixes([self.fix(-30, 22.301)], user=bob, on_commit=True)
+        self.post_fixes([self.fix(-20, 22.305, 114.2)], user=ann, on_commit=True)
+
+        response = self.client.get(f'/api/events/{self.event.EventId}/leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        ranking = response.data['ranking']
+        self.assertEqual([row['username'] for row in ranking], ['bob', 'ann'])
+        self.assertAlmostEqual(ranking[0]['distance_m'], 1334.3, delta=1)
+        self.assertAlmostEqual(ranking[1]['distance_m'], 556.0, delta=1)
+
+        self.post_fixes([self.fix(-10, 22.315)], user=ann, on_commit=True)
+        ranking = self.client.get(f'/api/events/{self.event.EventId}/leaderboard/').data['ranking']
+        self.assertEqual(ranking[0]['username'], 'ann')
+        self.assertEqual(
+            str(EventUser.objects.get(EventId=self.event, UserId=ann).DistanceCompleted), '1.67'
+        )
+        self.assertEqual(self.client.get('/api/events/999/leaderboard/').status_code, 404)
+
+
+class EventRouteTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.admin = get_user_model().objects.create_user(username='organiser', password='pass')
+
+    def test_uploaded_course_is_parsed_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            event = Event.objects.create(
+                EventName='Hill run', AdminUser=self.admin, Type='R',
+                GpxFile=SimpleUploadedFile('course.gpx', GPX_COURSE),
+            )
+        event.refresh_from_db()
+        self.assertEqual(str(event.Distance), '2.22')
+        # 5 -> 25 climbs 20 m; the descent to 15 adds nothing
+        self.assertEqual(event.Elevation, 20)
+
+        route = EventRoute.objects.get(EventId=event)
+        self.assertEqual(route.PointCount, 3)
+        self.assertEqual(route.SourceName, event.GpxFile.name)
+        self.assertEqual(
+            (route.MinLatitude, route.MinLongitude, route.MaxLatitude, route.MaxLongitude),
+            (22.30, 114.1, 22.32, 114.1),
+        )
+        self.assertEqual(route_points(route), [(22.30, 114.1), (22.31, 114.1), (22.32, 114.1)])
+
+        # Saving without a new file does not parse the course again
+        with self.captureOnCommitCallbacks() as callbacks:
+            event.save()
+        self.assertEqual(callbacks, [])
+
+
+class RouteIndexTests(SimpleTestCase):
+    def test_index_matches_a_full_scan(self):
+        # A switchback course with short and long (multi-cell) segments
+        points = [(22.3 + 0.001 * i, 114.1 + (0.002 if i % 2 else 0.0)) for i in range(40)]
+        points.append((22.45, 114.3))
+        route = Route(points)
+        for lat, lon in [(22.3005, 114.1011), (22.31, 114.0), (22.4, 114.2), (22.2, 114.1), (22.339, 114.1019)]:
+            expected = min(
+                (route.project_segment(i, lat, lon) + (i,) for i in range(len(route.segments))),
+                key=lambda match: match[1],
+            )
+            match = route.project(lat, lon)
+            self.assertAlmostEqual(match[1], expected[1], places=6)
+            self.assertAlmostEqual(match[0], expected[0], places=6)
+
+        self.assertIsNone(route.project(22.2, 114.1, max_offset_m=200))
+        along = route.along_track(22.3005, 114.1011)
+        lat, lon = route.point_at(along)
+        self.assertAlmostEqual(route.along_track(lat, lon), along, places=3)
+        self.assertEqual(route.point_at(-5), points[0])
+        self.assertEqual(route.point_at(route.length_m + 5), points[-1])
+
+
+class EventTrackExportTests(APITestCase):
+    def test_admins_export_participants_tracks(self):
+        User = get_user_model()
+        organiser, runner, outsider = (User.objects.create_user(username=name, password='pass') for name in ('organiser', 'runner', 'outsider'))
+        now = timezone.now()
+        event = Event.objects.create(
+            EventName='Night run', AdminUser=organiser, Type='R',
+            StartTimestamp=now - timedelta(hours=1), EndTimestamp=now + timedelta(hours=1),
+        )
+        EventUser.objects.create(EventId=event, UserId=runner)
+        GPSLocation.objects.bulk_create([
+            GPSLocation(user=runner, latitude=22.3, longitude=114.1, recorded_at=now - timedelta(minutes=5)),
+            # Before the event starts
+            GPSLocation(user=runner, latitude=22.4, longitude=114.1, recorded_at=now - timedelta(hours=2)),
+            GPSLocation(user=outsider, latitude=22.5, longitude=114.1, recorded_at=now - timedelta(minutes=5)),
+        ])
+
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get(f'/api/events/{event.EventId}/export/csv/').status_code, 403)
+
+        self.client.force_authenticate(user=organiser)
+        response = self.client.get(f'/api/events/{event.EventId}/export/csv/')
+        self.assertEqual(response.status_code, 200)
+        rows = b''.join(response.streaming_content).decode().splitlines()[1:]
+        self.assertEqual([row.split(',')[:3:2] for row in rows], [['runner', '22.3']])
+        self.assertEqual(self.client.get(f'/api/events/{event.EventId}/export/kml/').status_code, 404)
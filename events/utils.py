@@ -0,0 +1,36 @@
+# events/utils.py
+import math
+
+
+def parse_gate(value):
+    """
+    Read a timing gate stored as [[lat, lon], [lat, lon]].
+    Returns (lat1, lon1, lat2, lon2), or None when unset or malformed.
+    """
+    try:
+        (lat1, lon1), (lat2, lon2) = value
+        return float(lat1), float(lon1), float(lat2), float(lon2)
+    except (TypeError, ValueError):
+        return None
+
+
+def crossing_fraction(gate, lat0, lon0, lat1, lon1):
+    """
+    Where the step from (lat0, lon0) to (lat1, lon1) crosses a gate, as a
+    fraction of the step (0 at the first point, 1 at the second), or None
+    when it does not. Uses a flat projection around the gate, which is
+    exact enough over the few tens of metres a gate and a step span.
+    """
+    g_lat1, g_lon1, g_lat2, g_lon2 = gate
+    scale = math.cos(math.radians((g_lat1 + g_lat2) / 2))
+    px, py = (lon0 - g_lon1) * scale, lat0 - g_lat1
+    rx, ry = (lon1 - lon0) * scale, lat1 - lat0
+    sx, sy = (g_lon2 - g_lon1) * scale, g_lat2 - g_lat1
+    denom = rx * sy - ry * sx
+    if denom == 0:
+        return None
+    t = (sx * py - sy * px) / denom
+    u = (rx * py - ry * px) / denom
+    if 0 <= t <= 1 and 0 <= u <= 1:
+        return t
+    return None
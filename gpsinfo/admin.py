@@ -1,6 +1,6 @@
 # gpsinfo/admin.py
 from django.contrib import admin
-from .models import GPSLocation, GPSLatest
+from .models import GPSDailyStats, GPSGeofence, GPSGeofenceEvent, GPSLocation, GPSLatest, GPSLocationRollup, GPSSession
 from django.utils import timezone
 
 @admin.register(GPSLatest)
@@ -10,6 +10,7 @@ class GPSLatestAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+    list_select_related = ('user',)
 
     def get_username(self, obj):
         return obj.user.username if obj.user else "Unknown"
@@ -29,6 +30,7 @@ class GPSLocationAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email')
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+    list_select_related = ('user',)
 
     def get_username(self, obj):
         return obj.user.username if obj.user else "Unknown"
@@ -40,4 +42,64 @@ class GPSLocationAdmin(admin.ModelAdmin):
             return timezone.localtime(obj.timestamp).strftime('%Y-%m-%d %H:%M:%S')
         return "No timestamp"
     formatted_timestamp.short_description = 'Timestamp'
-    formatted_timestamp.admin_order_field = 'timestamp'
\ No newline at end of file
+    formatted_timestamp.admin_order_field = 'timestamp'
+
+@admin.register(GPSLocationRollup)
+class GPSLocationRollupAdmin(admin.ModelAdmin):
+    list_display = ('get_username', 'minute', 'latitude', 'longitude', 'altitude', 'accuracy', 'point_count')
+    list_filter = ('minute',)
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('minute', 'point_count')
+    ordering = ('-minute',)
+    list_select_related = ('user',)
+
+    def get_username(self, obj):
+        return obj.user.username if obj.user else "Unknown"
+    get_username.short_description = 'Username'
+    get_username.admin_order_field = 'user__username'
+
+@admin.register(GPSSession)
+class GPSSessionAdmin(admin.ModelAdmin):
+    list_display = ('get_username', 'started_at', 'ended_at', 'distance_m', 'duration_seconds', 'point_count', 'is_closed')
+    list_filter = ('started_at', 'is_closed')
+    search_fields = ('user__username', 'user__email')
+    ordering = ('-started_at',)
+    list_select_related = ('user',)
+
+    def get_username(self, obj):
+        return obj.user.username if obj.user else "Unknown"
+    get_username.short_description = 'Username'
+    get_username.admin_order_field = 'user__username'
+
+@admin.register(GPSDailyStats)
+class GPSDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('get_username', 'day', 'distance_m', 'moving_seconds', 'max_speed_mps', 'elevation_gain_m', 'point_count')
+    list_filter = ('day',)
+    search_fields = ('user__username', 'user__email')
+    ordering = ('-day',)
+    list_select_related = ('user',)
+
+    def get_username(self, obj):
+        return obj.user.username if obj.user else "Unknown"
+    get_username.short_description = 'Username'
+    get_username.admin_order_field = 'user__username'
+
+@admin.register(GPSGeofence)
+class GPSGeofenceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'shape', 'center_latitude', 'center_longitude', 'radius_m', 'is_active', 'created_at')
+    list_filter = ('shape', 'is_active')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+@admin.register(GPSGeofenceEvent)
+class GPSGeofenceEventAdmin(admin.ModelAdmin):
+    list_display = ('get_username', 'fence', 'kind', 'occurred_at', 'latitude', 'longitude')
+    list_filter = ('kind', 'occurred_at', 'fence')
+    search_fields = ('user__username', 'user__email', 'fence__name')
+    ordering = ('-occurred_at',)
+    list_select_related = ('user', 'fence')
+
+    def get_username(self, obj):
+        return obj.user.username if obj.user else "Unknown"
+    get_username.short_description = 'Username'
+    get_username.admin_order_field = 'user__username'
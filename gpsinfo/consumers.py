@@ -0,0 +1,31 @@
+# gpsinfo/consumers.py
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .services.live_services import LIVE_ALL_GROUP, live_group_name
+
+
+class LivePositionConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes each newly stored GPS fix to subscribed viewers, replacing
+    polling of /api/gpslocations/latest/. Connect to ``ws/gpslocations/live/``
+    for every user or ``ws/gpslocations/live/<group>/`` for one user_group.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            # 4401 mirrors HTTP 401 for clients that inspect the close code
+            await self.close(code=4401)
+            return
+
+        user_group = self.scope['url_route']['kwargs'].get('group')
+        self.group_name = live_group_name(user_group) if user_group else LIVE_ALL_GROUP
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def gps_fix(self, event):
+        await self.send_json(event['fix'])
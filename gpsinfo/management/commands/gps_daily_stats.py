@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gpsinfo.models import GPSDailyStats
+from gpsinfo.services.stats_services import GAP_JOB, STATS_WINDOW_SIZE, refresh_daily_stats
+from gpsinfo.services.watermark_services import clear_gaps
+
+
+class Command(BaseCommand):
+    help = 'Fold GPS points stored since the last run into the per-user daily statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=int, default=STATS_WINDOW_SIZE,
+            help=f'GPS point ids processed per transaction (default {STATS_WINDOW_SIZE})',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Discard the stored statistics and recompute them from all GPS points',
+        )
+
+    def handle(self, *args, **options):
+        if options['window'] < 1:
+            raise CommandError('--window must be at least 1')
+        if options['rebuild']:
+            deleted, _ = GPSDailyStats.objects.all().delete()
+            clear_gaps(GAP_JOB)
+            self.stdout.write(f'Discarded {deleted} daily rows')
+
+        def report(low_id, high_id, rows):
+            if rows:
+                self.stdout.write(f'ids {low_id + 1}-{high_id}: {rows} daily rows updated')
+
+        written = refresh_daily_stats(window_size=options['window'], on_window=report)
+        self.stdout.write(self.style.SUCCESS(f'Updated {written} daily rows'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from gpsinfo.services.queue_services import claim_segments, drain_segment
+
+
+class Command(BaseCommand):
+    help = 'Store GPS fixes queued by the ingest endpoints (GPS_INGEST_QUEUED) in large batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Fixes stored per transaction (default 5000)',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0.5,
+            help='Seconds to wait when the queue is empty (default 0.5)',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain what is queued now and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            close_old_connections()
+            segments = claim_segments()
+            for path in segments:
+                started = time.monotonic()
+                inserted = drain_segment(path, batch_size=options['batch_size'])
+                self.stdout.write(f'{path.name}: stored {inserted} fixes in {time.monotonic() - started:.2f}s')
+            if options['once']:
+                return
+            if not segments:
+                time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from gpsinfo.services.export_services import EXPORT_FORMATS, export_track
+
+
+def parse_bound(value, name):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f'--{name} must be an ISO 8601 datetime')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Stream users' GPS tracks to a GPX, CSV or GeoJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='+', help='Users whose tracks are exported')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='gpx', dest='export_format')
+        parser.add_argument('--since', help='Only fixes taken at or after this ISO 8601 time')
+        parser.add_argument('--until', help='Only fixes taken at or before this ISO 8601 time')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output)')
+
+    def handle(self, *args, **options):
+        since = parse_bound(options['since'], 'since') if options['since'] else None
+        until = parse_bound(options['until'], 'until') if options['until'] else None
+        users = dict(get_user_model().objects.filter(username__in=options['usernames']).values_list('username', 'pk'))
+        unknown = sorted(set(options['usernames']) - set(users))
+        if unknown:
+            raise CommandError(f"Unknown users: {', '.join(unknown)}")
+
+        chunks = export_track(options['export_format'], list(users.values()), since, until)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
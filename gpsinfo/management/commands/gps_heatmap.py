@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gpsinfo.models import GPSHeatmapTile
+from gpsinfo.services.heatmap_services import GAP_JOB, HEATMAP_WINDOW_SIZE, refresh_heatmap
+from gpsinfo.services.watermark_services import clear_gaps
+
+
+class Command(BaseCommand):
+    help = 'Add GPS points stored since the last run to the heatmap tile pyramid'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=int, default=HEATMAP_WINDOW_SIZE,
+            help=f'GPS point ids processed per transaction (default {HEATMAP_WINDOW_SIZE})',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Discard the tiles and recount them from the GPS points still stored '
+                 '(history already removed by gps_retention is lost)',
+        )
+
+    def handle(self, *args, **options):
+        if options['window'] < 1:
+            raise CommandError('--window must be at least 1')
+        if options['rebuild']:
+            deleted, _ = GPSHeatmapTile.objects.all().delete()
+            clear_gaps(GAP_JOB)
+            self.stdout.write(f'Discarded {deleted} heatmap tiles')
+
+        def report(low_id, high_id, tiles):
+            if tiles:
+                self.stdout.write(f'ids {low_id + 1}-{high_id}: {tiles} tiles updated')
+
+        written = refresh_heatmap(window_size=options['window'], on_window=report)
+        self.stdout.write(self.style.SUCCESS(f'Updated {written} heatmap tiles'))
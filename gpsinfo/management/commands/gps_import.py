@@ -0,0 +1,94 @@
+import gzip
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from gpsinfo.services.import_services import READERS, import_locations
+from gpsinfo.services.latest_services import rebuild_latest
+
+
+class Command(BaseCommand):
+    help = 'Import historical GPS points from a CSV, NDJSON or GPX file (optionally gzipped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username owning GPX points and any rows without a username column',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Points stored per transaction (default 10000)',
+        )
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help='Resume from this offset (bytes for CSV/NDJSON, points for GPX)',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Resume from the offset saved in the state file by an interrupted run',
+        )
+        parser.add_argument(
+            '--state-file',
+            help='Where progress is saved after every chunk (default: <path>.offset)',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        compressed = path.suffix == '.gz'
+        file_format = options['format'] or Path(path.stem if compressed else path.name).suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Cannot tell the format of {path.name}; pass --format')
+
+        default_user = None
+        if options['user']:
+            default_user = get_user_model().objects.filter(username=options['user']).first()
+            if default_user is None:
+                raise CommandError(f'User {options["user"]} does not exist')
+        elif file_format == 'gpx':
+            raise CommandError('GPX files carry no usernames; pass --user')
+
+        state_file = Path(options['state_file'] or f'{path}.offset')
+        offset = options['offset']
+        if options['resume'] and state_file.exists():
+            offset = int(state_file.read_text())
+        if offset:
+            self.stdout.write(f'Resuming {path.name} from offset {offset}')
+
+        started = time.monotonic()
+
+        def report(chunk_offset, stats):
+            state_file.write_text(str(chunk_offset))
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'offset {chunk_offset}: {stats["imported"]} imported '
+                f'({stats["imported"] / elapsed if elapsed else 0:.0f}/s), '
+                f'{stats["duplicates"]} duplicates, {stats["rejected"]} rejected, '
+                f'{stats["unknown_user"]} unknown user'
+            )
+
+        opener = gzip.open if compressed else open
+        with opener(path, 'rb') as stream:
+            records = READERS[file_format](stream, offset)
+            stats, user_ids = import_locations(
+                records, default_user=default_user, chunk_size=options['chunk_size'], on_chunk=report,
+            )
+
+        # After a resume, users imported by the earlier run may not be in user_ids
+        rebuilt = rebuild_latest(None if offset else user_ids)
+        state_file.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["imported"]} points from {path.name}; refreshed {rebuilt} latest positions'
+        ))
+        self.stdout.write('Run manage.py gps_sessions to segment the imported history into sessions')
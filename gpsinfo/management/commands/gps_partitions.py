@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gpsinfo.services.partition_services import (
+    PartitioningError,
+    convert_to_partitioned,
+    ensure_month_partitions,
+    list_month_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Manage monthly PostgreSQL partitions of the GPSLocation table (run daily from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='One-off: convert the plain GPSLocation table into a partitioned table',
+        )
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help='Create partitions up to this many months ahead (default 3)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                convert_to_partitioned()
+                self.stdout.write(self.style.SUCCESS('Converted GPSLocation to a partitioned table'))
+
+            created = ensure_month_partitions(options['months_ahead'])
+        except PartitioningError as exc:
+            raise CommandError(str(exc))
+
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f'Created partition {name}'))
+        for start, end, name in list_month_partitions():
+            self.stdout.write(f'{name}: {start:%Y-%m-%d} to {end:%Y-%m-%d}')
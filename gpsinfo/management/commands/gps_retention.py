@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from gpsinfo.models import GPSLocation
+from gpsinfo.services.partition_services import drop_partition, is_partitioned, list_month_partitions
+from gpsinfo.services.retention_services import apply_retention, refreshes_behind, rollup_window
+
+
+class Command(BaseCommand):
+    help = 'Roll raw GPS points older than the retention window into per-minute rows and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'GPS_RAW_RETENTION_DAYS', 90),
+            help='Keep raw points for this many days (default GPS_RAW_RETENTION_DAYS or 90)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be rolled up',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(f'Retaining raw GPS points newer than {timezone.localtime(cutoff):%Y-%m-%d %H:%M}')
+
+        behind = refreshes_behind(cutoff)
+        if behind:
+            raise CommandError(
+                f"Raw points older than the cutoff have not been folded in yet; run {' and '.join(behind)} first"
+            )
+
+        if options['dry_run']:
+            count = GPSLocation.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} raw points would be rolled up')
+            return
+
+        raw_total = rollup_total = 0
+
+        # Whole monthly partitions past the cutoff are summarised and dropped,
+        # which avoids a large DELETE and the vacuum work that follows it
+        if is_partitioned():
+            for start, end, name in list_month_partitions():
+                if end > cutoff:
+                    break
+                # The roll-up and the drop commit together, so a failure leaves neither
+                with transaction.atomic():
+                    raw_points, rollup_rows = rollup_window(start, end, delete_raw=False)
+                    drop_partition(name)
+                raw_total += raw_points
+                rollup_total += rollup_rows
+                self.stdout.write(f'Dropped {name}: {raw_points} points -> {rollup_rows} minute rows')
+
+        def report(start, end, raw_points, rollup_rows):
+            if raw_points:
+                self.stdout.write(f'{start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}: {raw_points} points -> {rollup_rows} minute rows')
+
+        raw_points, rollup_rows = apply_retention(cutoff, on_window=report)
+        raw_total += raw_points
+        rollup_total += rollup_rows
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {raw_total} raw points into {rollup_total} minute rows'))
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from gpsinfo.services.session_services import rebuild_sessions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild GPS sessions (trips/activities) from the stored GPS history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help='Only rebuild this user (repeatable; default: every user with GPS history)',
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+        else:
+            users = users.filter(gps_locations__isnull=False).distinct()
+
+        total = 0
+        for user in users.iterator():
+            created = rebuild_sessions(user)
+            total += created
+            self.stdout.write(f'{user.username}: {created} sessions')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} sessions'))
@@ -0,0 +1,42 @@
+# gpsinfo/middleware.py
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    """
+    Resolve a SimpleJWT access token to an active user, or AnonymousUser.
+    """
+    try:
+        token = AccessToken(raw_token)
+    except (InvalidToken, TokenError):
+        return AnonymousUser()
+
+    User = get_user_model()
+    try:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]})
+    except (KeyError, User.DoesNotExist):
+        return AnonymousUser()
+    return user if user.is_active else AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with the same JWT access token the
+    REST API uses. Browsers cannot set headers on WebSocket requests, so the
+    token is read from the ``token`` query string parameter.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        raw_token = query.get('token', [None])[0]
+        scope['user'] = await get_user_for_token(raw_token) if raw_token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
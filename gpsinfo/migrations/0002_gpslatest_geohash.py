@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:09
+
+from django.db import migrations, models
+
+# A frozen copy of gpsinfo.utils.geohash_encode, so later changes to the
+# encoder cannot change what this migration writes
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bit = 0
+            value = 0
+    return ''.join(chars)
+
+
+def backfill_geohash(apps, schema_editor):
+    GPSLatest = apps.get_model('gpsinfo', 'GPSLatest')
+    rows = list(GPSLatest.objects.only('pk', 'latitude', 'longitude'))
+    for row in rows:
+        row.geohash = geohash_encode(row.latitude, row.longitude)
+    GPSLatest.objects.bulk_update(rows, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpslatest',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, help_text='Geohash of the position, prefix-indexed for viewport and radius queries.', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
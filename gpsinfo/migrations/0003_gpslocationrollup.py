@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0002_gpslatest_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSLocationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField(help_text='Start of the minute the raw points were recorded in.')),
+                ('latitude', models.FloatField(help_text="Mean latitude of the minute's points in decimal degrees.")),
+                ('longitude', models.FloatField(help_text="Mean longitude of the minute's points in decimal degrees.")),
+                ('altitude', models.FloatField(blank=True, help_text='Mean altitude in meters, if the points carried one.', null=True)),
+                ('accuracy', models.FloatField(blank=True, help_text='Best (smallest) GPS accuracy in meters among the points.', null=True)),
+                ('point_count', models.PositiveIntegerField(help_text='Number of raw points rolled into this row.')),
+                ('user', models.ForeignKey(blank=True, help_text='The user associated with these GPS locations.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='gps_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'GPS Location Roll-up',
+                'verbose_name_plural': 'GPS Location Roll-ups',
+                'ordering': ['-minute'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'minute'), name='gpsinfo_rollup_user_minute_uniq')],
+            },
+        ),
+    ]
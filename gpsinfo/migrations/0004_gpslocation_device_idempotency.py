@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0003_gpslocationrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpslocation',
+            name='device_id',
+            field=models.CharField(blank=True, default='', help_text='Identifier of the sending device (optional, from device).', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='gpslocation',
+            name='recorded_at',
+            field=models.DateTimeField(blank=True, help_text='Time the device took the fix (optional, from device).', null=True),
+        ),
+        migrations.AddField(
+            model_name='gpslocation',
+            name='sequence',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Per-device fix counter; retries of the same fix reuse it.', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='gpslocation',
+            constraint=models.UniqueConstraint(condition=models.Q(('sequence__isnull', False)), fields=('user', 'device_id', 'sequence'), name='gpsinfo_gps_device_seq_uniq'),
+        ),
+    ]
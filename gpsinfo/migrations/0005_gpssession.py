@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0004_gpslocation_device_idempotency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(help_text='Fix time of the first point of the session.')),
+                ('ended_at', models.DateTimeField(help_text='Fix time the session ended (arrival time once a stop is detected).')),
+                ('duration_seconds', models.FloatField(default=0, help_text='ended_at minus started_at, in seconds.')),
+                ('distance_m', models.FloatField(default=0, help_text='Distance travelled in meters, ignoring jitter inside the dwell radius.')),
+                ('point_count', models.PositiveIntegerField(default=1, help_text='Number of fixes assigned to the session.')),
+                ('start_latitude', models.FloatField()),
+                ('start_longitude', models.FloatField()),
+                ('end_latitude', models.FloatField()),
+                ('end_longitude', models.FloatField()),
+                ('min_latitude', models.FloatField()),
+                ('min_longitude', models.FloatField()),
+                ('max_latitude', models.FloatField()),
+                ('max_longitude', models.FloatField()),
+                ('is_closed', models.BooleanField(default=False, help_text='Whether a stop or time gap has ended the session.')),
+                ('anchor_latitude', models.FloatField()),
+                ('anchor_longitude', models.FloatField()),
+                ('anchor_at', models.DateTimeField()),
+                ('last_fix_at', models.DateTimeField()),
+                ('user', models.ForeignKey(help_text='The user who recorded this session.', on_delete=django.db.models.deletion.CASCADE, related_name='gps_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'GPS Session',
+                'verbose_name_plural': 'GPS Sessions',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['user', '-started_at'], name='gpsinfo_gps_user_id_e9b96a_idx')],
+            },
+        ),
+    ]
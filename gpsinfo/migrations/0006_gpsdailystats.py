@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0005_gpssession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Local calendar day of the fixes.')),
+                ('distance_m', models.FloatField(default=0, help_text='Distance travelled in meters.')),
+                ('moving_seconds', models.FloatField(default=0, help_text='Time spent moving faster than the moving-speed threshold.')),
+                ('max_speed_mps', models.FloatField(default=0, help_text='Highest speed between consecutive fixes, in meters per second.')),
+                ('elevation_gain_m', models.FloatField(default=0, help_text='Total climb in meters from the altitude readings.')),
+                ('point_count', models.PositiveIntegerField(default=0, help_text='Number of fixes included.')),
+                ('last_fix_at', models.DateTimeField()),
+                ('last_latitude', models.FloatField()),
+                ('last_longitude', models.FloatField()),
+                ('elevation_ref', models.FloatField(blank=True, null=True)),
+                ('last_location_id', models.BigIntegerField(db_index=True, help_text='Highest GPSLocation id processed when the row was last refreshed.')),
+                ('user', models.ForeignKey(help_text='The user these statistics belong to.', on_delete=django.db.models.deletion.CASCADE, related_name='gps_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'GPS Daily Statistics',
+                'verbose_name_plural': 'GPS Daily Statistics',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='gpsinfo_dailystats_user_day_uniq')],
+            },
+        ),
+    ]
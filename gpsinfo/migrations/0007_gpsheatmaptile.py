@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0006_gpsdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSHeatmapTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('z', models.PositiveSmallIntegerField(help_text='Zoom level.')),
+                ('x', models.PositiveIntegerField(help_text='Tile column.')),
+                ('y', models.PositiveIntegerField(help_text='Tile row.')),
+                ('counts', models.BinaryField(help_text='zlib-compressed little-endian uint32 grid of point counts, row by row.')),
+                ('total', models.BigIntegerField(default=0, help_text='Number of points in the tile.')),
+                ('max_count', models.PositiveIntegerField(default=0, help_text='Largest single bin count, used to scale rendering.')),
+                ('version', models.PositiveIntegerField(default=1, help_text="Bumped on every update; part of the tile's ETag.")),
+                ('last_location_id', models.BigIntegerField(db_index=True, help_text='Highest GPSLocation id processed when the tile was last refreshed.')),
+            ],
+            options={
+                'verbose_name': 'GPS Heatmap Tile',
+                'verbose_name_plural': 'GPS Heatmap Tiles',
+                'constraints': [models.UniqueConstraint(fields=('z', 'x', 'y'), name='gpsinfo_heatmap_zxy_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0007_gpsheatmaptile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSGeofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('shape', models.CharField(choices=[('circle', 'Circle'), ('polygon', 'Polygon')], default='circle', max_length=10)),
+                ('center_latitude', models.FloatField(blank=True, help_text='Circle centre latitude in decimal degrees.', null=True)),
+                ('center_longitude', models.FloatField(blank=True, help_text='Circle centre longitude in decimal degrees.', null=True)),
+                ('radius_m', models.FloatField(blank=True, help_text='Circle radius in meters.', null=True)),
+                ('polygon', models.JSONField(blank=True, default=list, help_text='Polygon vertices as [[latitude, longitude], ...].')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'GPS Geofence',
+                'verbose_name_plural': 'GPS Geofences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GPSGeofenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('enter', 'Enter'), ('exit', 'Exit')], max_length=5)),
+                ('occurred_at', models.DateTimeField(help_text='Fix time of the crossing fix.')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('fence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='gpsinfo.gpsgeofence')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gps_geofence_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'GPS Geofence Event',
+                'verbose_name_plural': 'GPS Geofence Events',
+                'ordering': ['-occurred_at'],
+                'indexes': [models.Index(fields=['user', '-occurred_at'], name='gpsinfo_gps_user_id_7752f8_idx'), models.Index(fields=['fence', '-occurred_at'], name='gpsinfo_gps_fence_i_652606_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GPSGeofencePresence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entered_at', models.DateTimeField()),
+                ('fence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presence', to='gpsinfo.gpsgeofence')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gps_geofence_presence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'fence'), name='gpsinfo_geofence_presence_uniq')],
+            },
+        ),
+    ]
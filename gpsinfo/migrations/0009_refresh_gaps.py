@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0008_geofences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSRefreshGap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(help_text='Refresh job that skipped the ids.', max_length=32)),
+                ('start_id', models.BigIntegerField(help_text='First missing id.')),
+                ('end_id', models.BigIntegerField(help_text='Last missing id, included.')),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'GPS Refresh Gap',
+                'verbose_name_plural': 'GPS Refresh Gaps',
+                'indexes': [models.Index(fields=['job', 'start_id'], name='gpsinfo_refresh_gap_start')],
+            },
+        ),
+    ]
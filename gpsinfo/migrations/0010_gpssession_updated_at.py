@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0009_refresh_gaps'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpssession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='When the session or the fixes drawn for it last changed; versions cached track tiles.'),
+        ),
+        migrations.AddIndex(
+            model_name='gpssession',
+            index=models.Index(fields=['user', '-updated_at'], name='gpsinfo_gps_user_id_3739d8_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_user_group_index'),
+        ('gpsinfo', '0010_gpssession_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSFilterState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='gps_filter_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'GPS Filter State',
+                'verbose_name_plural': 'GPS Filter States',
+            },
+        ),
+    ]
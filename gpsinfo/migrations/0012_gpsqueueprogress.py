@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gpsinfo', '0011_gpsfilterstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSQueueProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(help_text='Claimed segment file name.', max_length=64, unique=True)),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes of the segment already stored.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'GPS Queue Progress',
+                'verbose_name_plural': 'GPS Queue Progress',
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
 # gpsinfo/models.py
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from .utils import geohash_encode
 
 class GPSLocation(models.Model):
     """
@@ -24,6 +27,22 @@ class GPSLocation(models.Model):
         auto_now_add=True,
         help_text="Time when the location was recorded."
     )
+    recorded_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Time the device took the fix (optional, from device)."
+    )
+    device_id = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="Identifier of the sending device (optional, from device)."
+    )
+    sequence = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Per-device fix counter; retries of the same fix reuse it."
+    )
     altitude = models.FloatField(
         null=True,
         blank=True,
@@ -39,10 +58,25 @@ class GPSLocation(models.Model):
         indexes = [
             models.Index(fields=['user', 'timestamp']),
         ]
+        constraints = [
+            # Idempotency key: a retried fix conflicts instead of adding a row
+            models.UniqueConstraint(
+                fields=['user', 'device_id', 'sequence'],
+                condition=models.Q(sequence__isnull=False),
+                name='gpsinfo_gps_device_seq_uniq',
+            ),
+        ]
         ordering = ['-timestamp']
         verbose_name = 'GPS Location'
         verbose_name_plural = 'GPS Locations'
 
+    @property
+    def fix_time(self):
+        """
+        When the fix was taken: the device time if sent, else the receive time.
+        """
+        return self.recorded_at or self.timestamp
+
     def __str__(self):
         if self.user:
             # Use username instead of email for display
@@ -80,11 +114,397 @@ class GPSLatest(models.Model):
     timestamp = models.DateTimeField(
         help_text="Time when the location was recorded."
     )
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        db_index=True,
+        help_text="Geohash of the position, prefix-indexed for viewport and radius queries."
+    )
 
     class Meta:
         verbose_name = 'Latest GPS Location'
         verbose_name_plural = 'Latest GPS Locations'
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial index column in step with the coordinates
+        self.geohash = geohash_encode(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'geohash' not in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         # Use username instead of email for display
-        return f"{self.user.username}'s latest at ({self.latitude}, {self.longitude}) on {self.timestamp}"
\ No newline at end of file
+        return f"{self.user.username}'s latest at ({self.latitude}, {self.longitude}) on {self.timestamp}"
+
+class GPSLocationRollup(models.Model):
+    """
+    Per-minute downsampled GPS history for points past the raw retention window.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gps_rollups',
+        help_text="The user associated with these GPS locations.",
+        null=True, blank=True,
+    )
+    minute = models.DateTimeField(
+        help_text="Start of the minute the raw points were recorded in."
+    )
+    latitude = models.FloatField(
+        help_text="Mean latitude of the minute's points in decimal degrees."
+    )
+    longitude = models.FloatField(
+        help_text="Mean longitude of the minute's points in decimal degrees."
+    )
+    altitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Mean altitude in meters, if the points carried one."
+    )
+    accuracy = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Best (smallest) GPS accuracy in meters among the points."
+    )
+    point_count = models.PositiveIntegerField(
+        help_text="Number of raw points rolled into this row."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'minute'], name='gpsinfo_rollup_user_minute_uniq'),
+        ]
+        ordering = ['-minute']
+        verbose_name = 'GPS Location Roll-up'
+        verbose_name_plural = 'GPS Location Roll-ups'
+
+    def __str__(self):
+        username = self.user.username if self.user else "Unknown user"
+        return f"{username} around ({self.latitude}, {self.longitude}) at {self.minute} ({self.point_count} points)"
+
+class GPSSession(models.Model):
+    """
+    A continuous stretch of movement (trip/activity) split from a user's
+    GPS history on time gaps and stops, maintained as fixes arrive.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gps_sessions',
+        help_text="The user who recorded this session.",
+    )
+    started_at = models.DateTimeField(
+        help_text="Fix time of the first point of the session."
+    )
+    ended_at = models.DateTimeField(
+        help_text="Fix time the session ended (arrival time once a stop is detected)."
+    )
+    duration_seconds = models.FloatField(
+        default=0,
+        help_text="ended_at minus started_at, in seconds."
+    )
+    distance_m = models.FloatField(
+        default=0,
+        help_text="Distance travelled in meters, ignoring jitter inside the dwell radius."
+    )
+    point_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of fixes assigned to the session."
+    )
+    start_latitude = models.FloatField()
+    start_longitude = models.FloatField()
+    end_latitude = models.FloatField()
+    end_longitude = models.FloatField()
+    min_latitude = models.FloatField()
+    min_longitude = models.FloatField()
+    max_latitude = models.FloatField()
+    max_longitude = models.FloatField()
+    is_closed = models.BooleanField(
+        default=False,
+        help_text="Whether a stop or time gap has ended the session."
+    )
+    # Segmentation state: the last point movement was counted from, and the
+    # newest fix seen, so later fixes can extend the session incrementally
+    anchor_latitude = models.FloatField()
+    anchor_longitude = models.FloatField()
+    anchor_at = models.DateTimeField()
+    last_fix_at = models.DateTimeField()
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text="When the session or the fixes drawn for it last changed; versions cached track tiles."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-started_at']),
+            models.Index(fields=['user', '-updated_at']),
+        ]
+        ordering = ['-started_at']
+        verbose_name = 'GPS Session'
+        verbose_name_plural = 'GPS Sessions'
+
+    def __str__(self):
+        return f"{self.user.username} from {self.started_at} to {self.ended_at} ({self.distance_m:.0f} m)"
+
+class GPSDailyStats(models.Model):
+    """
+    Per-user, per-day movement aggregates computed from GPSLocation,
+    refreshed incrementally by ``manage.py gps_daily_stats``.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gps_daily_stats',
+        help_text="The user these statistics belong to.",
+    )
+    day = models.DateField(
+        help_text="Local calendar day of the fixes."
+    )
+    distance_m = models.FloatField(
+        default=0,
+        help_text="Distance travelled in meters."
+    )
+    moving_seconds = models.FloatField(
+        default=0,
+        help_text="Time spent moving faster than the moving-speed threshold."
+    )
+    max_speed_mps = models.FloatField(
+        default=0,
+        help_text="Highest speed between consecutive fixes, in meters per second."
+    )
+    elevation_gain_m = models.FloatField(
+        default=0,
+        help_text="Total climb in meters from the altitude readings."
+    )
+    point_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of fixes included."
+    )
+    # Where the day's computation stopped, so new fixes can continue it
+    last_fix_at = models.DateTimeField()
+    last_latitude = models.FloatField()
+    last_longitude = models.FloatField()
+    elevation_ref = models.FloatField(null=True, blank=True)
+    last_location_id = models.BigIntegerField(
+        db_index=True,
+        help_text="Highest GPSLocation id processed when the row was last refreshed."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='gpsinfo_dailystats_user_day_uniq'),
+        ]
+        ordering = ['-day']
+        verbose_name = 'GPS Daily Statistics'
+        verbose_name_plural = 'GPS Daily Statistics'
+
+    @property
+    def average_speed_mps(self):
+        return self.distance_m / self.moving_seconds if self.moving_seconds else 0.0
+
+    def __str__(self):
+        return f"{self.user.username} on {self.day}: {self.distance_m:.0f} m"
+
+class GPSHeatmapTile(models.Model):
+    """
+    Point counts of all GPS history binned into a fixed grid per XYZ map
+    tile, for every zoom level of the heatmap pyramid.
+    """
+    z = models.PositiveSmallIntegerField(help_text="Zoom level.")
+    x = models.PositiveIntegerField(help_text="Tile column.")
+    y = models.PositiveIntegerField(help_text="Tile row.")
+    counts = models.BinaryField(
+        help_text="zlib-compressed little-endian uint32 grid of point counts, row by row."
+    )
+    total = models.BigIntegerField(
+        default=0,
+        help_text="Number of points in the tile."
+    )
+    max_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Largest single bin count, used to scale rendering."
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        help_text="Bumped on every update; part of the tile's ETag."
+    )
+    last_location_id = models.BigIntegerField(
+        db_index=True,
+        help_text="Highest GPSLocation id processed when the tile was last refreshed."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['z', 'x', 'y'], name='gpsinfo_heatmap_zxy_uniq'),
+        ]
+        verbose_name = 'GPS Heatmap Tile'
+        verbose_name_plural = 'GPS Heatmap Tiles'
+
+    def __str__(self):
+        return f"Heatmap tile {self.z}/{self.x}/{self.y} ({self.total} points)"
+
+class GPSGeofence(models.Model):
+    """
+    An area (circle or polygon) whose entries and exits are detected as
+    GPS fixes are ingested.
+    """
+    SHAPE_CIRCLE = 'circle'
+    SHAPE_POLYGON = 'polygon'
+    SHAPE_CHOICES = [
+        (SHAPE_CIRCLE, 'Circle'),
+        (SHAPE_POLYGON, 'Polygon'),
+    ]
+
+    name = models.CharField(max_length=100)
+    shape = models.CharField(max_length=10, choices=SHAPE_CHOICES, default=SHAPE_CIRCLE)
+    center_latitude = models.FloatField(
+        null=True, blank=True,
+        help_text="Circle centre latitude in decimal degrees."
+    )
+    center_longitude = models.FloatField(
+        null=True, blank=True,
+        help_text="Circle centre longitude in decimal degrees."
+    )
+    radius_m = models.FloatField(
+        null=True, blank=True,
+        help_text="Circle radius in meters."
+    )
+    polygon = models.JSONField(
+        default=list, blank=True,
+        help_text="Polygon vertices as [[latitude, longitude], ...]."
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'GPS Geofence'
+        verbose_name_plural = 'GPS Geofences'
+
+    def clean(self):
+        if self.shape == self.SHAPE_CIRCLE:
+            if None in (self.center_latitude, self.center_longitude, self.radius_m) or self.radius_m <= 0:
+                raise ValidationError("A circle needs a centre and a positive radius.")
+        elif len(self.polygon or []) < 3:
+            raise ValidationError("A polygon needs at least three [latitude, longitude] vertices.")
+
+    def __str__(self):
+        return self.name
+
+class GPSGeofencePresence(models.Model):
+    """
+    A user currently inside a geofence. Rows only change on transitions.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gps_geofence_presence',
+    )
+    fence = models.ForeignKey(GPSGeofence, on_delete=models.CASCADE, related_name='presence')
+    entered_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'fence'], name='gpsinfo_geofence_presence_uniq'),
+        ]
+
+class GPSGeofenceEvent(models.Model):
+    """
+    A user entering or leaving a geofence, timed by the fix that crossed it.
+    """
+    KIND_ENTER = 'enter'
+    KIND_EXIT = 'exit'
+    KIND_CHOICES = [
+        (KIND_ENTER, 'Enter'),
+        (KIND_EXIT, 'Exit'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='gps_geofence_events',
+    )
+    fence = models.ForeignKey(GPSGeofence, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField(help_text="Fix time of the crossing fix.")
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-occurred_at']),
+            models.Index(fields=['fence', '-occurred_at']),
+        ]
+        ordering = ['-occurred_at']
+        verbose_name = 'GPS Geofence Event'
+        verbose_name_plural = 'GPS Geofence Events'
+
+    def __str__(self):
+        return f"{self.user.username} {self.kind} {self.fence.name} at {self.occurred_at}"
+
+
+class GPSRefreshGap(models.Model):
+    """
+    A range of GPSLocation ids inside a window already folded in by a
+    watermark refresh (daily stats, heatmap) that had no visible rows at
+    the time: transactions that had not committed yet or were rolled back.
+    Rechecked on later runs until the rows appear or the gap expires.
+    """
+    job = models.CharField(max_length=32, help_text="Refresh job that skipped the ids.")
+    start_id = models.BigIntegerField(help_text="First missing id.")
+    end_id = models.BigIntegerField(help_text="Last missing id, included.")
+    # Set explicitly when a partly filled range is split, so the pieces keep its age
+    first_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'start_id'], name='gpsinfo_refresh_gap_start'),
+        ]
+        verbose_name = 'GPS Refresh Gap'
+        verbose_name_plural = 'GPS Refresh Gaps'
+
+    def __str__(self):
+        return f"{self.job} gap at {self.start_id}-{self.end_id}"
+
+
+class GPSFilterState(models.Model):
+    """
+    Per-user state of the ingest noise filters (see filter_services), by
+    filter name. The row is locked while a batch is filtered and stored,
+    so concurrent batches of one user are judged one after the other.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='gps_filter_state',
+    )
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'GPS Filter State'
+        verbose_name_plural = 'GPS Filter States'
+
+    def __str__(self):
+        return f"Filter state of {self.user.username}"
+
+
+class GPSQueueProgress(models.Model):
+    """
+    How far a claimed queue segment has been stored, written in the same
+    transaction as each drained batch. A drain interrupted after a commit
+    resumes behind that batch, so no fix is stored twice, whether or not
+    it carries a device sequence.
+    """
+    segment = models.CharField(max_length=64, unique=True, help_text="Claimed segment file name.")
+    offset = models.BigIntegerField(default=0, help_text="Bytes of the segment already stored.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'GPS Queue Progress'
+        verbose_name_plural = 'GPS Queue Progress'
+
+    def __str__(self):
+        return f"{self.segment} at {self.offset}"
@@ -0,0 +1,190 @@
+# gpsinfo/mvt.py
+"""
+Minimal Mapbox Vector Tile (spec 2.1) encoder.
+
+Covers what the GPS tile layers need: point and linestring features with
+string, number and bool properties. The protobuf wire format is written
+by hand, so no protobuf or MVT library is required. Each encoded layer is
+a complete ``Tile.layers`` field, and a tile is the concatenation of its
+layers, so layers can be cached and combined independently.
+"""
+import struct
+
+EXTENT = 4096
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+
+TILE_LAYERS = 3
+
+
+def varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def field_key(number, wire_type):
+    return varint((number << 3) | wire_type)
+
+
+def length_delimited(number, payload):
+    return field_key(number, WIRE_LENGTH) + varint(len(payload)) + payload
+
+
+def packed(number, values):
+    return length_delimited(number, b''.join(varint(value) for value in values))
+
+
+def encode_value(value):
+    if isinstance(value, bool):
+        return field_key(7, WIRE_VARINT) + varint(int(value))
+    if isinstance(value, int):
+        return field_key(6, WIRE_VARINT) + varint(zigzag(value))
+    if isinstance(value, float):
+        return field_key(3, WIRE_FIXED64) + struct.pack('<d', value)
+    return length_delimited(1, str(value).encode('utf-8'))
+
+
+def encode_geometry(geom_type, coords):
+    """
+    Command integers for a point set or a linestring of integer tile
+    coordinates, each delta-encoded from the previous cursor position.
+    """
+    commands = []
+    cursor_x = cursor_y = 0
+
+    def move(x, y):
+        nonlocal cursor_x, cursor_y
+        commands.extend((zigzag(x - cursor_x), zigzag(y - cursor_y)))
+        cursor_x, cursor_y = x, y
+
+    if geom_type == GEOM_POINT:
+        commands.append((len(coords) << 3) | CMD_MOVE_TO)
+        for x, y in coords:
+            move(x, y)
+    else:
+        commands.append((1 << 3) | CMD_MOVE_TO)
+        move(*coords[0])
+        commands.append(((len(coords) - 1) << 3) | CMD_LINE_TO)
+        for x, y in coords[1:]:
+            move(x, y)
+    return commands
+
+
+def clip_segment(x0, y0, x1, y1, low, high):
+    """
+    Liang-Barsky clip of a segment to the square [low, high]. Returns the
+    clipped (x0, y0, x1, y1), or None when the segment lies outside.
+    """
+    t0, t1 = 0.0, 1.0
+    dx, dy = x1 - x0, y1 - y0
+    for p, q in ((-dx, x0 - low), (dx, high - x0), (-dy, y0 - low), (dy, high - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    return x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy
+
+
+def clip_line(coords, low, high):
+    """
+    Clip a line of float tile coordinates to the square [low, high].
+    Returns the parts inside as lists of integer coordinates, with repeated
+    points dropped; a line that leaves and re-enters gives several parts.
+    """
+    parts = []
+    current = []
+    for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+        clipped = clip_segment(x0, y0, x1, y1, low, high)
+        if clipped is None:
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+            continue
+        start = (round(clipped[0]), round(clipped[1]))
+        end = (round(clipped[2]), round(clipped[3]))
+        if not current or current[-1] != start:
+            if len(current) > 1:
+                parts.append(current)
+            current = [start]
+        if end != current[-1]:
+            current.append(end)
+        if not (low <= x1 <= high and low <= y1 <= high):
+            # Left the square; the next segment starts a new part
+            if len(current) > 1:
+                parts.append(current)
+            current = []
+    if len(current) > 1:
+        parts.append(current)
+    return parts
+
+
+class LayerBuilder:
+    """
+    Collects features for one layer, sharing the key and value tables.
+    """
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def _tags(self, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            value_key = (type(value), value)
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault(value_key, len(self.values)))
+        return tags
+
+    def add_feature(self, geom_type, coords, properties=None, feature_id=None):
+        feature = b''
+        if feature_id is not None:
+            feature += field_key(1, WIRE_VARINT) + varint(feature_id)
+        tags = self._tags(properties or {})
+        if tags:
+            feature += packed(2, tags)
+        feature += field_key(3, WIRE_VARINT) + varint(geom_type)
+        feature += packed(4, encode_geometry(geom_type, coords))
+        self.features.append(feature)
+
+    def encode(self):
+        """
+        The layer as a Tile.layers field; empty layers encode to b''.
+        """
+        if not self.features:
+            return b''
+        layer = [field_key(15, WIRE_VARINT) + varint(2), length_delimited(1, self.name.encode('utf-8'))]
+        layer.extend(length_delimited(2, feature) for feature in self.features)
+        layer.extend(length_delimited(3, key.encode('utf-8')) for key in self.keys)
+        layer.extend(length_delimited(4, encode_value(value)) for _, value in self.values)
+        layer.append(field_key(5, WIRE_VARINT) + varint(self.extent))
+        return length_delimited(TILE_LAYERS, b''.join(layer))
@@ -0,0 +1,30 @@
+# gpsinfo/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class GPSLocationCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a user's GPS history, served by the
+    (user, timestamp) index. Newest first by default; ?order=asc walks
+    forward in time for incremental sync. ?limit sets the page size.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 500
+    page_size_query_param = 'limit'
+    max_page_size = 5000
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('order') == 'asc':
+            return ('timestamp', 'id')
+        return self.ordering
+
+
+class GPSSessionCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a user's sessions, newest first, served by the
+    (user, -started_at) index. ?limit sets the page size.
+    """
+    ordering = ('-started_at', '-id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
@@ -0,0 +1,213 @@
+# gpsinfo/renderers.py
+import json
+import math
+import struct
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Keys that mark a dict as a GPS point from GPSLocationSerializer/GPSLatestSerializer
+POINT_KEYS = {'latitude', 'longitude', 'timestamp'}
+
+PACKED_MAGIC = b'GSP1'
+# point count, username count
+PACKED_HEADER = struct.Struct('<II')
+# row id, epoch ms, lat e6, lon e6, altitude, accuracy, username index
+PACKED_RECORD = struct.Struct('<qqiiffI')
+PACKED_LENGTH = struct.Struct('<H')
+
+
+def split_points(data):
+    """
+    Separate the list of GPS points in a response from its envelope
+    (pagination links, counts). Returns (points, envelope), or (None, data)
+    when the response does not carry GPS points.
+    """
+    if isinstance(data, list):
+        points, envelope = data, {}
+    elif isinstance(data, dict) and isinstance(data.get('results'), list):
+        points = data['results']
+        envelope = {key: value for key, value in data.items() if key != 'results'}
+    else:
+        return None, data
+    if all(isinstance(point, dict) and POINT_KEYS <= point.keys() for point in points):
+        return points, envelope
+    return None, data
+
+
+def to_epoch_ms(value):
+    parsed = parse_datetime(value) if isinstance(value, str) else value
+    return int(parsed.timestamp() * 1000) if parsed else 0
+
+
+def to_e6(value):
+    return int(round(float(value) * 1e6))
+
+
+def delta_encode(values):
+    previous = 0
+    deltas = []
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+
+def columnar_encode(points):
+    """
+    Encode GPS points as parallel arrays. Time (epoch ms) and coordinates
+    (integer microdegrees) are delta encoded against the previous point,
+    and usernames are dictionary encoded, so a track compresses to small
+    integers instead of repeated JSON objects.
+    """
+    usernames = []
+    username_index = {}
+    user_refs = []
+    for point in points:
+        username = point.get('username')
+        if username not in username_index:
+            username_index[username] = len(usernames)
+            usernames.append(username)
+        user_refs.append(username_index[username])
+
+    encoded = {
+        'encoding': 'columnar-delta-e6',
+        'count': len(points),
+        'usernames': usernames,
+        'user': user_refs,
+        't': delta_encode([to_epoch_ms(point['timestamp']) for point in points]),
+        'lat': delta_encode([to_e6(point['latitude']) for point in points]),
+        'lon': delta_encode([to_e6(point['longitude']) for point in points]),
+        'alt': [point.get('altitude') for point in points],
+        'acc': [point.get('accuracy') for point in points],
+    }
+    if points and 'id' in points[0]:
+        encoded['id'] = delta_encode([point['id'] for point in points])
+    return encoded
+
+
+class GPSColumnarRenderer(JSONRenderer):
+    """
+    Columnar, delta-encoded JSON for GPS point lists.
+    Select with ``Accept: application/vnd.geostar.columnar+json`` or ?format=columnar.
+    Pagination envelopes are kept alongside the encoded points.
+    """
+    media_type = 'application/vnd.geostar.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        points, envelope = split_points(data)
+        if points is not None:
+            data = {**envelope, **columnar_encode(points)}
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class GPSPackedRenderer(BaseRenderer):
+    """
+    Packed little-endian binary for GPS point lists.
+    Select with ``Accept: application/vnd.geostar.packed`` or ?format=packed.
+
+    Layout: b'GSP1', uint32 point count, uint32 username count, the next
+    page URL as uint16 length + UTF-8 bytes (empty on the last page), then
+    each username as uint16 length + UTF-8 bytes, then one 36-byte record
+    per point: int64 row id (0 for latest positions), int64 epoch ms,
+    int32 lat e6, int32 lon e6, float32 altitude, float32 accuracy (NaN
+    when missing), uint32 username index.
+    The next page is also sent as a Link header. Responses without GPS
+    points (errors, messages) fall back to JSON. See decode_packed.
+    """
+    media_type = 'application/vnd.geostar.packed'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        points, envelope = split_points(data)
+
+        if points is None:
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return json.dumps(data, cls=JSONRenderer.encoder_class).encode()
+
+        if response is not None and envelope.get('next'):
+            response['Link'] = f'<{envelope["next"]}>; rel="next"'
+
+        usernames = []
+        username_index = {}
+        records = []
+        for point in points:
+            username = point.get('username') or ''
+            if username not in username_index:
+                username_index[username] = len(usernames)
+                usernames.append(username)
+            altitude = point.get('altitude')
+            accuracy = point.get('accuracy')
+            records.append(PACKED_RECORD.pack(
+                point.get('id') or 0,
+                to_epoch_ms(point['timestamp']),
+                to_e6(point['latitude']),
+                to_e6(point['longitude']),
+                math.nan if altitude is None else altitude,
+                math.nan if accuracy is None else accuracy,
+                username_index[username],
+            ))
+
+        header = [PACKED_MAGIC, PACKED_HEADER.pack(len(points), len(usernames))]
+        for text in [envelope.get('next') or '', *usernames]:
+            encoded = text.encode('utf-8')
+            header.append(PACKED_LENGTH.pack(len(encoded)) + encoded)
+        return b''.join(header + records)
+
+
+def decode_packed(body):
+    """
+    Decode a GPSPackedRenderer body into (points, next_url). Points are
+    dicts with id (None for latest positions), epoch ms timestamp,
+    coordinates rounded to microdegrees and None for missing values.
+    """
+    if body[:4] != PACKED_MAGIC:
+        raise ValueError("not a packed GPS body")
+    point_count, username_count = PACKED_HEADER.unpack_from(body, 4)
+    offset = 4 + PACKED_HEADER.size
+    texts = []
+    for _ in range(username_count + 1):
+        length = PACKED_LENGTH.unpack_from(body, offset)[0]
+        offset += PACKED_LENGTH.size
+        texts.append(body[offset:offset + length].decode('utf-8'))
+        offset += length
+    next_url, usernames = texts[0] or None, texts[1:]
+
+    points = []
+    for location_id, epoch_ms, lat, lon, altitude, accuracy, user_ref in PACKED_RECORD.iter_unpack(
+        body[offset:offset + PACKED_RECORD.size * point_count]
+    ):
+        points.append({
+            'id': location_id or None,
+            'username': usernames[user_ref],
+            'timestamp': epoch_ms,
+            'latitude': lat / 1e6,
+            'longitude': lon / 1e6,
+            'altitude': None if math.isnan(altitude) else altitude,
+            'accuracy': None if math.isnan(accuracy) else accuracy,
+        })
+    return points, next_url
+
+
+class TileRenderer(BaseRenderer):
+    """
+    Lets map tile requests negotiate any Accept header. Tile views return
+    the encoded tile as an HttpResponse, so this only renders errors,
+    which fall back to JSON.
+    """
+    media_type = '*/*'
+    format = 'tile'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data, cls=JSONRenderer.encoder_class).encode()
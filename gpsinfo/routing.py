@@ -0,0 +1,9 @@
+# gpsinfo/routing.py
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/gpslocations/live/', consumers.LivePositionConsumer.as_asgi()),
+    path('ws/gpslocations/live/<str:group>/', consumers.LivePositionConsumer.as_asgi()),
+]
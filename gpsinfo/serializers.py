@@ -1,14 +1,30 @@
 # gpsinfo/serializers.py
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import GPSLocation, GPSLatest
+from .models import GPSDailyStats, GPSGeofenceEvent, GPSLocation, GPSLatest, GPSSession
+
+# How far ahead of server time a device clock may run
+MAX_RECORDED_AT_SKEW = timedelta(minutes=5)
 
 class GPSLocationSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     
     class Meta:
         model = GPSLocation
-        fields = ['id', 'latitude', 'longitude', 'timestamp', 'altitude', 'accuracy', 'username']
+        fields = [
+            'id', 'latitude', 'longitude', 'timestamp', 'recorded_at',
+            'device_id', 'sequence', 'altitude', 'accuracy', 'username',
+        ]
         read_only_fields = ['timestamp', 'username']
+        # The partial unique constraint is enforced by the insert, not a pre-query
+        validators = []
+
+    def validate_recorded_at(self, value):
+        if value is not None and value > timezone.now() + MAX_RECORDED_AT_SKEW:
+            raise serializers.ValidationError("recorded_at is in the future.")
+        return value
 
 class GPSLatestSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -16,4 +32,40 @@ class GPSLatestSerializer(serializers.ModelSerializer):
     class Meta:
         model = GPSLatest
         fields = ['username', 'latitude', 'longitude', 'timestamp', 'altitude', 'accuracy']
-        read_only_fields = ['username', 'timestamp']
\ No newline at end of file
+        read_only_fields = ['username', 'timestamp']
+
+class GPSSessionSerializer(serializers.ModelSerializer):
+    bbox = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GPSSession
+        fields = [
+            'id', 'started_at', 'ended_at', 'duration_seconds', 'distance_m', 'point_count',
+            'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude', 'bbox', 'is_closed',
+        ]
+        read_only_fields = fields
+
+    def get_bbox(self, obj):
+        # Same min_lon,min_lat,max_lon,max_lat order as the ?bbox= filter
+        return [obj.min_longitude, obj.min_latitude, obj.max_longitude, obj.max_latitude]
+
+
+class GPSDailyStatsSerializer(serializers.ModelSerializer):
+    average_speed_mps = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = GPSDailyStats
+        fields = [
+            'day', 'distance_m', 'moving_seconds', 'average_speed_mps', 'max_speed_mps',
+            'elevation_gain_m', 'point_count',
+        ]
+        read_only_fields = fields
+
+
+class GPSGeofenceEventSerializer(serializers.ModelSerializer):
+    fence_name = serializers.CharField(source='fence.name', read_only=True)
+
+    class Meta:
+        model = GPSGeofenceEvent
+        fields = ['id', 'fence', 'fence_name', 'kind', 'occurred_at', 'latitude', 'longitude']
+        read_only_fields = fields
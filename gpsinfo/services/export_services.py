@@ -0,0 +1,146 @@
+# gpsinfo/services/export_services.py
+"""
+Streaming GPX, CSV and GeoJSON export of GPS tracks.
+
+Rows are read as plain tuples through a server-side cursor
+(QuerySet.iterator) and written out in chunks of EXPORT_CHUNK_SIZE fixes,
+so memory stays flat however long the track is. Every writer is a
+generator of text chunks that can back a StreamingHttpResponse or be
+written to a file by the gps_export command.
+
+Tracks are ordered by user, then by fix time (the device time when sent,
+else the receive time), and GPX output has one <trk> per user.
+"""
+import csv
+import io
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from ..models import GPSLocation
+from ..serializers import MAX_RECORDED_AT_SKEW
+
+# Rows fetched per cursor round trip and written per output chunk
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = ('username', 'time', 'latitude', 'longitude', 'altitude', 'accuracy')
+
+
+def track_rows(user_ids, since=None, until=None):
+    """
+    (username, fix_time, lat, lon, altitude, accuracy) tuples of the given
+    users' fixes with since <= fix time <= until, streamed in track order.
+    """
+    locations = GPSLocation.objects.filter(user_id__in=user_ids)
+    if since is not None:
+        # Device times may run ahead of the receive time by up to the accepted skew
+        locations = locations.filter(timestamp__gte=since - MAX_RECORDED_AT_SKEW)
+    locations = locations.annotate(fix_time=Coalesce('recorded_at', 'timestamp'))
+    if since is not None:
+        locations = locations.filter(fix_time__gte=since)
+    if until is not None:
+        locations = locations.filter(fix_time__lte=until)
+    rows = (
+        locations.order_by('user_id', 'fix_time', 'id')
+        .values_list(F('user__username'), 'fix_time', 'latitude', 'longitude', 'altitude', 'accuracy')
+    )
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def chunked(rows, render_row):
+    """
+    Join the rendered rows into text chunks of EXPORT_CHUNK_SIZE rows.
+    """
+    parts = []
+    for row in rows:
+        parts.append(render_row(row))
+        if len(parts) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+    if parts:
+        yield ''.join(parts)
+
+
+def write_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def render_row(row):
+        username, fix_time, lat, lon, altitude, accuracy = row
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow((username, fix_time.isoformat(), lat, lon, '' if altitude is None else altitude,
+                         '' if accuracy is None else accuracy))
+        return buffer.getvalue()
+
+    yield ','.join(CSV_HEADER) + '\n'
+    yield from chunked(rows, render_row)
+
+
+def write_geojson(rows):
+    """
+    A FeatureCollection with one Point feature per fix.
+    """
+    first = True
+
+    def render_row(row):
+        nonlocal first
+        username, fix_time, lat, lon, altitude, accuracy = row
+        coordinates = [lon, lat] if altitude is None else [lon, lat, altitude]
+        feature = json.dumps({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': coordinates},
+            'properties': {'username': username, 'time': fix_time.isoformat(), 'accuracy': accuracy},
+        }, separators=(',', ':'))
+        separator = '' if first else ',\n'
+        first = False
+        return separator + feature
+
+    yield '{"type":"FeatureCollection","features":[\n'
+    yield from chunked(rows, render_row)
+    yield '\n]}\n'
+
+
+def write_gpx(rows):
+    """
+    GPX 1.1 with one track per user.
+    """
+    current = None
+
+    def render_row(row):
+        nonlocal current
+        username, fix_time, lat, lon, altitude, accuracy = row
+        opening = ''
+        if username != current:
+            if current is not None:
+                opening = '</trkseg></trk>\n'
+            opening += f'<trk><name>{escape(username or "")}</name><trkseg>\n'
+            current = username
+        point = f'<trkpt lat={quoteattr(repr(lat))} lon={quoteattr(repr(lon))}>'
+        if altitude is not None:
+            point += f'<ele>{altitude!r}</ele>'
+        return f'{opening}{point}<time>{fix_time.isoformat()}</time></trkpt>\n'
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<gpx version="1.1" creator="GEOStar" xmlns="http://www.topografix.com/GPX/1/1">\n'
+    yield from chunked(rows, render_row)
+    if current is not None:
+        yield '</trkseg></trk>\n'
+    yield '</gpx>\n'
+
+
+# format: (writer, content type, file extension)
+EXPORT_FORMATS = {
+    'gpx': (write_gpx, 'application/gpx+xml', 'gpx'),
+    'csv': (write_csv, 'text/csv', 'csv'),
+    'geojson': (write_geojson, 'application/geo+json', 'geojson'),
+}
+
+
+def export_track(export_format, user_ids, since=None, until=None):
+    """
+    Text chunks of the given users' track in one of EXPORT_FORMATS.
+    """
+    writer = EXPORT_FORMATS[export_format][0]
+    return writer(track_rows(user_ids, since, until))
@@ -0,0 +1,227 @@
+# gpsinfo/services/filter_services.py
+"""
+Noise filtering of incoming fixes before they are stored.
+
+Validated fixes pass through the filters named in GPS_INGEST_FILTERS, in
+order, oldest fix first. A filter either rejects a fix with a reason or
+lets it through, possibly adjusted (the Kalman smoother moves it), and
+only sees the fixes the filters before it let through.
+
+Per-user filter state is kept in a GPSFilterState row. filter_fixes locks
+it (SELECT ... FOR UPDATE) inside the transaction that stores the batch,
+so concurrent batches of one user, on any worker, are judged one after
+the other. save_filter_state then advances the state by the fixes that
+were stored or rejected: a replayed duplicate, skipped by the idempotency
+key, leaves it as it was. In queued mode duplicates are only found when
+the queue is drained, so every queued fix advances the state.
+
+Rejected fixes are never written. They are reported in the ingest response
+and counted per reason in the cache (see rejected_counts).
+"""
+import copy
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from ..models import GPSFilterState
+from ..utils import haversine_m
+
+REJECTED_COUNT_KEY = 'gpsinfo:ingest_filter:rejected:{}'
+
+
+def fix_time(data):
+    """
+    The fix's device time in POSIX seconds, the form filters are given it
+    in, or None. Receive times are not used: a replayed or bulk-uploaded
+    batch arrives within a second, whatever its span.
+    """
+    recorded_at = data.get('recorded_at')
+    return recorded_at.timestamp() if recorded_at else None
+
+
+class AccuracyFilter:
+    """
+    Rejects fixes whose reported accuracy is zero or negative (never a real
+    fix) or worse than GPS_FILTER_MAX_ACCURACY_M. Fixes without an accuracy pass.
+    """
+    name = 'accuracy'
+
+    def __init__(self):
+        self.max_accuracy_m = getattr(settings, 'GPS_FILTER_MAX_ACCURACY_M', 100)
+
+    def process(self, state, data, when):
+        accuracy = data.get('accuracy')
+        if accuracy is not None and not 0 < accuracy <= self.max_accuracy_m:
+            return self.name
+        return None
+
+
+class SpeedFilter:
+    """
+    Rejects fixes that would mean moving faster than GPS_FILTER_MAX_SPEED_MPS
+    from the user's last accepted fix. Fixes without a device time and late
+    fixes (older than that one) cannot be judged and pass. After
+    MAX_CONSECUTIVE_REJECTS rejections in a row the last accepted fix is
+    taken to be the bad one, and the next fix is accepted as the new reference.
+    """
+    name = 'speed'
+
+    MAX_CONSECUTIVE_REJECTS = 5
+
+    def __init__(self):
+        self.max_speed_mps = getattr(settings, 'GPS_FILTER_MAX_SPEED_MPS', 100)
+
+    def process(self, state, data, when):
+        if when is None:
+            return None
+        last = state.get('last')
+        if last is not None:
+            last_time, last_lat, last_lon = last
+            if when < last_time:
+                return None
+            seconds = max(when - last_time, 1.0)
+            too_fast = haversine_m(last_lat, last_lon, data['latitude'], data['longitude']) / seconds > self.max_speed_mps
+            if too_fast and state.get('rejects', 0) < self.MAX_CONSECUTIVE_REJECTS:
+                state['rejects'] = state.get('rejects', 0) + 1
+                return self.name
+        state['last'] = (when, data['latitude'], data['longitude'])
+        state['rejects'] = 0
+        return None
+
+
+class KalmanSmoother:
+    """
+    Smooths positions with a constant-position Kalman filter per axis:
+    the estimate's variance grows by (GPS_FILTER_KALMAN_Q_MPS * dt)^2
+    between fixes and each fix pulls it in by its accuracy, so jitter while
+    standing still is damped and real movement is followed within seconds.
+    Fixes without a device time cannot be placed in time and pass unchanged.
+    Never rejects. The smoothed position replaces the reported one, which
+    is not stored.
+    """
+    name = 'kalman'
+
+    # Accuracy assumed for fixes that do not report one (metres)
+    DEFAULT_ACCURACY_M = 20
+
+    def __init__(self):
+        self.q_mps = getattr(settings, 'GPS_FILTER_KALMAN_Q_MPS', 3)
+
+    def process(self, state, data, when):
+        if when is None:
+            return None
+        accuracy = data.get('accuracy') or self.DEFAULT_ACCURACY_M
+        estimate = state.get('estimate')
+        if estimate is None or when < estimate[0]:
+            if estimate is None:
+                state['estimate'] = (when, data['latitude'], data['longitude'], accuracy * accuracy)
+            return None
+
+        last_time, lat, lon, variance = estimate
+        variance += ((when - last_time) * self.q_mps) ** 2
+        gain = variance / (variance + accuracy * accuracy)
+        lat += gain * (data['latitude'] - lat)
+        lon += gain * (data['longitude'] - lon)
+        state['estimate'] = (when, lat, lon, (1 - gain) * variance)
+        data['latitude'], data['longitude'] = lat, lon
+        return None
+
+
+@lru_cache(maxsize=None)
+def _load_filters(paths):
+    return tuple(import_string(path)() for path in paths)
+
+
+def get_ingest_filters():
+    """
+    Instances of the filters named in GPS_INGEST_FILTERS, built once per process.
+    """
+    return _load_filters(tuple(getattr(settings, 'GPS_INGEST_FILTERS', ())))
+
+
+def count_rejected(reasons):
+    for reason in reasons:
+        key = REJECTED_COUNT_KEY.format(reason)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(key, 1, None)
+
+
+def rejected_counts():
+    """
+    Fixes rejected so far, by the name of the filter that rejected them.
+    """
+    names = [ingest_filter.name for ingest_filter in get_ingest_filters()]
+    counts = cache.get_many([REJECTED_COUNT_KEY.format(name) for name in names])
+    return {name: counts.get(REJECTED_COUNT_KEY.format(name), 0) for name in names}
+
+
+def run_filters(filters, states, valid):
+    """
+    Judge (index, validated_data) pairs against states, timed fixes oldest
+    first and then the untimed ones in the order sent, updating states.
+    Returns {position in valid: reason} for the rejected fixes.
+    """
+    timed = sorted(
+        ((fix_time(data), position) for position, (_, data) in enumerate(valid)),
+        key=lambda item: (0, item[0]) if item[0] is not None else (1, item[1]),
+    )
+    reasons = {}
+    for when, position in timed:
+        data = valid[position][1]
+        for ingest_filter in filters:
+            reason = ingest_filter.process(states.setdefault(ingest_filter.name, {}), data, when)
+            if reason is not None:
+                reasons[position] = reason
+                break
+    return reasons
+
+
+def filter_fixes(user, valid):
+    """
+    Run (index, validated_data) pairs through the ingest filters. Call
+    inside the transaction that stores the kept fixes: the user's filter
+    state stays locked until it ends. Accepted fixes may have their
+    coordinates adjusted in place.
+    Returns (kept, rejected, run): the accepted pairs in their original
+    order, (index, reason) pairs for the rejected ones, and the run to pass
+    to save_filter_state with the indexes actually stored.
+    """
+    filters = get_ingest_filters()
+    if not filters or not valid:
+        return valid, [], None
+
+    row, _ = GPSFilterState.objects.select_for_update().get_or_create(user=user)
+    # Reported values, for replaying the batch without the fixes that were not stored
+    reported = [(index, copy.copy(data)) for index, data in valid]
+    states = copy.deepcopy(row.state)
+    reasons = run_filters(filters, states, valid)
+
+    if reasons:
+        count_rejected(reasons.values())
+    kept = [item for position, item in enumerate(valid) if position not in reasons]
+    rejected = [(valid[position][0], reason) for position, reason in sorted(reasons.items())]
+    run = {'row': row, 'reported': reported, 'states': states, 'kept': {index for index, _ in kept}}
+    return kept, rejected, run
+
+
+def save_filter_state(run, stored):
+    """
+    Save the filter state advanced by the rejected fixes and by the kept
+    fixes whose indexes are in stored; kept fixes that were not stored
+    (duplicates) do not count.
+    """
+    if run is None:
+        return
+    states = run['states']
+    skipped = run['kept'] - set(stored)
+    if skipped:
+        states = copy.deepcopy(run['row'].state)
+        run_filters(get_ingest_filters(), states, [item for item in run['reported'] if item[0] not in skipped])
+    run['row'].state = states
+    run['row'].save(update_fields=['state', 'updated_at'])
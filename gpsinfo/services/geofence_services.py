@@ -0,0 +1,196 @@
+# gpsinfo/services/geofence_services.py
+"""
+Geofence entry/exit detection on the ingest path.
+
+Active fences are held per process in a uniform grid: each cell of
+GRID_CELL_DEG degrees lists the fences whose bounding box overlaps it, so
+a fix is only tested against the few fences near it. The grid is rebuilt
+when a fence is saved or deleted, which bumps a version in the shared
+cache (CACHES must be one store for all workers) that every process
+checks once per ingest batch.
+
+Which fences each user is inside is read from GPSGeofencePresence, one
+indexed query per batch, so every worker starts from the same presence.
+Transitions write a presence change and a GPSGeofenceEvent; the presence
+change is made first and decides whether the event is recorded, so two
+workers never log the same crossing twice.
+
+Fixes are evaluated in fix-time order. The time of the last fix evaluated
+for each user is kept in the shared cache, and older fixes (a delayed
+offline batch) are skipped: they cannot be placed against a presence that
+already reflects newer positions.
+"""
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import GPSGeofence, GPSGeofenceEvent, GPSGeofencePresence
+from ..utils import haversine_m, radius_to_bbox
+
+GRID_CELL_DEG = 0.01
+# Fences spanning more cells than this are checked against every fix instead
+MAX_FENCE_CELLS = 10000
+
+INDEX_VERSION_KEY = 'gpsinfo:geofence_index_version'
+LAST_FIX_CACHE_KEY = 'gpsinfo:geofence_last_fix:{}'
+LAST_FIX_CACHE_SECONDS = 3600
+
+
+def point_in_polygon(lat, lon, vertices):
+    """
+    Even-odd ray casting over [(lat, lon), ...] vertices.
+    """
+    inside = False
+    j = len(vertices) - 1
+    for i in range(len(vertices)):
+        lat_i, lon_i = vertices[i]
+        lat_j, lon_j = vertices[j]
+        if (lat_i > lat) != (lat_j > lat) and lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class GeofenceIndex:
+    """
+    Uniform grid over the bounding boxes of a set of fences.
+    """
+
+    def __init__(self, fences):
+        self.cells = {}
+        self.large = []
+        for fence in fences:
+            if fence.shape == GPSGeofence.SHAPE_CIRCLE:
+                center = (fence.center_latitude, fence.center_longitude)
+                entry = (fence.id, center, fence.radius_m, None)
+                min_lat, min_lon, max_lat, max_lon = radius_to_bbox(*center, fence.radius_m)
+            else:
+                vertices = [(float(lat), float(lon)) for lat, lon in fence.polygon]
+                entry = (fence.id, None, None, vertices)
+                min_lat, max_lat = min(v[0] for v in vertices), max(v[0] for v in vertices)
+                min_lon, max_lon = min(v[1] for v in vertices), max(v[1] for v in vertices)
+            rows = range(self.cell(min_lat), self.cell(max_lat) + 1)
+            cols = range(self.cell(min_lon), self.cell(max_lon) + 1)
+            if min_lon > max_lon or len(rows) * len(cols) > MAX_FENCE_CELLS:
+                # Very large or antimeridian-crossing fences skip the grid
+                self.large.append(entry)
+                continue
+            for row in rows:
+                for col in cols:
+                    self.cells.setdefault((row, col), []).append(entry)
+        self.empty = not self.cells and not self.large
+
+    @staticmethod
+    def cell(degrees):
+        return math.floor(degrees / GRID_CELL_DEG)
+
+    def containing(self, lat, lon):
+        """
+        Ids of the fences that contain a point.
+        """
+        inside = set()
+        for fence_id, center, radius_m, vertices in self.cells.get((self.cell(lat), self.cell(lon)), ()):
+            if self._contains(lat, lon, center, radius_m, vertices):
+                inside.add(fence_id)
+        for fence_id, center, radius_m, vertices in self.large:
+            if self._contains(lat, lon, center, radius_m, vertices):
+                inside.add(fence_id)
+        return inside
+
+    @staticmethod
+    def _contains(lat, lon, center, radius_m, vertices):
+        if vertices is None:
+            return haversine_m(center[0], center[1], lat, lon) <= radius_m
+        return point_in_polygon(lat, lon, vertices)
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def bump_index_version():
+    cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+
+
+def get_geofence_index():
+    """
+    This process's grid of active fences, rebuilt when a fence changed.
+    """
+    global _index, _index_version
+    cache.add(INDEX_VERSION_KEY, time.time_ns(), None)
+    version = cache.get(INDEX_VERSION_KEY)
+    if _index is None or version != _index_version:
+        with _index_lock:
+            if _index is None or version != _index_version:
+                _index = GeofenceIndex(GPSGeofence.objects.filter(is_active=True))
+                _index_version = version
+    return _index
+
+
+def get_presence(user_id):
+    return frozenset(GPSGeofencePresence.objects.filter(user_id=user_id).values_list('fence_id', flat=True))
+
+
+def detect_transitions(index, presence, fixes):
+    """
+    Run (fix_time, lat, lon) tuples, oldest first, through the index from
+    the set of fences the user is in. Returns (transitions, presence) where
+    transitions are (kind, fence_id, fix_time, lat, lon) tuples.
+    """
+    transitions = []
+    presence = set(presence)
+    for fix_time, lat, lon in fixes:
+        inside = index.containing(lat, lon)
+        if inside == presence:
+            continue
+        for fence_id in sorted(inside - presence):
+            transitions.append((GPSGeofenceEvent.KIND_ENTER, fence_id, fix_time, lat, lon))
+        for fence_id in sorted(presence - inside):
+            transitions.append((GPSGeofenceEvent.KIND_EXIT, fence_id, fix_time, lat, lon))
+        presence = inside
+    return transitions, frozenset(presence)
+
+
+def evaluate_fixes(user, locations):
+    """
+    Detect the geofence crossings of newly stored GPSLocation rows and
+    persist them. Fixes are taken oldest first; those not newer than the
+    user's last evaluated fix are skipped.
+    Returns the GPSGeofenceEvent rows created.
+    """
+    index = get_geofence_index()
+    if index.empty:
+        return []
+    last_fix_key = LAST_FIX_CACHE_KEY.format(user.pk)
+    last_fix_at = cache.get(last_fix_key)
+    fixes = sorted(
+        (location.fix_time, location.latitude, location.longitude) for location in locations
+        if last_fix_at is None or location.fix_time > last_fix_at
+    )
+    if not fixes:
+        return []
+    newest = fixes[-1][0]
+    transaction.on_commit(lambda: cache.set(last_fix_key, newest, LAST_FIX_CACHE_SECONDS))
+    transitions, _ = detect_transitions(index, get_presence(user.pk), fixes)
+    if not transitions:
+        return []
+
+    events = []
+    with transaction.atomic():
+        for kind, fence_id, fix_time, lat, lon in transitions:
+            if kind == GPSGeofenceEvent.KIND_ENTER:
+                _, changed = GPSGeofencePresence.objects.get_or_create(
+                    user=user, fence_id=fence_id, defaults={'entered_at': fix_time},
+                )
+            else:
+                changed, _ = GPSGeofencePresence.objects.filter(user=user, fence_id=fence_id).delete()
+            if changed:
+                events.append(GPSGeofenceEvent(
+                    user=user, fence_id=fence_id, kind=kind, occurred_at=fix_time, latitude=lat, longitude=lon,
+                ))
+        GPSGeofenceEvent.objects.bulk_create(events)
+    return events
@@ -0,0 +1,48 @@
+# gpsinfo/services/group_services.py
+"""
+Cached snapshots of the latest positions of a user_group.
+
+Ingest (web workers, the gps_drain worker, gps_import) drops a member's
+group snapshot when the member posts a fix. That reaches every process
+only because settings configure one shared Redis cache: with a
+per-process cache a snapshot could be served up to GPS_GROUP_SNAPSHOT_TTL
+seconds stale by the workers that did not see the fix.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import GPSLatest
+from ..serializers import GPSLatestSerializer
+
+GROUP_SNAPSHOT_CACHE_KEY = 'gpsinfo:group_latest:{}'
+
+
+def group_cache_key(user_group):
+    # Group names are free text; hash them into a cache-safe key
+    return GROUP_SNAPSHOT_CACHE_KEY.format(hashlib.md5(user_group.encode('utf-8')).hexdigest())
+
+
+def get_group_snapshot(user_group):
+    """
+    Serialized latest positions of every member of a user_group.
+    Built from the user_group index on a cache miss and cached until a
+    member posts a new fix (or GPS_GROUP_SNAPSHOT_TTL seconds pass).
+    """
+    cache_key = group_cache_key(user_group)
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        latest_locations = GPSLatest.objects.select_related('user').filter(user__user_group=user_group)
+        snapshot = list(GPSLatestSerializer(latest_locations, many=True).data)
+        cache.set(cache_key, snapshot, getattr(settings, 'GPS_GROUP_SNAPSHOT_TTL', 30))
+    return snapshot
+
+
+def invalidate_group_snapshots(user_groups):
+    """
+    Drop the cached snapshots of the given user_groups.
+    """
+    keys = [group_cache_key(user_group) for user_group in user_groups if user_group]
+    if keys:
+        cache.delete_many(keys)
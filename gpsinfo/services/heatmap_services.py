@@ -0,0 +1,239 @@
+# gpsinfo/services/heatmap_services.py
+"""
+Heatmap tile pyramid over the whole GPS history.
+
+Every point is counted once per zoom level, 0 to GPS_HEATMAP_MAX_ZOOM, in
+a HEATMAP_GRID x HEATMAP_GRID grid inside its XYZ tile. Points are binned
+on integer grid coordinates at the deepest zoom and shifted down for the
+coarser levels, so one projection per point feeds the whole pyramid.
+
+``manage.py gps_heatmap`` folds in rows above an id watermark, one window
+per transaction. Ids a window did not see are kept as gaps (see
+watermark_services), and rows that commit into them later are added on
+the next run.
+A tile request reads the tile's version by its (z, x, y) key and serves
+the rendering cached under that version, rendering it on a miss. A refresh
+changes the version, so no process has to drop cached renderings and a
+stale one is never served; raw points are never scanned per request.
+"""
+import math
+import sys
+import zlib
+from array import array
+from collections import defaultdict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from ..models import GPSHeatmapTile, GPSLocation
+from ..utils import mercator_tile_xy
+from .watermark_services import close_gaps, gap_filter, open_gaps, record_gaps
+
+HEATMAP_GRID = 64
+GRID_BITS = 6
+RENDER_SIZE = 256
+
+# GPSLocation rows read per refresh window
+HEATMAP_WINDOW_SIZE = 50000
+
+GAP_JOB = 'heatmap'
+
+TILE_CACHE_KEY = 'gpsinfo:heatmap:{}:{}:{}:{}:{}'
+
+
+def heatmap_max_zoom():
+    return getattr(settings, 'GPS_HEATMAP_MAX_ZOOM', 16)
+
+
+def tile_tag(z, x, y, last_location_id, version, total):
+    # Rebuilt tiles restart their version, so the watermark and total are part of the tag
+    return f'{z}-{x}-{y}-{last_location_id}-{version}-{total}'
+
+
+def tile_cache_key(fmt, z, x, y, tag):
+    return TILE_CACHE_KEY.format(fmt, z, x, y, tag)
+
+
+def encode_counts(counts):
+    if sys.byteorder != 'little':
+        counts = array('I', counts)
+        counts.byteswap()
+    return zlib.compress(counts.tobytes())
+
+
+def decode_counts(data):
+    counts = array('I')
+    counts.frombytes(zlib.decompress(bytes(data)))
+    if sys.byteorder != 'little':
+        counts.byteswap()
+    return counts
+
+
+def bin_points(points, max_zoom):
+    """
+    Count (lat, lon) points into {(z, x, y): {bin_index: count}} for every
+    zoom level up to max_zoom. bin_index is row * HEATMAP_GRID + column.
+    """
+    bins = defaultdict(lambda: defaultdict(int))
+    mask = HEATMAP_GRID - 1
+    for lat, lon in points:
+        fx, fy = mercator_tile_xy(lat, lon, max_zoom)
+        gx, gy = int(fx * HEATMAP_GRID), int(fy * HEATMAP_GRID)
+        for z in range(max_zoom, -1, -1):
+            bins[(z, gx >> GRID_BITS, gy >> GRID_BITS)][(gy & mask) * HEATMAP_GRID + (gx & mask)] += 1
+            gx >>= 1
+            gy >>= 1
+    return bins
+
+
+def add_bins(bins, location_id):
+    """
+    Add binned counts to the stored tiles and raise their last_location_id
+    to at least location_id. Call inside a transaction.
+    Returns the tiles written.
+    """
+    by_zoom = defaultdict(list)
+    for z, x, y in bins:
+        by_zoom[z].append((x, y))
+    existing = {}
+    for z, coords in by_zoom.items():
+        candidates = GPSHeatmapTile.objects.select_for_update().filter(
+            z=z, x__in={x for x, _ in coords}, y__in={y for _, y in coords},
+        )
+        existing.update({(tile.z, tile.x, tile.y): tile for tile in candidates})
+
+    tiles = []
+    for (z, x, y), increments in bins.items():
+        tile = existing.get((z, x, y))
+        if tile is None:
+            tile = GPSHeatmapTile(z=z, x=x, y=y, version=0, last_location_id=location_id)
+            counts = array('I', bytes(4 * HEATMAP_GRID * HEATMAP_GRID))
+        else:
+            counts = decode_counts(tile.counts)
+        for index, count in increments.items():
+            counts[index] += count
+        tile.counts = encode_counts(counts)
+        tile.total += sum(increments.values())
+        tile.max_count = max(counts)
+        tile.version += 1
+        tile.last_location_id = max(tile.last_location_id, location_id)
+        tiles.append(tile)
+
+    GPSHeatmapTile.objects.bulk_create(
+        tiles,
+        update_conflicts=True,
+        unique_fields=['z', 'x', 'y'],
+        update_fields=['counts', 'total', 'max_count', 'version', 'last_location_id'],
+        batch_size=500,
+    )
+    return tiles
+
+
+def refresh_window(low_id, high_id, max_zoom):
+    """
+    Add GPSLocation rows with low_id < id <= high_id to the tile pyramid.
+    Returns the number of tiles written.
+    """
+    seen_ids = []
+    points = []
+    for location_id, lat, lon in (
+        GPSLocation.objects.filter(id__gt=low_id, id__lte=high_id)
+        .values_list('id', 'latitude', 'longitude').iterator(chunk_size=5000)
+    ):
+        seen_ids.append(location_id)
+        points.append((lat, lon))
+    bins = bin_points(points, max_zoom)
+
+    with transaction.atomic():
+        record_gaps(GAP_JOB, low_id, high_id, seen_ids)
+        tiles = add_bins(bins, high_id) if bins else []
+    return len(tiles)
+
+
+def refresh_gaps(watermark, max_zoom):
+    """
+    Add the rows that committed into earlier windows' gaps. Each row is
+    added in the transaction that closes its gap, so it is counted once.
+    Returns the number of tiles written.
+    """
+    written = 0
+    for gaps in open_gaps(GAP_JOB):
+        rows = list(GPSLocation.objects.filter(gap_filter(gaps)).values_list('id', 'latitude', 'longitude'))
+        if not rows:
+            continue
+        bins = bin_points([(lat, lon) for _, lat, lon in rows], max_zoom)
+        with transaction.atomic():
+            tiles = add_bins(bins, watermark)
+            close_gaps(GAP_JOB, gaps, [location_id for location_id, _, _ in rows])
+        written += len(tiles)
+    return written
+
+
+def refresh_heatmap(window_size=HEATMAP_WINDOW_SIZE, on_window=None):
+    """
+    Bring the pyramid up to date with every GPSLocation row stored so far:
+    rows that filled earlier gaps first, then one id window per transaction.
+    ``on_window(low_id, high_id, tiles)`` reports progress.
+    Returns the number of tiles written.
+    """
+    max_zoom = heatmap_max_zoom()
+    watermark = GPSHeatmapTile.objects.aggregate(watermark=Max('last_location_id'))['watermark'] or 0
+    high_water = GPSLocation.objects.aggregate(high_water=Max('id'))['high_water'] or 0
+    written = refresh_gaps(watermark, max_zoom)
+    while watermark < high_water:
+        window_end = min(watermark + window_size, high_water)
+        tiles = refresh_window(watermark, window_end, max_zoom)
+        written += tiles
+        if on_window:
+            on_window(watermark, window_end, tiles)
+        watermark = window_end
+    return written
+
+
+def render_png(tile):
+    """
+    Render a tile's counts on a log scale as a transparent RGBA PNG,
+    running from dark red through orange to yellow at the busiest bin.
+    """
+    counts = decode_counts(tile.counts)
+    scale = 255 / math.log1p(tile.max_count) if tile.max_count else 0
+    intensity = Image.frombytes(
+        'L', (HEATMAP_GRID, HEATMAP_GRID), bytes(int(math.log1p(count) * scale) for count in counts)
+    ).resize((RENDER_SIZE, RENDER_SIZE), Image.BILINEAR)
+    image = Image.merge('RGBA', (
+        intensity.point(lambda v: min(255, 96 + v)),
+        intensity.point(lambda v: max(0, 2 * v - 255)),
+        intensity.point(lambda v: 0),
+        intensity.point(lambda v: 0 if v == 0 else min(255, 64 + v)),
+    ))
+    output = BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+def get_heatmap_tile(fmt, z, x, y):
+    """
+    Rendering of one tile as {'etag', 'body'}, cached per tile version;
+    etag is None for a tile without points. 'bin' bodies are the
+    zlib-compressed counts.
+    """
+    state = GPSHeatmapTile.objects.filter(z=z, x=x, y=y).values_list('last_location_id', 'version', 'total').first()
+    if state is None:
+        return {'etag': None, 'body': b''}
+    tag = tile_tag(z, x, y, *state)
+    key = tile_cache_key(fmt, z, x, y, tag)
+    entry = cache.get(key)
+    if entry is None:
+        tile = GPSHeatmapTile.objects.get(z=z, x=x, y=y)
+        # Cached under the version actually rendered, which a refresh may have advanced
+        tag = tile_tag(z, x, y, tile.last_location_id, tile.version, tile.total)
+        entry = {
+            'etag': f'"hm-{fmt}-{tag}"',
+            'body': render_png(tile) if fmt == 'png' else bytes(tile.counts),
+        }
+        cache.set(tile_cache_key(fmt, z, x, y, tag), entry, getattr(settings, 'GPS_HEATMAP_CACHE_SECONDS', 86400))
+    return entry
@@ -0,0 +1,211 @@
+# gpsinfo/services/import_services.py
+"""
+Streaming import of historical GPS tracks from CSV, NDJSON and GPX files.
+
+Readers yield ``(record, offset)`` pairs one at a time, so memory stays
+bounded whatever the file size. For CSV and NDJSON the offset is the byte
+position after the record; for GPX it is the number of track points read.
+Passing an offset back in resumes an interrupted import from that point.
+"""
+import csv
+import json
+import xml.etree.ElementTree as ET
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import GPSLocation
+from .ingest_services import copy_fixes, insert_fixes
+
+# Record keys holding the fix time and the owner, in order of preference
+TIME_KEYS = ('recorded_at', 'time', 'timestamp')
+USER_KEYS = ('username', 'user')
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_csv(stream, offset=0):
+    """
+    Yield one dict per CSV row, keyed by the lower-cased header.
+    Quoted fields may not span lines.
+    """
+    header = [name.strip().lower() for name in next(csv.reader([stream.readline().decode('utf-8-sig')]))]
+    if offset:
+        stream.seek(offset)
+    else:
+        offset = stream.tell()
+    for line in stream:
+        offset += len(line)
+        text = line.decode('utf-8').rstrip('\r\n')
+        if text:
+            yield dict(zip(header, next(csv.reader([text])))), offset
+
+
+def read_ndjson(stream, offset=0):
+    """
+    Yield one dict per NDJSON line; unreadable lines yield None.
+    """
+    stream.seek(offset)
+    for line in stream:
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield (record if isinstance(record, dict) else None), offset
+
+
+def read_gpx(stream, offset=0):
+    """
+    Yield one dict per GPX track or route point with iterparse, dropping
+    each point from the tree once read. The offset counts points.
+    """
+    index = 0
+    parent = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = local_name(elem.tag)
+        if event == 'start':
+            if tag in ('trkseg', 'rte'):
+                parent = elem
+            continue
+        if tag not in ('trkpt', 'rtept'):
+            continue
+        index += 1
+        if index > offset:
+            record = {'latitude': elem.get('lat'), 'longitude': elem.get('lon')}
+            for child in elem:
+                name = local_name(child.tag)
+                if name == 'ele':
+                    record['altitude'] = child.text
+                elif name == 'time':
+                    record['time'] = child.text
+            yield record, index
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+    'gpx': read_gpx,
+}
+
+
+def record_username(record):
+    username = next((record[key] for key in USER_KEYS if record.get(key)), None)
+    return str(username) if username else None
+
+
+def _optional_float(value):
+    return None if value in (None, '') else float(value)
+
+
+def build_location(record, user):
+    """
+    Turn a raw import record into an unsaved GPSLocation for user.
+    The fix time goes into recorded_at and timestamp is the ingest time,
+    as for posted fixes: retention counts from when a row was stored, so
+    an imported history is not deleted by the next gps_retention run.
+    Raises ValueError (or KeyError/TypeError) on unusable records.
+    """
+    latitude = float(record['latitude'])
+    longitude = float(record['longitude'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("coordinates out of range")
+
+    raw_time = next((record[key] for key in TIME_KEYS if record.get(key)), None)
+    fix_time = parse_datetime(raw_time) if isinstance(raw_time, str) else None
+    if fix_time is None:
+        raise ValueError("missing or invalid fix time")
+    if timezone.is_naive(fix_time):
+        fix_time = timezone.make_aware(fix_time)
+
+    sequence = record.get('sequence')
+    return GPSLocation(
+        user=user,
+        latitude=latitude,
+        longitude=longitude,
+        timestamp=timezone.now(),
+        recorded_at=fix_time,
+        altitude=_optional_float(record.get('altitude')),
+        accuracy=_optional_float(record.get('accuracy')),
+        device_id=str(record.get('device_id') or '')[:64],
+        sequence=None if sequence in (None, '') else int(sequence),
+    )
+
+
+def _chunks(records, chunk_size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_locations(records, default_user=None, chunk_size=10000, on_chunk=None):
+    """
+    Store ``(record, offset)`` pairs in chunks of chunk_size, one transaction
+    per chunk (COPY on PostgreSQL). Usernames are resolved once per chunk
+    with a single query; records without one belong to default_user.
+    fixes_recorded is not sent for historical rows.
+
+    ``on_chunk(offset, stats)`` runs after each committed chunk, with the
+    offset to resume from. Returns (stats, user_ids) where stats counts
+    imported, duplicate, rejected and unknown-user records.
+    """
+    User = get_user_model()
+    users = {}
+    user_ids = set()
+    stats = {'imported': 0, 'duplicates': 0, 'rejected': 0, 'unknown_user': 0}
+
+    for chunk in _chunks(records, chunk_size):
+        usernames = {record_username(record) for record, _ in chunk if record} - {None} - users.keys()
+        if usernames:
+            found = User.objects.filter(username__in=usernames).in_bulk(field_name='username')
+            users.update({username: found.get(username) for username in usernames})
+
+        seen_keys = set()
+        locations = []
+        for record, _ in chunk:
+            if record is None:
+                stats['rejected'] += 1
+                continue
+            username = record_username(record)
+            user = users.get(username) if username else default_user
+            if user is None:
+                stats['unknown_user'] += 1
+                continue
+            try:
+                location = build_location(record, user)
+            except (KeyError, TypeError, ValueError):
+                stats['rejected'] += 1
+                continue
+            if location.sequence is not None:
+                key = (user.pk, location.device_id, location.sequence)
+                if key in seen_keys:
+                    stats['duplicates'] += 1
+                    continue
+                seen_keys.add(key)
+            locations.append(location)
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                inserted = copy_fixes(locations, returning=False) if locations else 0
+            else:
+                inserted = len(insert_fixes(locations))
+        stats['imported'] += inserted
+        stats['duplicates'] += len(locations) - inserted
+        user_ids.update(location.user_id for location in locations)
+        if on_chunk:
+            on_chunk(chunk[-1][1], stats)
+    return stats, user_ids
@@ -0,0 +1,209 @@
+# gpsinfo/services/ingest_services.py
+import io
+
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from ..models import GPSLocation
+from ..signals import fixes_recorded
+from .latest_services import build_latest, latest_buffer, latest_defaults, upsert_latest, write_behind_enabled
+
+# Rows per INSERT statement, well inside the bind parameter limits
+INSERT_BATCH_SIZE = 1000
+
+STAGE_TABLE = 'gpsinfo_gpslocation_stage'
+
+
+def update_latest(user, gps_location):
+    """
+    Point the user's GPSLatest row at the given GPSLocation, unless the
+    stored position is from a newer fix.
+    In write-behind mode the row is buffered once the transaction commits
+    and flushed in a later batch instead of being upserted here.
+    """
+    fields = latest_defaults(gps_location)
+    if write_behind_enabled():
+        transaction.on_commit(lambda: latest_buffer.put(user, fields))
+        return
+
+    upsert_latest([build_latest(user, fields)])
+
+
+def insert_fixes(locations):
+    """
+    INSERT unsaved GPSLocation objects with ON CONFLICT DO NOTHING, so fixes
+    whose device/sequence key is already stored are skipped without an
+    error or a lookup. Keys must be unique within the call. A timestamp
+    already set on an object (a queued fix's receive time) is kept.
+    Sets the primary key on, and returns, the objects actually inserted.
+    """
+    meta = GPSLocation._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    qn = connection.ops.quote_name
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    inserted = []
+    for start in range(0, len(locations), INSERT_BATCH_SIZE):
+        batch = locations[start:start + INSERT_BATCH_SIZE]
+        params = []
+        for location in batch:
+            params.extend(
+                field.get_db_prep_save(field.pre_save(location, getattr(location, field.attname) is None), connection)
+                for field in fields
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT DO NOTHING "
+                f"RETURNING {qn(meta.pk.column)}, {qn('user_id')}, {qn('device_id')}, {qn('sequence')}",
+                params
+            )
+            rows = cursor.fetchall()
+
+        # Keyed rows are matched by key; unkeyed rows can never conflict and
+        # come back in VALUES order, the same ordering bulk_create relies on
+        keyed_ids = {tuple(key): pk for pk, *key in rows if key[2] is not None}
+        unkeyed_ids = iter([pk for pk, *key in rows if key[2] is None])
+        for location in batch:
+            if location.sequence is None:
+                location.pk = next(unkeyed_ids)
+            else:
+                location.pk = keyed_ids.get((location.user_id, location.device_id, location.sequence))
+            if location.pk is not None:
+                location._state.adding = False
+                location._state.db = connection.alias
+                inserted.append(location)
+    return inserted
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_fixes(locations, returning=True):
+    """
+    Load GPSLocation objects into a temporary staging table with COPY and
+    move them into the table with INSERT ... ON CONFLICT DO NOTHING, so
+    already stored device sequences are skipped. PostgreSQL only; must run
+    inside a transaction. Returns the inserted rows as GPSLocation objects,
+    or just their number when returning is False.
+    """
+    meta = GPSLocation._meta
+    qn = connection.ops.quote_name
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    columns = ', '.join(qn(field.column) for field in fields)
+
+    buffer = io.StringIO()
+    for location in locations:
+        values = (field.get_db_prep_save(getattr(location, field.attname), connection) for field in fields)
+        buffer.write('\t'.join(_copy_value(value) for value in values) + '\n')
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE {qn(STAGE_TABLE)} AS "
+            f"SELECT {columns} FROM {qn(meta.db_table)} WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY {qn(STAGE_TABLE)} ({columns}) FROM STDIN", buffer)
+        insert_sql = (
+            f"INSERT INTO {qn(meta.db_table)} ({columns}) SELECT {columns} FROM {qn(STAGE_TABLE)} "
+            f"ON CONFLICT DO NOTHING"
+        )
+        if returning:
+            cursor.execute(f"{insert_sql} RETURNING {', '.join(qn(field.column) for field in meta.concrete_fields)}")
+            rows = cursor.fetchall()
+        else:
+            cursor.execute(insert_sql)
+            count = cursor.rowcount
+        # Dropped now rather than on commit, so the same transaction can stage another batch
+        cursor.execute(f"DROP TABLE {qn(STAGE_TABLE)}")
+    if not returning:
+        return count
+    field_names = [field.attname for field in meta.concrete_fields]
+    return [GPSLocation.from_db(connection.alias, field_names, row) for row in rows]
+
+
+def store_fix(user, data):
+    """
+    Store one validated fix. A retry of a fix whose device/sequence key is
+    already stored gets the stored row back instead of a new one.
+    Returns (location, created).
+    """
+    location = GPSLocation(user=user, **data)
+    if insert_fixes([location]):
+        return location, True
+    existing = (
+        GPSLocation.objects.select_related('user')
+        .filter(user=user, device_id=location.device_id, sequence=location.sequence)
+        .order_by('id').first()
+    )
+    return existing, False
+
+
+def record_location(user, gps_location):
+    """
+    Finish ingesting a single stored GPSLocation: advance GPSLatest and
+    notify fixes_recorded receivers.
+    """
+    with transaction.atomic():
+        update_latest(user, gps_location)
+        fixes_recorded.send(sender=GPSLocation, user=user, locations=[gps_location])
+
+
+def validate_fixes(serializer, items):
+    """
+    Validate a batch of raw fixes in one pass with a single serializer instance.
+    Returns (valid, results) where valid is a list of (index, validated_data)
+    and results holds one accept/reject entry per input item.
+    """
+    valid = []
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({
+                'index': index,
+                'status': 'rejected',
+                'errors': {'non_field_errors': ['Expected a JSON object.']},
+            })
+            continue
+        try:
+            valid.append((index, serializer.run_validation(item)))
+            results.append({'index': index, 'status': 'accepted'})
+        except serializers.ValidationError as exc:
+            results.append({'index': index, 'status': 'rejected', 'errors': exc.detail})
+    return valid, results
+
+
+def ingest_fixes(user, valid):
+    """
+    Store validated fixes with one INSERT ... ON CONFLICT DO NOTHING and
+    advance GPSLatest once, from the newest fix that was inserted.
+    Fixes repeating a device/sequence key that is already stored, or seen
+    earlier in the batch, are skipped.
+    Returns a list parallel to valid holding the created GPSLocation, or
+    None for a duplicate.
+    """
+    if not valid:
+        return []
+
+    seen_keys = set()
+    candidates = []
+    for _, data in valid:
+        location = GPSLocation(user=user, **data)
+        key = (location.device_id, location.sequence)
+        if location.sequence is not None and key in seen_keys:
+            candidates.append(None)
+            continue
+        seen_keys.add(key)
+        candidates.append(location)
+
+    with transaction.atomic():
+        inserted = insert_fixes([location for location in candidates if location is not None])
+        if inserted:
+            # Fixes can arrive out of order; receivers get them oldest fix first
+            inserted.sort(key=lambda location: location.fix_time)
+            update_latest(user, inserted[-1])
+            fixes_recorded.send(sender=GPSLocation, user=user, locations=inserted)
+    return [location if location is not None and location.pk is not None else None for location in candidates]
@@ -0,0 +1,260 @@
+# gpsinfo/services/latest_services.py
+"""
+Write-behind buffer for GPSLatest.
+
+With GPS_LATEST_WRITE_BEHIND enabled, ingest no longer upserts the hot
+GPSLatest row on every fix. The newest fix per user is coalesced in an
+in-process map and a background thread flushes the map to GPSLatest with
+one bulk upsert every GPS_LATEST_FLUSH_INTERVAL seconds. Reads overlay the
+map on the table, so they see this worker's fixes immediately and other
+workers' fixes within one flush interval.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+
+from ..models import GPSLatest, GPSLocation
+from ..serializers import GPSLatestSerializer
+from ..utils import geohash_encode
+from .group_services import invalidate_group_snapshots
+
+logger = logging.getLogger(__name__)
+
+LATEST_FIELDS = ['latitude', 'longitude', 'timestamp', 'altitude', 'accuracy', 'geohash']
+
+# Rows per upsert statement, well inside the bind parameter limits
+UPSERT_BATCH_SIZE = 1000
+
+
+def write_behind_enabled():
+    return getattr(settings, 'GPS_LATEST_WRITE_BEHIND', False)
+
+
+def latest_defaults(gps_location):
+    """
+    Build the GPSLatest field values for a stored GPSLocation.
+    """
+    return {
+        'latitude': gps_location.latitude,
+        'longitude': gps_location.longitude,
+        'timestamp': gps_location.fix_time,
+        'altitude': gps_location.altitude,
+        'accuracy': gps_location.accuracy,
+    }
+
+
+def build_latest(user, fields):
+    return GPSLatest(user=user, geohash=geohash_encode(fields['latitude'], fields['longitude']), **fields)
+
+
+def upsert_latest(rows):
+    """
+    Insert or advance GPSLatest rows with INSERT ... ON CONFLICT DO UPDATE.
+    A row only replaces the stored one when its timestamp is not older, so
+    late or replayed fixes never move a user's latest position backwards.
+    """
+    qn = connection.ops.quote_name
+    table = qn(GPSLatest._meta.db_table)
+    fields = [GPSLatest._meta.get_field('user')] + [GPSLatest._meta.get_field(name) for name in LATEST_FIELDS]
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    updates = ', '.join(f"{qn(field.column)} = EXCLUDED.{qn(field.column)}" for field in fields[1:])
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[start:start + UPSERT_BATCH_SIZE]
+        params = []
+        for row in batch:
+            params.extend(field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({qn(fields[0].column)}) DO UPDATE SET {updates} "
+                f"WHERE {table}.{qn('timestamp')} <= EXCLUDED.{qn('timestamp')}",
+                params
+            )
+
+
+def rebuild_latest(user_ids=None):
+    """
+    Recompute GPSLatest from GPSLocation history with one set-based
+    INSERT ... SELECT upsert per batch of users (all users when user_ids is
+    None). A stored row is only replaced by a fix that is not older.
+    Returns the number of GPSLatest rows written.
+    """
+    qn = connection.ops.quote_name
+    latest_table = qn(GPSLatest._meta.db_table)
+    location_table = qn(GPSLocation._meta.db_table)
+    fix_time = f"COALESCE({qn('recorded_at')}, {qn('timestamp')})"
+    columns = ['user_id', 'latitude', 'longitude', 'altitude', 'accuracy', 'timestamp', 'geohash']
+    updates = ', '.join(f"{qn(column)} = EXCLUDED.{qn(column)}" for column in columns[1:])
+
+    if user_ids is None:
+        batches = [None]
+    else:
+        user_ids = sorted(user_ids)
+        batches = [user_ids[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(user_ids), UPSERT_BATCH_SIZE)]
+
+    written = []
+    for batch in batches:
+        user_filter = ''
+        if batch is not None:
+            user_filter = f"AND {qn('user_id')} IN ({', '.join(['%s'] * len(batch))})"
+        with connection.cursor() as cursor:
+            # geohash is filled in below; SQL has no portable geohash function
+            cursor.execute(
+                f"INSERT INTO {latest_table} ({', '.join(qn(column) for column in columns)}) "
+                f"SELECT user_id, latitude, longitude, altitude, accuracy, fix_time, '' FROM ("
+                f"SELECT {qn('user_id')} AS user_id, {qn('latitude')} AS latitude, "
+                f"{qn('longitude')} AS longitude, {qn('altitude')} AS altitude, "
+                f"{qn('accuracy')} AS accuracy, {fix_time} AS fix_time, "
+                f"ROW_NUMBER() OVER (PARTITION BY {qn('user_id')} ORDER BY {fix_time} DESC, {qn('id')} DESC) AS fix_rank "
+                f"FROM {location_table} WHERE {qn('user_id')} IS NOT NULL {user_filter}"
+                f") ranked WHERE fix_rank = 1 "
+                f"ON CONFLICT ({qn('user_id')}) DO UPDATE SET {updates} "
+                f"WHERE {latest_table}.{qn('timestamp')} <= EXCLUDED.{qn('timestamp')} "
+                f"RETURNING {qn('user_id')}, {qn('latitude')}, {qn('longitude')}",
+                batch or []
+            )
+            written.extend(cursor.fetchall())
+
+    GPSLatest.objects.bulk_update(
+        [GPSLatest(user_id=user_id, geohash=geohash_encode(lat, lon)) for user_id, lat, lon in written],
+        ['geohash'], batch_size=UPSERT_BATCH_SIZE,
+    )
+    if written:
+        user_groups = (
+            get_user_model().objects.filter(pk__in=[user_id for user_id, _, _ in written])
+            .values_list('user_group', flat=True).distinct()
+        )
+        invalidate_group_snapshots(set(user_groups))
+    return len(written)
+
+
+class LatestWriteBehindBuffer:
+    """
+    Coalesces the newest GPSLatest state per user and flushes it in batches.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def put(self, user, fields):
+        """
+        Buffer a user's latest position, keeping whichever fix is newer.
+        """
+        latest = build_latest(user, fields)
+        with self._lock:
+            current = self._pending.get(user.pk)
+            if current is None or current.timestamp <= latest.timestamp:
+                self._pending[user.pk] = latest
+            if self._flusher is None:
+                self._start_flusher()
+
+    def pending(self):
+        """
+        Snapshot of buffered, not yet flushed GPSLatest objects by user id.
+        """
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """
+        Upsert every buffered position with one bulk statement; rows another
+        worker has already advanced past are left alone. On failure the batch is put back unless newer fixes have arrived.
+        Returns the number of rows written.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            upsert_latest(list(batch.values()))
+        except Exception:
+            logger.exception("Failed to flush %d buffered GPSLatest rows", len(batch))
+            with self._lock:
+                for user_id, latest in batch.items():
+                    current = self._pending.get(user_id)
+                    if current is None or current.timestamp < latest.timestamp:
+                        self._pending[user_id] = latest
+            return 0
+
+        # Group snapshots built from the table before this flush are stale now
+        invalidate_group_snapshots({latest.user.user_group for latest in batch.values()})
+        return len(batch)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._run, name='gpslatest-flusher', daemon=True)
+        self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, 'GPS_LATEST_FLUSH_INTERVAL', 1.0))
+            close_old_connections()
+            self.flush()
+
+
+latest_buffer = LatestWriteBehindBuffer()
+atexit.register(latest_buffer.flush)
+
+
+def overlay_pending_group(snapshot, user_group):
+    """
+    Apply this worker's buffered positions for members of a user_group to a
+    serialized group snapshot, replacing or adding entries by username.
+    """
+    pending = latest_buffer.pending() if write_behind_enabled() else {}
+    buffered = {
+        latest.user.username: latest for latest in pending.values()
+        if latest.user.user_group == user_group
+    }
+    if not buffered:
+        return snapshot
+
+    merged = [row for row in snapshot if row['username'] not in buffered]
+    merged.extend(GPSLatestSerializer(list(buffered.values()), many=True).data)
+    return merged
+
+
+def overlay_pending(rows, include_new=False, contains=None):
+    """
+    Replace GPSLatest rows with this worker's newer buffered positions.
+    With include_new, users that only exist in the buffer are appended.
+
+    For spatially filtered rows, pass contains(lat, lon), the predicate of
+    the filter: the merged rows are filtered with it again, so users whose
+    buffered position has left the area drop out, and buffered users whose
+    stored row lay outside it are added when their newer position is inside.
+    """
+    pending = latest_buffer.pending() if write_behind_enabled() else {}
+    if not pending:
+        return list(rows)
+
+    merged = []
+    for row in rows:
+        buffered = pending.pop(row.user_id, None)
+        merged.append(buffered if buffered is not None and buffered.timestamp >= row.timestamp else row)
+    if contains is not None:
+        entering = {
+            user_id: latest for user_id, latest in pending.items()
+            if contains(latest.latitude, latest.longitude)
+        }
+        if entering:
+            # A stored row newer than the buffered one (another worker's fix) wins
+            stored = dict(
+                GPSLatest.objects.filter(user_id__in=list(entering)).values_list('user_id', 'timestamp')
+            )
+            merged.extend(
+                latest for user_id, latest in entering.items()
+                if user_id not in stored or stored[user_id] <= latest.timestamp
+            )
+        return [row for row in merged if contains(row.latitude, row.longitude)]
+    if include_new:
+        merged.extend(pending.values())
+    return merged
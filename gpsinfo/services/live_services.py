@@ -0,0 +1,47 @@
+# gpsinfo/services/live_services.py
+import logging
+import re
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from ..serializers import GPSLatestSerializer
+from .latest_services import build_latest, latest_defaults
+
+logger = logging.getLogger(__name__)
+
+# Every viewer of the live map joins this group
+LIVE_ALL_GROUP = 'gps.live.all'
+
+
+def live_group_name(user_group):
+    """
+    Channel layer group for viewers of one CustomUser.user_group.
+    Channel group names only allow ASCII letters, digits, '-', '_' and '.'.
+    """
+    safe_group = re.sub(r'[^A-Za-z0-9_.-]', '_', user_group)[:80]
+    return f'gps.live.group.{safe_group}'
+
+
+def broadcast_latest(user, gps_location):
+    """
+    Push a user's newest position to the live WebSocket groups, in the
+    shape of the latest endpoint (timestamp is the fix time).
+    A broken channel layer is logged and never fails the ingest request.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    latest = build_latest(user, latest_defaults(gps_location))
+    message = {'type': 'gps.fix', 'fix': GPSLatestSerializer(latest).data}
+
+    groups = [LIVE_ALL_GROUP]
+    if getattr(user, 'user_group', ''):
+        groups.append(live_group_name(user.user_group))
+
+    try:
+        for group in groups:
+            async_to_sync(channel_layer.group_send)(group, message)
+    except Exception:
+        logger.exception("Failed to broadcast live GPS fix for user %s", user.username)
@@ -0,0 +1,234 @@
+# gpsinfo/services/partition_services.py
+"""
+Monthly range partitioning of the GPSLocation table on PostgreSQL.
+
+The table is converted once with ``manage.py gps_partitions --convert``:
+the existing rows become a single "legacy" partition covering everything
+before next month, new monthly partitions are created ahead of time, and a
+default partition catches rows if the job ever falls behind. Django keeps
+using the parent table name, so the ORM is unaffected.
+
+PostgreSQL only allows unique indexes on a partitioned table when they
+include the partition key, so the device/sequence idempotency key is
+created on each partition instead. Retries are caught as long as they
+arrive in the same month as the original fix.
+"""
+import re
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import GPSLocation
+
+PARENT_TABLE = GPSLocation._meta.db_table
+LEGACY_TABLE = f'{PARENT_TABLE}_legacy'
+DEFAULT_TABLE = f'{PARENT_TABLE}_default'
+ID_SEQUENCE = f'{PARENT_TABLE}_part_id_seq'
+MONTH_TABLE_RE = re.compile(rf'^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$')
+IDEMPOTENCY_CONSTRAINT = 'gpsinfo_gps_device_seq_uniq'
+
+
+class PartitioningError(Exception):
+    """Raised when partition maintenance cannot run on this database"""
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def month_table(start):
+    return f'{PARENT_TABLE}_y{start.year:04d}m{start.month:02d}'
+
+
+def _require_postgres():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError("GPSLocation partitioning requires PostgreSQL")
+
+
+def _create_idempotency_index(cursor, table):
+    qn = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE UNIQUE INDEX {qn(table + '_device_seq_uniq')} ON {qn(table)} "
+        f"(user_id, device_id, sequence) WHERE sequence IS NOT NULL"
+    )
+
+
+def is_partitioned():
+    """
+    Whether the GPSLocation table is already a partitioned table.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [PARENT_TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def convert_to_partitioned():
+    """
+    Turn the plain GPSLocation table into a monthly range-partitioned table.
+
+    Existing rows are kept in place as the legacy partition (no copy), so the
+    conversion costs one validation scan rather than a rewrite. Runs in a
+    single transaction while holding an exclusive lock on the table.
+    """
+    _require_postgres()
+    if is_partitioned():
+        raise PartitioningError(f"{PARENT_TABLE} is already partitioned")
+
+    user_table = GPSLocation._meta.get_field('user').related_model._meta.db_table
+    index_name = GPSLocation._meta.indexes[0].name
+    next_month = add_months(month_start(timezone.localtime()), 1)
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {qn(PARENT_TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(PARENT_TABLE)}")
+        next_id = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(PARENT_TABLE)} RENAME TO {qn(LEGACY_TABLE)}")
+        cursor.execute(
+            f"ALTER TABLE {qn(LEGACY_TABLE)} RENAME CONSTRAINT {qn(PARENT_TABLE + '_pkey')} "
+            f"TO {qn(LEGACY_TABLE + '_pkey')}"
+        )
+        # Partitions may not carry identity columns the parent lacks
+        cursor.execute(f"ALTER TABLE {qn(LEGACY_TABLE)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER INDEX {qn(index_name)} RENAME TO {qn(LEGACY_TABLE + '_user_ts')}")
+        cursor.execute(
+            f"ALTER INDEX {qn(IDEMPOTENCY_CONSTRAINT)} RENAME TO {qn(LEGACY_TABLE + '_device_seq_uniq')}"
+        )
+
+        cursor.execute(
+            f"CREATE TABLE {qn(PARENT_TABLE)} (LIKE {qn(LEGACY_TABLE)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (\"timestamp\")"
+        )
+        # Identity columns are not inherited by partitioned tables, so ids
+        # continue from a plain sequence owned by the new parent
+        cursor.execute(f"CREATE SEQUENCE {qn(ID_SEQUENCE)} START WITH %s OWNED BY {qn(PARENT_TABLE)}.id", [next_id])
+        cursor.execute(
+            f"ALTER TABLE {qn(PARENT_TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s)", [ID_SEQUENCE]
+        )
+        # A partitioned table's primary key has to include the partition key
+        cursor.execute(f"ALTER TABLE {qn(PARENT_TABLE)} ADD PRIMARY KEY (id, \"timestamp\")")
+        cursor.execute(f"CREATE INDEX {qn(index_name)} ON {qn(PARENT_TABLE)} (user_id, \"timestamp\")")
+        cursor.execute(
+            f"ALTER TABLE {qn(PARENT_TABLE)} ADD FOREIGN KEY (user_id) "
+            f"REFERENCES {qn(user_table)} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+        cursor.execute(
+            f"ALTER TABLE {qn(PARENT_TABLE)} ATTACH PARTITION {qn(LEGACY_TABLE)} "
+            f"FOR VALUES FROM (MINVALUE) TO (%s)", [next_month]
+        )
+        cursor.execute(f"CREATE TABLE {qn(DEFAULT_TABLE)} PARTITION OF {qn(PARENT_TABLE)} DEFAULT")
+        _create_idempotency_index(cursor, DEFAULT_TABLE)
+
+
+def list_month_partitions():
+    """
+    [(start, end, table_name)] for the monthly partitions, oldest first.
+    The legacy and default partitions are not included.
+    """
+    _require_postgres()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)", [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    tz = timezone.get_current_timezone()
+    for name in names:
+        match = MONTH_TABLE_RE.match(name)
+        if match:
+            start = timezone.make_aware(datetime(int(match.group(1)), int(match.group(2)), 1), tz)
+            partitions.append((start, add_months(start, 1), name))
+    return sorted(partitions)
+
+
+def legacy_upper_bound():
+    """
+    Exclusive upper bound of the legacy partition, or None once it is gone.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c WHERE c.oid = to_regclass(%s)",
+            [LEGACY_TABLE]
+        )
+        row = cursor.fetchone()
+    if not row or not row[0]:
+        return None
+    match = re.search(r"TO \('([^']+)'\)", row[0])
+    return parse_datetime(match.group(1)) if match else None
+
+
+def ensure_month_partitions(months_ahead=3):
+    """
+    Create the monthly partitions from the current month up to months_ahead
+    months from now. Months already covered by the legacy partition are
+    skipped. Rows the default partition caught for a month (the job fell
+    behind) are moved into the new partition in the same transaction,
+    which locks the table meanwhile. Returns the names of the tables created.
+    """
+    _require_postgres()
+    if not is_partitioned():
+        raise PartitioningError(f"{PARENT_TABLE} is not partitioned; run with --convert first")
+
+    existing = {name for _, _, name in list_month_partitions()}
+    legacy_end = legacy_upper_bound()
+    qn = connection.ops.quote_name
+    created = []
+    current = month_start(timezone.localtime())
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        end = add_months(start, 1)
+        name = month_table(start)
+        if name in existing or (legacy_end is not None and end <= legacy_end):
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {qn(DEFAULT_TABLE)} WHERE \"timestamp\" >= %s AND \"timestamp\" < %s)",
+                [start, end]
+            )
+            in_default = cursor.fetchone()[0]
+            # A partition cannot be created over rows the default partition
+            # already holds, so those are moved into it while it is detached
+            if in_default:
+                cursor.execute(f"ALTER TABLE {qn(PARENT_TABLE)} DETACH PARTITION {qn(DEFAULT_TABLE)}")
+            cursor.execute(
+                f"CREATE TABLE {qn(name)} PARTITION OF {qn(PARENT_TABLE)} FOR VALUES FROM (%s) TO (%s)",
+                [start, end]
+            )
+            _create_idempotency_index(cursor, name)
+            if in_default:
+                cursor.execute(
+                    f"INSERT INTO {qn(name)} SELECT * FROM {qn(DEFAULT_TABLE)} "
+                    f"WHERE \"timestamp\" >= %s AND \"timestamp\" < %s", [start, end]
+                )
+                cursor.execute(
+                    f"DELETE FROM {qn(DEFAULT_TABLE)} WHERE \"timestamp\" >= %s AND \"timestamp\" < %s", [start, end]
+                )
+                cursor.execute(f"ALTER TABLE {qn(PARENT_TABLE)} ATTACH PARTITION {qn(DEFAULT_TABLE)} DEFAULT")
+        created.append(name)
+    return created
+
+
+def drop_partition(name):
+    """
+    Drop one monthly partition. Far cheaper than DELETE plus VACUUM.
+    """
+    _require_postgres()
+    if not MONTH_TABLE_RE.match(name) and name != LEGACY_TABLE:
+        raise PartitioningError(f"{name} is not a GPSLocation partition")
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {qn(name)}")
@@ -0,0 +1,186 @@
+# gpsinfo/services/queue_services.py
+"""
+Queued GPS ingest through a local append log.
+
+With GPS_INGEST_QUEUED enabled the create and bulk endpoints validate the
+fixes, append them to a spool file in GPS_INGEST_QUEUE_DIR and answer 202
+without touching the database. ``manage.py gps_drain`` claims the spool,
+stores it in large batches (COPY on PostgreSQL), advances GPSLatest once
+per user per batch and sends fixes_recorded, so the usual receivers run.
+
+Each batch commits together with the segment offset it reaches (a
+GPSQueueProgress row), so an interrupted drain resumes behind the last
+committed batch and stores no fix twice, with or without a device
+sequence.
+
+Writers append under a shared flock. The drainer renames the active file
+aside and takes an exclusive lock before reading, so appends that were
+already in flight finish first; a writer that finds the file it locked is
+no longer the active one simply retries on the new file.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import GPSLocation, GPSQueueProgress
+from ..signals import fixes_recorded
+from .ingest_services import copy_fixes, insert_fixes
+from .latest_services import build_latest, latest_defaults, upsert_latest
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SEGMENT = 'active.log'
+CLAIMED_PREFIX = 'claimed-'
+
+
+def queued_ingest_enabled():
+    return getattr(settings, 'GPS_INGEST_QUEUED', False)
+
+
+def queue_dir():
+    path = Path(getattr(settings, 'GPS_INGEST_QUEUE_DIR'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def encode_fix(user, data, received_at):
+    entry = {'user': user.pk, 'timestamp': received_at.isoformat()}
+    for key, value in data.items():
+        entry[key] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return json.dumps(entry, separators=(',', ':'))
+
+
+def enqueue_fixes(user, fixes):
+    """
+    Append validated fixes to the spool in one write, stamped with the
+    receive time. Returns the number of fixes queued.
+    """
+    if not fixes:
+        return 0
+    received_at = timezone.now()
+    payload = ''.join(encode_fix(user, data, received_at) + '\n' for data in fixes).encode('utf-8')
+    path = queue_dir() / ACTIVE_SEGMENT
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                is_active = os.fstat(fd).st_ino == os.stat(path).st_ino
+            except FileNotFoundError:
+                is_active = False
+            if is_active:
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+                return len(fixes)
+        finally:
+            os.close(fd)
+
+
+def claim_segments():
+    """
+    Move the active spool file aside for draining and return every claimed
+    segment, oldest first, including any left behind by an interrupted drain.
+    """
+    directory = queue_dir()
+    active = directory / ACTIVE_SEGMENT
+    try:
+        if active.stat().st_size:
+            os.rename(active, directory / f'{CLAIMED_PREFIX}{time.time_ns()}.log')
+    except FileNotFoundError:
+        pass
+    return sorted(directory.glob(f'{CLAIMED_PREFIX}*.log'))
+
+
+def store_queued(entries, segment=None, offset=None):
+    """
+    Store a batch of decoded spool entries for any number of users in one
+    transaction, recording offset as the progress of segment when given.
+    Entries of deleted users and repeated device sequences are dropped.
+    Returns the number of fixes inserted.
+    """
+    users = get_user_model().objects.in_bulk({entry['user'] for entry in entries})
+    seen_keys = set()
+    locations = []
+    for entry in entries:
+        user = users.get(entry.pop('user'))
+        if user is None:
+            continue
+        entry['timestamp'] = parse_datetime(entry['timestamp'])
+        if entry.get('recorded_at'):
+            entry['recorded_at'] = parse_datetime(entry['recorded_at'])
+        location = GPSLocation(user=user, **entry)
+        if location.sequence is not None:
+            key = (user.pk, location.device_id, location.sequence)
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+        locations.append(location)
+
+    with transaction.atomic():
+        if segment is not None:
+            GPSQueueProgress.objects.update_or_create(segment=segment, defaults={'offset': offset})
+        if not locations:
+            return 0
+        if connection.vendor == 'postgresql':
+            inserted = copy_fixes(locations)
+        else:
+            inserted = insert_fixes(locations)
+
+        by_user = {}
+        for location in inserted:
+            by_user.setdefault(location.user_id, []).append(location)
+        for user_id, user_locations in by_user.items():
+            user = users[user_id]
+            for location in user_locations:
+                location.user = user
+            # Receivers get each user's fixes oldest fix first
+            user_locations.sort(key=lambda location: location.fix_time)
+            fixes_recorded.send(sender=GPSLocation, user=user, locations=user_locations)
+        upsert_latest([
+            build_latest(users[user_id], latest_defaults(user_locations[-1]))
+            for user_id, user_locations in by_user.items()
+        ])
+    return len(inserted)
+
+
+def drain_segment(path, batch_size=5000):
+    """
+    Store one claimed spool segment in batches of batch_size fixes, each
+    committed with its GPSQueueProgress offset, and delete it. Resumes
+    behind the last committed batch of an interrupted drain.
+    Returns the number of fixes inserted.
+    """
+    progress = GPSQueueProgress.objects.filter(segment=path.name).values_list('offset', flat=True).first()
+    offset = progress or 0
+    inserted = 0
+    with open(path, 'rb') as segment:
+        # Wait for appends that started before the segment was claimed
+        fcntl.flock(segment, fcntl.LOCK_EX)
+        segment.seek(offset)
+        batch = []
+        for line in segment:
+            offset += len(line)
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping unreadable GPS queue entry in %s", path.name)
+                continue
+            if len(batch) >= batch_size:
+                inserted += store_queued(batch, path.name, offset)
+                batch = []
+        if batch:
+            inserted += store_queued(batch, path.name, offset)
+        path.unlink()
+    # Only after the file is gone, or a crash in between would replay it
+    GPSQueueProgress.objects.filter(segment=path.name).delete()
+    return inserted
@@ -0,0 +1,157 @@
+# gpsinfo/services/retention_services.py
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from ..models import GPSDailyStats, GPSHeatmapTile, GPSLocation, GPSLocationRollup, GPSRefreshGap
+from . import heatmap_services, stats_services
+from .watermark_services import GAP_TTL
+
+# Refresh jobs that recompute from raw rows: (command, gap job, table holding the watermark)
+RAW_REFRESH_JOBS = [
+    ('gps_daily_stats', stats_services.GAP_JOB, GPSDailyStats),
+    ('gps_heatmap', heatmap_services.GAP_JOB, GPSHeatmapTile),
+]
+
+# Rows per upsert statement, well inside the bind parameter limits
+ROLLUP_BATCH_SIZE = 1000
+
+
+def merge_rollups(rollups):
+    """
+    Insert per-minute rows, merging into rows already stored for the same
+    user and minute (raw points that arrived after that minute was rolled
+    up): counts add up, positions and altitudes are averaged weighted by
+    point count (for altitude only approximately when some points had
+    none) and the best accuracy is kept.
+    """
+    qn = connection.ops.quote_name
+    table = qn(GPSLocationRollup._meta.db_table)
+    columns = ['user_id', 'minute', 'latitude', 'longitude', 'altitude', 'accuracy', 'point_count']
+    n, new_n = f"{table}.{qn('point_count')}", f"EXCLUDED.{qn('point_count')}"
+
+    def weighted(column):
+        old, new = f"{table}.{qn(column)}", f"EXCLUDED.{qn(column)}"
+        return f"({old} * {n} + {new} * {new_n}) / ({n} + {new_n})"
+
+    def nullable_weighted(column):
+        old, new = f"{table}.{qn(column)}", f"EXCLUDED.{qn(column)}"
+        return f"CASE WHEN {new} IS NULL THEN {old} WHEN {old} IS NULL THEN {new} ELSE {weighted(column)} END"
+
+    old_acc, new_acc = f"{table}.{qn('accuracy')}", f"EXCLUDED.{qn('accuracy')}"
+    updates = ', '.join([
+        f"{qn('latitude')} = {weighted('latitude')}",
+        f"{qn('longitude')} = {weighted('longitude')}",
+        f"{qn('altitude')} = {nullable_weighted('altitude')}",
+        f"{qn('accuracy')} = CASE WHEN {new_acc} IS NULL THEN {old_acc} "
+        f"WHEN {old_acc} IS NULL OR {new_acc} < {old_acc} THEN {new_acc} ELSE {old_acc} END",
+        f"{qn('point_count')} = {n} + {new_n}",
+    ])
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    fields = [GPSLocationRollup._meta.get_field(column.removesuffix('_id')) for column in columns]
+    for start in range(0, len(rollups), ROLLUP_BATCH_SIZE):
+        batch = rollups[start:start + ROLLUP_BATCH_SIZE]
+        params = []
+        for rollup in batch:
+            params.extend(field.get_db_prep_save(getattr(rollup, field.attname), connection) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(column) for column in columns)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({qn('user_id')}, {qn('minute')}) DO UPDATE SET {updates}",
+                params
+            )
+
+
+def rollup_window(start, end, delete_raw=True):
+    """
+    Downsample raw GPSLocation rows in [start, end) into per-minute
+    GPSLocationRollup rows, merged into any stored for the same minutes,
+    and optionally delete the raw rows, in one transaction so a crash
+    never double counts.
+    Returns (raw_points, rollup_rows).
+    """
+    raw = GPSLocation.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    with transaction.atomic():
+        minutes = (
+            raw.annotate(minute=TruncMinute('timestamp'))
+            .values('user_id', 'minute')
+            .annotate(
+                lat=Avg('latitude'),
+                lon=Avg('longitude'),
+                alt=Avg('altitude'),
+                acc=Min('accuracy'),
+                points=Count('id'),
+            )
+            .order_by()
+        )
+        rollups = [
+            GPSLocationRollup(
+                user_id=row['user_id'],
+                minute=row['minute'],
+                latitude=row['lat'],
+                longitude=row['lon'],
+                altitude=row['alt'],
+                accuracy=row['acc'],
+                point_count=row['points'],
+            )
+            for row in minutes
+        ]
+        merge_rollups(rollups)
+        raw_points = sum(rollup.point_count for rollup in rollups)
+        if delete_raw:
+            raw.delete()
+    return raw_points, len(rollups)
+
+
+def refreshes_behind(cutoff):
+    """
+    Commands of the watermark refresh jobs that have not folded in every
+    raw point older than cutoff yet: their watermark is below the newest
+    such id, or an open gap is. Rolling those points up first would lose
+    them from daily stats or heatmaps. Jobs that have never run are not
+    waited for.
+    """
+    last_id = GPSLocation.objects.filter(timestamp__lt=cutoff).aggregate(last_id=Max('id'))['last_id']
+    if last_id is None:
+        return []
+    behind = []
+    for command, job, model in RAW_REFRESH_JOBS:
+        watermark = model.objects.aggregate(watermark=Max('last_location_id'))['watermark']
+        if watermark is None:
+            continue
+        open_gap = GPSRefreshGap.objects.filter(
+            job=job, start_id__lte=last_id, first_seen__gte=timezone.now() - GAP_TTL,
+        ).exists()
+        if watermark < last_id or open_gap:
+            behind.append(command)
+    return behind
+
+
+def apply_retention(cutoff, step=timedelta(days=1), on_window=None):
+    """
+    Roll up and delete every raw point older than cutoff, one window of
+    ``step`` at a time so memory and transaction size stay bounded.
+    ``on_window(start, end, raw_points, rollup_rows)`` reports progress.
+    Window edges are whole minutes so no minute is split across windows.
+    Returns (raw_points, rollup_rows) totals.
+    """
+    cutoff = cutoff.replace(second=0, microsecond=0)
+    oldest = (
+        GPSLocation.objects.filter(timestamp__lt=cutoff)
+        .order_by('timestamp').values_list('timestamp', flat=True).first()
+    )
+    totals = [0, 0]
+    start = oldest.replace(second=0, microsecond=0) if oldest else None
+    while start is not None and start < cutoff:
+        end = min(start + step, cutoff)
+        raw_points, rollup_rows = rollup_window(start, end)
+        totals[0] += raw_points
+        totals[1] += rollup_rows
+        if on_window:
+            on_window(start, end, raw_points, rollup_rows)
+        start = end
+    return tuple(totals)
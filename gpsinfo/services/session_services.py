@@ -0,0 +1,156 @@
+# gpsinfo/services/session_services.py
+"""
+Incremental segmentation of GPS history into sessions (trips/activities).
+
+A session ends when no fix arrives for GPS_SESSION_GAP_SECONDS, or when the
+user stays within GPS_SESSION_DWELL_RADIUS_M of one spot for
+GPS_SESSION_DWELL_SECONDS (a stop; the session then ends on arrival).
+Distance is only counted once a fix leaves the dwell radius of the last
+counted point, so GPS jitter while standing still adds nothing.
+
+Each ingest extends the user's newest session in place, so the work per
+fix is constant and activity lists read precomputed rows. Late fixes older
+than the newest processed fix are skipped; ``manage.py gps_sessions``
+replays a user's whole history when an exact rebuild is wanted.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+
+from ..models import GPSLocation, GPSSession
+from ..utils import haversine_m
+
+# Fixes replayed per query when rebuilding from history
+REBUILD_CHUNK_SIZE = 5000
+
+
+def session_options():
+    return (
+        getattr(settings, 'GPS_SESSION_GAP_SECONDS', 600),
+        getattr(settings, 'GPS_SESSION_DWELL_RADIUS_M', 50),
+        getattr(settings, 'GPS_SESSION_DWELL_SECONDS', 300),
+    )
+
+
+def start_session(user, fix_time, lat, lon):
+    return GPSSession(
+        user=user,
+        started_at=fix_time,
+        ended_at=fix_time,
+        start_latitude=lat,
+        start_longitude=lon,
+        end_latitude=lat,
+        end_longitude=lon,
+        min_latitude=lat,
+        min_longitude=lon,
+        max_latitude=lat,
+        max_longitude=lon,
+        anchor_latitude=lat,
+        anchor_longitude=lon,
+        anchor_at=fix_time,
+        last_fix_at=fix_time,
+    )
+
+
+def extend_session(session, fix_time, lat, lon, options):
+    """
+    Apply one fix to a session. Returns False when the fix starts a new
+    session instead (after a time gap, or moving off after a stop).
+    """
+    gap_seconds, dwell_radius_m, dwell_seconds = options
+    if (fix_time - session.last_fix_at).total_seconds() > gap_seconds:
+        session.is_closed = True
+        return False
+
+    step_m = haversine_m(session.anchor_latitude, session.anchor_longitude, lat, lon)
+    moved = step_m > dwell_radius_m
+    if session.is_closed:
+        if moved:
+            return False
+        # Still at the stop that ended the session
+        session.last_fix_at = fix_time
+        return True
+
+    session.last_fix_at = fix_time
+    session.point_count += 1
+    if moved:
+        session.distance_m += step_m
+        session.anchor_latitude, session.anchor_longitude, session.anchor_at = lat, lon, fix_time
+        session.end_latitude, session.end_longitude = lat, lon
+        session.ended_at = fix_time
+        session.min_latitude = min(session.min_latitude, lat)
+        session.min_longitude = min(session.min_longitude, lon)
+        session.max_latitude = max(session.max_latitude, lat)
+        session.max_longitude = max(session.max_longitude, lon)
+    elif (fix_time - session.anchor_at).total_seconds() >= dwell_seconds:
+        # Stopped: the session ended when the user reached the anchor
+        session.is_closed = True
+        session.ended_at = session.anchor_at
+    else:
+        session.ended_at = fix_time
+    session.duration_seconds = (session.ended_at - session.started_at).total_seconds()
+    return True
+
+
+def apply_fixes(user, session, fixes, options):
+    """
+    Run (fix_time, lat, lon) tuples, oldest first, through the segmenter
+    starting from session (or None). Returns (touched, session) where
+    touched lists every session created or changed, newest last.
+    """
+    touched = []
+    for fix_time, lat, lon in fixes:
+        if session is not None and fix_time < session.last_fix_at:
+            continue
+        if session is None or not extend_session(session, fix_time, lat, lon, options):
+            if session is not None and (not touched or touched[-1] is not session):
+                touched.append(session)
+            session = start_session(user, fix_time, lat, lon)
+        if not touched or touched[-1] is not session:
+            touched.append(session)
+    return touched, session
+
+
+def _save_sessions(sessions):
+    new = [session for session in sessions if session.pk is None]
+    for session in sessions:
+        if session.pk is not None:
+            session.save()
+    GPSSession.objects.bulk_create(new)
+
+
+def update_sessions(user, locations):
+    """
+    Extend the user's sessions with newly stored GPSLocation rows.
+    Locks the user's newest session so concurrent ingests stay consistent.
+    """
+    fixes = sorted((location.fix_time, location.latitude, location.longitude) for location in locations)
+    with transaction.atomic():
+        current = (
+            GPSSession.objects.select_for_update()
+            .filter(user=user).order_by('-started_at', '-id').first()
+        )
+        touched, _ = apply_fixes(user, current, fixes, session_options())
+        if current is not None and not touched and fixes[0][0] < current.last_fix_at:
+            # Late fixes are drawn on the track tiles even though no session
+            # changed, so advance updated_at to retire the cached tiles
+            touched = [current]
+        _save_sessions(touched)
+
+
+def rebuild_sessions(user):
+    """
+    Recompute all of a user's sessions from the stored history.
+    Returns the number of sessions created.
+    """
+    history = (
+        GPSLocation.objects.filter(user=user)
+        .annotate(fix_time=Coalesce('recorded_at', 'timestamp'))
+        .order_by('fix_time', 'id')
+        .values_list('fix_time', 'latitude', 'longitude')
+    )
+    with transaction.atomic():
+        GPSSession.objects.filter(user=user).delete()
+        touched, _ = apply_fixes(user, None, history.iterator(chunk_size=REBUILD_CHUNK_SIZE), session_options())
+        GPSSession.objects.bulk_create(touched, batch_size=1000)
+    return len(touched)
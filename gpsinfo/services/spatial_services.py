@@ -0,0 +1,52 @@
+# gpsinfo/services/spatial_services.py
+from django.db.models import Q
+
+from ..utils import geohash_cover, haversine_m, radius_to_bbox
+
+
+def in_bbox(lat, lon, min_lat, min_lon, max_lat, max_lon):
+    """
+    Whether a point lies in a box, with the same antimeridian rule as filter_bbox.
+    """
+    if not min_lat <= lat <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= lon <= max_lon
+    return lon >= min_lon or lon <= max_lon
+
+
+def filter_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    """
+    Restrict a GPSLatest queryset to a viewport.
+
+    The geohash prefix match lets the database use the geohash index; the
+    coordinate range then trims the cells' overhang to the exact box.
+    A box with min_lon > max_lon crosses the antimeridian.
+    """
+    prefixes = geohash_cover(min_lat, min_lon, max_lat, max_lon)
+    if prefixes:
+        prefix_filter = Q()
+        for prefix in prefixes:
+            prefix_filter |= Q(geohash__startswith=prefix)
+        queryset = queryset.filter(prefix_filter)
+
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        return queryset.filter(longitude__gte=min_lon, longitude__lte=max_lon)
+    return queryset.filter(Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+
+def filter_radius(queryset, lat, lon, radius_m):
+    """
+    Rows of a GPSLatest queryset within radius_m metres of a point,
+    nearest first. The bounding box of the circle is filtered in the
+    database and the exact great-circle distance is checked in Python.
+    """
+    candidates = filter_bbox(queryset, *radius_to_bbox(lat, lon, radius_m))
+    matches = []
+    for row in candidates:
+        distance = haversine_m(lat, lon, row.latitude, row.longitude)
+        if distance <= radius_m:
+            matches.append((distance, row))
+    matches.sort(key=lambda match: match[0])
+    return [row for _, row in matches]
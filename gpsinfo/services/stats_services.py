@@ -0,0 +1,233 @@
+# gpsinfo/services/stats_services.py
+"""
+Per-user daily movement statistics rolled up from GPSLocation.
+
+New rows are found by id above a watermark (the highest last_location_id
+stored), read in windows and grouped by user and local day. A day whose
+new fixes all come after its last processed fix is continued from the
+state kept on its row; a day that receives late fixes is recomputed from
+the raw rows for that day. Each window commits together with the
+watermark it advances, so an interrupted refresh resumes where it stopped.
+Ids a window did not see are kept as gaps (see watermark_services), and the
+days of rows that commit into them later are recomputed on the next run.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import GPSDailyStats, GPSLocation
+from ..serializers import MAX_RECORDED_AT_SKEW
+from ..utils import EARTH_RADIUS_M
+from .watermark_services import close_gaps, gap_filter, open_gaps, record_gaps
+
+# GPSLocation rows read per refresh window
+STATS_WINDOW_SIZE = 50000
+
+GAP_JOB = 'daily_stats'
+
+STATS_FIELDS = [
+    'distance_m', 'moving_seconds', 'max_speed_mps', 'elevation_gain_m', 'point_count',
+    'last_fix_at', 'last_latitude', 'last_longitude', 'elevation_ref', 'last_location_id',
+]
+
+
+def stats_options():
+    return (
+        getattr(settings, 'GPS_STATS_MOVING_SPEED_MPS', 0.5),
+        getattr(settings, 'GPS_STATS_MAX_SEGMENT_SECONDS', 300),
+        getattr(settings, 'GPS_STATS_MAX_SPEED_MPS', 100),
+        getattr(settings, 'GPS_STATS_ELEVATION_THRESHOLD_M', 3),
+    )
+
+
+def local_day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def new_day(user_id, day, fix):
+    fix_time, lat, lon, altitude, location_id = fix
+    return GPSDailyStats(
+        user_id=user_id,
+        day=day,
+        point_count=1,
+        last_fix_at=fix_time,
+        last_latitude=lat,
+        last_longitude=lon,
+        elevation_ref=altitude,
+        last_location_id=location_id,
+    )
+
+
+def accumulate(stats, fixes, options):
+    """
+    Fold (fix_time, lat, lon, altitude, id) tuples, oldest first and all
+    after stats.last_fix_at, into a day's aggregates.
+    """
+    moving_speed, max_segment_seconds, max_speed, elevation_threshold = options
+    prev_time, prev_lat, prev_lon = stats.last_fix_at, stats.last_latitude, stats.last_longitude
+    elevation_ref = stats.elevation_ref
+    for fix_time, lat, lon, altitude, _ in fixes:
+        seconds = (fix_time - prev_time).total_seconds()
+        if seconds > 0:
+            # Haversine inlined; this loop runs once per stored fix
+            phi1, phi2 = math.radians(prev_lat), math.radians(lat)
+            a = (math.sin((phi2 - phi1) / 2) ** 2
+                 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon - prev_lon) / 2) ** 2)
+            distance = 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+            speed = distance / seconds
+            # Long gaps and impossible jumps add neither distance nor time
+            if seconds <= max_segment_seconds and speed <= max_speed:
+                stats.distance_m += distance
+                if speed >= moving_speed:
+                    stats.moving_seconds += seconds
+                    stats.max_speed_mps = max(stats.max_speed_mps, speed)
+
+        # Climb is counted once it clears the noise threshold above the lowest point since the last climb
+        if altitude is not None:
+            if elevation_ref is None or altitude < elevation_ref:
+                elevation_ref = altitude
+            elif altitude - elevation_ref >= elevation_threshold:
+                stats.elevation_gain_m += altitude - elevation_ref
+                elevation_ref = altitude
+
+        stats.point_count += 1
+        prev_time, prev_lat, prev_lon = fix_time, lat, lon
+    stats.last_fix_at, stats.last_latitude, stats.last_longitude = prev_time, prev_lat, prev_lon
+    stats.elevation_ref = elevation_ref
+    return stats
+
+
+def _fix_rows(queryset):
+    return (
+        queryset.annotate(fix_time=Coalesce('recorded_at', 'timestamp'))
+        .values_list('user_id', 'fix_time', 'latitude', 'longitude', 'altitude', 'id')
+    )
+
+
+def compute_day(user_id, day, max_id, options):
+    """
+    Aggregate one user's day from the raw rows with id up to max_id.
+    Returns an unsaved GPSDailyStats, or None when the day has no fixes.
+    """
+    start, end = local_day_bounds(day)
+    # The receive time is never earlier than the fix time minus the allowed clock skew
+    rows = _fix_rows(
+        GPSLocation.objects.filter(user_id=user_id, timestamp__gte=start - MAX_RECORDED_AT_SKEW, id__lte=max_id)
+    ).filter(fix_time__gte=start, fix_time__lt=end)
+    fixes = sorted(row[1:] for row in rows)
+    if not fixes:
+        return None
+    return accumulate(new_day(user_id, day, fixes[0]), fixes[1:], options)
+
+
+def save_days(days):
+    GPSDailyStats.objects.bulk_create(
+        days, update_conflicts=True, unique_fields=['user', 'day'], update_fields=STATS_FIELDS,
+    )
+
+
+def refresh_window(low_id, high_id, options):
+    """
+    Fold GPSLocation rows with low_id < id <= high_id into the daily stats.
+    Returns the number of day rows written.
+    """
+    groups = {}
+    seen_ids = set()
+    for user_id, fix_time, lat, lon, altitude, location_id in _fix_rows(
+        GPSLocation.objects.filter(id__gt=low_id, id__lte=high_id)
+    ).iterator(chunk_size=5000):
+        seen_ids.add(location_id)
+        if user_id is None:
+            continue
+        day = timezone.localtime(fix_time).date()
+        groups.setdefault((user_id, day), []).append((fix_time, lat, lon, altitude, location_id))
+
+    with transaction.atomic():
+        record_gaps(GAP_JOB, low_id, high_id, seen_ids)
+        if not groups:
+            return 0
+        existing = {
+            (stats.user_id, stats.day): stats
+            for stats in GPSDailyStats.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in groups},
+                day__in={day for _, day in groups},
+            )
+        }
+        changed = []
+        for (user_id, day), fixes in groups.items():
+            fixes.sort()
+            stats = existing.get((user_id, day))
+            if stats is None:
+                stats = accumulate(new_day(user_id, day, fixes[0]), fixes[1:], options)
+            elif fixes[0][0] > stats.last_fix_at:
+                stats = accumulate(stats, fixes, options)
+            else:
+                # Late fixes land inside the processed part of the day
+                recomputed = compute_day(user_id, day, high_id, options)
+                recomputed.pk = stats.pk
+                stats = recomputed
+            stats.last_location_id = high_id
+            changed.append(stats)
+        save_days(changed)
+    return len(changed)
+
+
+def refresh_gaps(watermark, options):
+    """
+    Recompute the days of rows that committed into earlier windows' gaps,
+    from all rows up to the watermark. Recomputing is idempotent, so a row
+    seen here and by its window is never counted twice.
+    Returns the number of day rows written.
+    """
+    written = 0
+    for gaps in open_gaps(GAP_JOB):
+        rows = list(_fix_rows(GPSLocation.objects.filter(gap_filter(gaps))))
+        if not rows:
+            continue
+        days = {(user_id, timezone.localtime(fix_time).date()) for user_id, fix_time, *_ in rows if user_id is not None}
+        with transaction.atomic():
+            existing = {
+                (stats.user_id, stats.day): stats
+                for stats in GPSDailyStats.objects.select_for_update().filter(
+                    user_id__in={user_id for user_id, _ in days}, day__in={day for _, day in days},
+                )
+            }
+            changed = []
+            for user_id, day in days:
+                stats = compute_day(user_id, day, watermark, options)
+                if stats is None:
+                    continue
+                current = existing.get((user_id, day))
+                stats.last_location_id = current.last_location_id if current else watermark
+                changed.append(stats)
+            save_days(changed)
+            close_gaps(GAP_JOB, gaps, [row[-1] for row in rows])
+        written += len(changed)
+    return written
+
+
+def refresh_daily_stats(window_size=STATS_WINDOW_SIZE, on_window=None):
+    """
+    Bring the daily stats up to date with every GPSLocation row stored so
+    far: rows that filled earlier gaps first, then one id window per
+    transaction. ``on_window(low_id, high_id, rows)`` reports progress.
+    Returns the number of day rows written.
+    """
+    options = stats_options()
+    watermark = GPSDailyStats.objects.aggregate(watermark=Max('last_location_id'))['watermark'] or 0
+    high_water = GPSLocation.objects.aggregate(high_water=Max('id'))['high_water'] or 0
+    written = refresh_gaps(watermark, options)
+    while watermark < high_water:
+        window_end = min(watermark + window_size, high_water)
+        rows = refresh_window(watermark, window_end, options)
+        written += rows
+        if on_window:
+            on_window(watermark, window_end, rows)
+        watermark = window_end
+    return written
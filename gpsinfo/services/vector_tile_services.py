@@ -0,0 +1,176 @@
+# gpsinfo/services/vector_tile_services.py
+"""
+Mapbox Vector Tiles of GPS tracks and latest positions.
+
+A tile carries two layers: 'tracks', the requesting user's sessions as
+simplified linestrings clipped to the tile, and 'latest', everyone's
+current position as points. MVT layers concatenate into a valid tile, so
+each layer is encoded once and cached on its own. Track layers are keyed
+by the user's newest GPSSession.updated_at, read with one index lookup per
+tile, so ingest, imports and session rebuilds in any process retire them
+without an invalidation step; the shared 'latest' layer is cached for
+GPS_MVT_LATEST_TTL seconds.
+
+Tracks are read per session (see session_services): sessions whose
+bounding box touches the tile select the time ranges to draw, so a track
+that crosses the tile is drawn even where no stored fix falls inside it.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from ..models import GPSLatest, GPSLocation, GPSSession
+from ..mvt import EXTENT, GEOM_LINESTRING, GEOM_POINT, LayerBuilder, clip_line
+from ..serializers import MAX_RECORDED_AT_SKEW
+from ..utils import EARTH_RADIUS_M, mercator_tile_xy, simplify_track, tile_bounds
+from .latest_services import overlay_pending
+from .spatial_services import filter_bbox, in_bbox
+
+# Tile units drawn outside each edge so lines and markers join across tiles
+MVT_BUFFER = 64
+MVT_MAX_ZOOM = 22
+
+# Bounds on the history read for one tile's track layer
+MAX_TILE_SESSIONS = 500
+MAX_TILE_TRACK_POINTS = 200000
+
+TRACK_CACHE_KEY = 'gpsinfo:mvt:tracks:{}:{}:{}:{}:{}'
+LATEST_CACHE_KEY = 'gpsinfo:mvt:latest:{}:{}:{}'
+
+
+def mvt_options():
+    return (
+        getattr(settings, 'GPS_MVT_TRACK_MIN_ZOOM', 8),
+        getattr(settings, 'GPS_MVT_CACHE_SECONDS', 3600),
+        getattr(settings, 'GPS_MVT_LATEST_TTL', 5),
+    )
+
+
+def track_version(user_id):
+    """
+    Version of the user's track layers: when their sessions last changed.
+    """
+    updated_at = (
+        GPSSession.objects.filter(user_id=user_id).order_by('-updated_at')
+        .values_list('updated_at', flat=True).first()
+    )
+    return int(updated_at.timestamp() * 1000000) if updated_at else 0
+
+
+def padded_bounds(z, x, y):
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    pad = MVT_BUFFER / EXTENT
+    lat_pad, lon_pad = (max_lat - min_lat) * pad, (max_lon - min_lon) * pad
+    return min_lat - lat_pad, min_lon - lon_pad, max_lat + lat_pad, max_lon + lon_pad
+
+
+def tile_projector(z, x, y):
+    def project(lat, lon):
+        fx, fy = mercator_tile_xy(lat, lon, z)
+        return (fx - x) * EXTENT, (fy - y) * EXTENT
+    return project
+
+
+def _session_points(user_id, sessions):
+    """
+    (fix_time, lat, lon) rows of the given sessions, oldest first, grouped
+    into one list per session.
+    """
+    window = Q()
+    for session in sessions:
+        window |= Q(fix_time__gte=session.started_at, fix_time__lte=session.last_fix_at)
+    rows = (
+        GPSLocation.objects
+        .filter(user_id=user_id, timestamp__gte=sessions[0].started_at - MAX_RECORDED_AT_SKEW)
+        .annotate(fix_time=Coalesce('recorded_at', 'timestamp'))
+        .filter(window)
+        .order_by('fix_time', 'id')
+        .values_list('fix_time', 'latitude', 'longitude')[:MAX_TILE_TRACK_POINTS]
+    )
+    grouped = [[] for _ in sessions]
+    index = 0
+    for fix_time, lat, lon in rows.iterator(chunk_size=5000):
+        while fix_time > sessions[index].last_fix_at:
+            index += 1
+        grouped[index].append((lat, lon))
+    return grouped
+
+
+def track_layer(user_id, z, x, y):
+    """
+    The user's sessions crossing the tile as an encoded 'tracks' layer.
+    Lines are simplified to about one tile unit before clipping.
+    """
+    min_lat, min_lon, max_lat, max_lon = padded_bounds(z, x, y)
+    sessions = list(
+        GPSSession.objects.filter(
+            user_id=user_id,
+            min_latitude__lte=max_lat, max_latitude__gte=min_lat,
+            min_longitude__lte=max_lon, max_longitude__gte=min_lon,
+        ).order_by('-started_at')[:MAX_TILE_SESSIONS]
+    )
+    if not sessions:
+        return b''
+    sessions.reverse()
+
+    layer = LayerBuilder('tracks')
+    project = tile_projector(z, x, y)
+    unit_m = 2 * math.pi * EARTH_RADIUS_M * math.cos(math.radians((min_lat + max_lat) / 2)) / ((1 << z) * EXTENT)
+    for session, points in zip(sessions, _session_points(user_id, sessions)):
+        if len(points) < 2:
+            continue
+        coords = [project(*points[i]) for i in simplify_track(points, tolerance_m=unit_m)]
+        for part in clip_line(coords, -MVT_BUFFER, EXTENT + MVT_BUFFER):
+            layer.add_feature(GEOM_LINESTRING, part, {
+                'session_id': session.id,
+                'started_at': session.started_at.isoformat(),
+                'distance_m': round(session.distance_m, 1),
+            }, feature_id=session.id)
+    return layer.encode()
+
+
+def latest_layer(z, x, y):
+    """
+    Latest positions inside the tile (and its buffer) as an encoded 'latest' layer.
+    """
+    bounds = padded_bounds(z, x, y)
+    latest_locations = overlay_pending(
+        filter_bbox(GPSLatest.objects.select_related('user'), *bounds),
+        contains=lambda lat, lon: in_bbox(lat, lon, *bounds),
+    )
+    layer = LayerBuilder('latest')
+    project = tile_projector(z, x, y)
+    for location in latest_locations:
+        px, py = (round(v) for v in project(location.latitude, location.longitude))
+        if -MVT_BUFFER <= px <= EXTENT + MVT_BUFFER and -MVT_BUFFER <= py <= EXTENT + MVT_BUFFER:
+            layer.add_feature(GEOM_POINT, [(px, py)], {
+                'username': location.user.username,
+                'timestamp': location.timestamp.isoformat(),
+                'accuracy': location.accuracy,
+            }, feature_id=location.user_id)
+    return layer.encode()
+
+
+def get_vector_tile(user_id, z, x, y):
+    """
+    Encoded MVT for one tile as seen by user_id; b'' when the tile is empty.
+    Both layers come from the cache when present.
+    """
+    track_min_zoom, cache_seconds, latest_ttl = mvt_options()
+    track_key = TRACK_CACHE_KEY.format(user_id, track_version(user_id), z, x, y)
+    latest_key = LATEST_CACHE_KEY.format(z, x, y)
+    cached = cache.get_many([track_key, latest_key])
+
+    tracks = cached.get(track_key)
+    if tracks is None:
+        tracks = track_layer(user_id, z, x, y) if z >= track_min_zoom else b''
+        cache.set(track_key, tracks, cache_seconds)
+    latest = cached.get(latest_key)
+    if latest is None:
+        latest = latest_layer(z, x, y)
+        cache.set(latest_key, latest, latest_ttl)
+    # Later layers draw on top, so markers go last
+    return tracks + latest
@@ -0,0 +1,97 @@
+# gpsinfo/services/watermark_services.py
+"""
+Id gaps left behind by watermark refreshes.
+
+Refresh jobs fold in GPSLocation rows by id window above a watermark, but
+ingest transactions (bulk posts, queue drains, imports) commit out of id
+order: a row can become visible after the window holding its id has been
+processed. Each window therefore records the ids it did not see as gap
+ranges (start_id, end_id), and every later run first looks the open ranges
+up again and folds in the rows that have appeared since. Gaps left by
+rolled-back transactions (or by sequence values ON CONFLICT DO NOTHING
+consumed) expire after GAP_TTL.
+"""
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import GPSRefreshGap
+
+# No ingest transaction stays open this long
+GAP_TTL = timedelta(hours=1)
+
+# Gap ranges looked up per query
+GAP_LOOKUP_BATCH = 500
+
+
+def missing_ranges(low_id, high_id, seen_ids):
+    """
+    The (start_id, end_id) ranges of low_id < id <= high_id missing from
+    seen_ids, bounds included.
+    """
+    ranges = []
+    expected = low_id + 1
+    for location_id in sorted(seen_ids):
+        if location_id > expected:
+            ranges.append((expected, location_id - 1))
+        expected = max(expected, location_id + 1)
+    if expected <= high_id:
+        ranges.append((expected, high_id))
+    return ranges
+
+
+def record_gaps(job, low_id, high_id, seen_ids):
+    """
+    Remember the ids of low_id < id <= high_id missing from seen_ids, as
+    ranges. Call inside the transaction that advances the job's watermark.
+    """
+    GPSRefreshGap.objects.bulk_create(
+        [GPSRefreshGap(job=job, start_id=start, end_id=end) for start, end in missing_ranges(low_id, high_id, seen_ids)],
+        batch_size=GAP_LOOKUP_BATCH,
+    )
+
+
+def open_gaps(job):
+    """
+    Batches of the job's gap ranges that have not expired, oldest ids
+    first. Expired gaps are deleted.
+    """
+    GPSRefreshGap.objects.filter(job=job, first_seen__lt=timezone.now() - GAP_TTL).delete()
+    gaps = list(GPSRefreshGap.objects.filter(job=job).order_by('start_id'))
+    return [gaps[start:start + GAP_LOOKUP_BATCH] for start in range(0, len(gaps), GAP_LOOKUP_BATCH)]
+
+
+def gap_filter(gaps):
+    """
+    A filter on GPSLocation ids inside the gap ranges.
+    """
+    return reduce(or_, (Q(id__range=(gap.start_id, gap.end_id)) for gap in gaps))
+
+
+def close_gaps(job, gaps, location_ids):
+    """
+    Remove the ids of rows that have been folded in from the gaps; the
+    rest of each range stays open until it expires. Call inside the same
+    transaction.
+    """
+    found = sorted(location_ids)
+    remaining = []
+    changed = []
+    for gap in gaps:
+        inside = [location_id for location_id in found if gap.start_id <= location_id <= gap.end_id]
+        if not inside:
+            continue
+        changed.append(gap.pk)
+        remaining.extend(
+            GPSRefreshGap(job=job, start_id=start, end_id=end, first_seen=gap.first_seen)
+            for start, end in missing_ranges(gap.start_id - 1, gap.end_id, inside)
+        )
+    GPSRefreshGap.objects.filter(pk__in=changed).delete()
+    GPSRefreshGap.objects.bulk_create(remaining, batch_size=GAP_LOOKUP_BATCH)
+
+
+def clear_gaps(job):
+    GPSRefreshGap.objects.filter(job=job).delete()
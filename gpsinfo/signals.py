@@ -0,0 +1,56 @@
+# gpsinfo/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import GPSGeofence, GPSGeofencePresence
+from .services.geofence_services import bump_index_version, evaluate_fixes
+from .services.group_services import invalidate_group_snapshots
+from .services.live_services import broadcast_latest
+from .services.session_services import update_sessions
+
+# Sent after GPS fixes are stored, with the user and the new GPSLocation rows
+# (oldest fix first). Receivers run inside the ingest transaction.
+fixes_recorded = Signal()
+
+# Sent once committed with the user and the GPSGeofenceEvent rows (enter/exit)
+# detected in a batch of stored fixes
+geofence_crossed = Signal()
+
+
+@receiver(fixes_recorded)
+def broadcast_fixes(sender, user, locations, **kwargs):
+    """Fan the newest stored fix out to live WebSocket viewers once committed"""
+    newest = locations[-1]
+    transaction.on_commit(lambda: broadcast_latest(user, newest))
+
+
+@receiver(fixes_recorded)
+def invalidate_group_snapshot(sender, user, locations, **kwargs):
+    """Expire the cached latest positions of the user's group once committed"""
+    user_group = getattr(user, 'user_group', '')
+    if user_group:
+        transaction.on_commit(lambda: invalidate_group_snapshots([user_group]))
+
+
+@receiver(fixes_recorded)
+def segment_sessions(sender, user, locations, **kwargs):
+    """Extend the user's trip/activity sessions within the ingest transaction"""
+    update_sessions(user, locations)
+
+
+@receiver(fixes_recorded)
+def detect_geofence_crossings(sender, user, locations, **kwargs):
+    """Record geofence entries and exits within the ingest transaction"""
+    events = evaluate_fixes(user, locations)
+    if events:
+        transaction.on_commit(lambda: geofence_crossed.send(sender=GPSGeofence, user=user, events=events))
+
+
+@receiver(post_save, sender=GPSGeofence)
+@receiver(post_delete, sender=GPSGeofence)
+def refresh_geofence_index(sender, instance, **kwargs):
+    """Rebuild every process's fence grid once a fence change is committed"""
+    if not instance.is_active and instance.pk is not None:
+        GPSGeofencePresence.objects.filter(fence_id=instance.pk).delete()
+    transaction.on_commit(bump_index_version)
@@ -0,0 +1,45 @@
+# gpsinfo/testing.py
+"""
+Test helpers shared by the gpsinfo and events test suites.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+BULK_INGEST_URL = '/api/gpslocations/bulk/'
+
+
+class FixPostingMixin:
+    """
+    For APITestCase classes that feed fixes through the bulk ingest
+    endpoint. fix() times a fix relative to self.start unless given
+    another start.
+    """
+
+    def fix(self, seconds, latitude, longitude=114.1, start=None, **fields):
+        start = self.start if start is None else start
+        return {
+            'latitude': latitude, 'longitude': longitude,
+            'recorded_at': (start + timedelta(seconds=seconds)).isoformat(), **fields,
+        }
+
+    def track(self, latitudes, interval=10):
+        """
+        Fixes along longitude 114.1, interval seconds apart, the last one
+        interval seconds before now.
+        """
+        now = timezone.now()
+        return [self.fix(-interval * (len(latitudes) - i), lat, start=now) for i, lat in enumerate(latitudes)]
+
+    def post_fixes(self, fixes, user=None, on_commit=False):
+        """
+        Post fixes in one bulk request, as user when given, and return the
+        response. With on_commit the receivers deferred to the commit
+        (race timing, live pushes) run before it returns.
+        """
+        if user is not None:
+            self.client.force_authenticate(user=user)
+        if not on_commit:
+            return self.client.post(BULK_INGEST_URL, fixes, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(BULK_INGEST_URL, fixes, format='json')
@@ -1,11 +1,971 @@
-from rest_framework.test import APITestCase
-from .models import GPSLocation
+import json
+import os
+import tempfile
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from .middleware import JWTAuthMiddleware
+from .renderers import PACKED_HEADER, PACKED_MAGIC, GPSPackedRenderer, decode_packed, to_epoch_ms
+from .mvt import clip_line
+from .models import GPSDailyStats, GPSFilterState, GPSGeofence, GPSGeofenceEvent, GPSGeofencePresence, GPSHeatmapTile, GPSLocation, GPSLatest, GPSLocationRollup, GPSQueueProgress, GPSRefreshGap, GPSSession
+from .services.filter_services import rejected_counts
+from .services.geofence_services import GeofenceIndex
+from .services.latest_services import build_latest, latest_buffer, upsert_latest
+from .services.queue_services import drain_segment, store_queued
+from .routing import websocket_urlpatterns
+from .services.vector_tile_services import latest_layer, track_version
+from .testing import FixPostingMixin
+from .utils import geohash_encode, mercator_tile_xy
 
 class GPSLocationTests(APITestCase):
     def test_create_gps_location(self):
+        user = get_user_model().objects.create_user(username='tracker', password='pass')
+        self.client.force_authenticate(user=user)
         response = self.client.post('/api/gpslocations/', {
             'latitude': 40.7128,
             'longitude': -74.0060,
             'timestamp': '2025-08-12T12:00:00Z'
         })
-        self.assertEqual(response.status_code, 201)
\ No newline at end of file
+        self.assertEqual(response.status_code, 201)
+
+
+class GPSBulkIngestTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='runner', password='pass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_ingest_reports_per_item_results(self):
+        response = self.client.post('/api/gpslocations/bulk/', [
+            {'latitude': 22.30, 'longitude': 114.17},
+            {'latitude': 'north', 'longitude': 114.18},
+            {'latitude': 22.32, 'longitude': 114.19, 'accuracy': 5.0},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['results'][1]['status'], 'rejected')
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 2)
+        latest = GPSLatest.objects.get(user=self.user)
+        self.assertEqual(latest.latitude, 22.32)
+
+    def test_bulk_ingest_accepts_ndjson(self):
+        body = '{"latitude": 22.30, "longitude": 114.17}\n{"latitude": 22.31, "longitude": 114.18}\n'
+        response = self.client.post('/api/gpslocations/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['accepted'], 2)
+
+
+class GPSLatestSpatialTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.viewer = User.objects.create_user(username='viewer', password='pass')
+        positions = {
+            'central': (22.2819, 114.1582),
+            'tsimshatsui': (22.2988, 114.1722),
+            'tokyo': (35.6762, 139.6503),
+        }
+        for username, (lat, lon) in positions.items():
+            user = User.objects.create_user(username=username, password='pass')
+            GPSLatest.objects.create(user=user, latitude=lat, longitude=lon, timestamp='2025-08-12T12:00:00Z')
+        self.client.force_authenticate(user=self.viewer)
+
+    def test_latest_bbox_filter(self):
+        response = self.client.get('/api/gpslocations/latest/', {'bbox': '114.0,22.2,114.3,22.4'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['username'] for row in response.data}, {'central', 'tsimshatsui'})
+
+    def test_latest_radius_filter_orders_by_distance(self):
+        response = self.client.get('/api/gpslocations/latest/', {'lat': 22.2990, 'lon': 114.1720, 'radius': 3000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['username'] for row in response.data], ['tsimshatsui', 'central'])
+
+    def test_latest_rejects_malformed_bbox(self):
+        response = self.client.get('/api/gpslocations/latest/', {'bbox': '114.0,22.2'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GPSMyLocationsTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tracker', password='pass')
+        for minute in range(5):
+            location = GPSLocation.objects.create(user=self.user, latitude=22.3, longitude=round(114.1 + minute / 100, 2))
+            GPSLocation.objects.filter(pk=location.pk).update(timestamp=f'2025-08-12T12:0{minute}:00Z')
+        self.client.force_authenticate(user=self.user)
+
+    def test_my_locations_pages_with_cursor(self):
+        response = self.client.get('/api/gpslocations/my-locations/', {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['longitude'], 114.14)
+
+        seen = [row['id'] for row in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            seen.extend(row['id'] for row in response.data['results'])
+            next_url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_my_locations_since_until_window(self):
+        response = self.client.get('/api/gpslocations/my-locations/', {
+            'since': '2025-08-12T12:01:00Z',
+            'until': '2025-08-12T12:03:00Z',
+            'order': 'asc',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['longitude'] for row in response.data['results']], [114.12, 114.13])
+
+    def test_my_locations_simplify_keeps_track_endpoints(self):
+        response = self.client.get('/api/gpslocations/my-locations/', {'max_points': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['raw_count'], 5)
+        self.assertEqual([row['longitude'] for row in response.data['results']], [114.1, 114.14])
+
+    def test_my_locations_columnar_encoding(self):
+        response = self.client.get(
+            '/api/gpslocations/my-locations/', {'order': 'asc'},
+            HTTP_ACCEPT='application/vnd.geostar.columnar+json',
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(body['usernames'], ['tracker'])
+        self.assertEqual(body['lon'], [114100000, 10000, 10000, 10000, 10000])
+        self.assertEqual(body['t'][1:], [60000] * 4)
+
+    def test_my_locations_packed_round_trip(self):
+        expected = self.client.get('/api/gpslocations/my-locations/', {'limit': 2}).data
+        response = self.client.get(
+            '/api/gpslocations/my-locations/', {'limit': 2}, HTTP_ACCEPT='application/vnd.geostar.packed',
+        )
+        self.assertEqual(response.status_code, 200)
+        points, next_url = decode_packed(response.content)
+        self.assertEqual(next_url, expected['next'])
+        self.assertEqual(
+            [(point['id'], point['username'], point['latitude'], point['longitude'], point['timestamp'])
+             for point in points],
+            [(row['id'], 'tracker', row['latitude'], row['longitude'], to_epoch_ms(row['timestamp']))
+             for row in expected['results']],
+        )
+
+        # Following the cursor carried in the body reaches every row once
+        seen = [point['id'] for point in points]
+        while next_url:
+            points, next_url = decode_packed(
+                self.client.get(next_url, HTTP_ACCEPT='application/vnd.geostar.packed').content
+            )
+            seen.extend(point['id'] for point in points)
+        self.assertEqual(sorted(seen), sorted(GPSLocation.objects.values_list('id', flat=True)))
+
+
+class GPSRetentionTests(APITestCase):
+    def test_retention_rolls_old_points_into_minutes(self):
+        user = get_user_model().objects.create_user(username='archivist', password='pass')
+        for second, lat in [(0, 22.30), (20, 22.32), (40, 22.34), (70, 22.40)]:
+            location = GPSLocation.objects.create(user=user, latitude=lat, longitude=114.1, accuracy=second + 1)
+            GPSLocation.objects.filter(pk=location.pk).update(
+                timestamp=timezone.now() - timedelta(days=200, seconds=-second)
+            )
+        recent = GPSLocation.objects.create(user=user, latitude=22.5, longitude=114.2)
+
+        call_command('gps_retention', days=90, stdout=StringIO())
+
+        self.assertEqual(list(GPSLocation.objects.values_list('pk', flat=True)), [recent.pk])
+        rollups = GPSLocationRollup.objects.filter(user=user)
+        self.assertEqual(sum(rollup.point_count for rollup in rollups), 4)
+        self.assertLessEqual(rollups.count(), 3)
+
+    def test_late_points_merge_into_stored_minutes(self):
+        user = get_user_model().objects.create_user(username='archivist', password='pass')
+        minute = (timezone.now() - timedelta(days=200)).replace(second=0, microsecond=0)
+
+        def add(lat, accuracy, altitude=None):
+            location = GPSLocation.objects.create(user=user, latitude=lat, longitude=114.1, accuracy=accuracy, altitude=altitude)
+            GPSLocation.objects.filter(pk=location.pk).update(timestamp=minute + timedelta(seconds=10))
+
+        add(22.30, 8.0, altitude=10.0)
+        add(22.33, 6.0, altitude=14.0)
+        call_command('gps_retention', days=90, stdout=StringIO())
+        # A point for the same minute arrives after it was rolled up
+        add(22.36, 4.0, altitude=18.0)
+        call_command('gps_retention', days=90, stdout=StringIO())
+
+        rollup = GPSLocationRollup.objects.get(user=user)
+        self.assertEqual(rollup.point_count, 3)
+        self.assertAlmostEqual(rollup.latitude, 22.33)
+        self.assertAlmostEqual(rollup.altitude, 14.0)
+        self.assertEqual(rollup.accuracy, 4.0)
+        self.assertFalse(GPSLocation.objects.exists())
+
+    @override_settings(GPS_HEATMAP_MAX_ZOOM=2)
+    def test_retention_waits_for_refreshes_reading_raw_points(self):
+        user = get_user_model().objects.create_user(username='archivist', password='pass')
+
+        def add_old():
+            location = GPSLocation.objects.create(user=user, latitude=22.3, longitude=114.1)
+            GPSLocation.objects.filter(pk=location.pk).update(timestamp=timezone.now() - timedelta(days=200))
+
+        add_old()
+        call_command('gps_heatmap', stdout=StringIO())
+        add_old()
+        # The heatmap has not counted the second point yet; daily stats never ran and are not waited for
+        with self.assertRaisesMessage(CommandError, 'run gps_heatmap first'):
+            call_command('gps_retention', days=90, stdout=StringIO())
+        self.assertEqual(GPSLocation.objects.count(), 2)
+
+        call_command('gps_heatmap', stdout=StringIO())
+        call_command('gps_retention', days=90, stdout=StringIO())
+        self.assertFalse(GPSLocation.objects.exists())
+        self.assertEqual(GPSHeatmapTile.objects.get(z=0, x=0, y=0).total, 2)
+
+
+@override_settings(GPS_LATEST_WRITE_BEHIND=True, GPS_LATEST_FLUSH_INTERVAL=3600)
+class GPSLatestWriteBehindTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='sprinter', password='pass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_latest_is_buffered_until_flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/gpslocations/', {'latitude': 22.3, 'longitude': 114.1}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/gpslocations/', {'latitude': 22.4, 'longitude': 114.2}, format='json')
+
+        self.assertFalse(GPSLatest.objects.filter(user=self.user).exists())
+        response = self.client.get('/api/gpslocations/latest/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['latitude'], 22.4)
+
+        self.assertEqual(latest_buffer.flush(), 1)
+        self.assertEqual(GPSLatest.objects.get(user=self.user).latitude, 22.4)
+
+    def test_viewport_filters_apply_to_buffered_positions(self):
+        self.addCleanup(latest_buffer.flush)
+        leaver = get_user_model().objects.create_user(username='leaver', password='pass')
+        GPSLatest.objects.create(user=self.user, latitude=10.0, longitude=10.0, timestamp=timezone.now() - timedelta(minutes=5))
+        GPSLatest.objects.create(user=leaver, latitude=22.301, longitude=114.1, timestamp=timezone.now() - timedelta(minutes=5))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/gpslocations/', {'latitude': 22.3005, 'longitude': 114.1}, format='json')
+        self.client.force_authenticate(user=leaver)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/gpslocations/', {'latitude': 40.0, 'longitude': 0.0}, format='json')
+
+        response = self.client.get('/api/gpslocations/latest/', {'bbox': '114.0,22.2,114.2,22.4'})
+        self.assertEqual([row['username'] for row in response.data], ['sprinter'])
+
+        # Nearest first, by the buffered positions
+        GPSLatest.objects.create(
+            user=get_user_model().objects.create_user(username='bystander', password='pass'),
+            latitude=22.3002, longitude=114.1, timestamp=timezone.now(),
+        )
+        response = self.client.get('/api/gpslocations/latest/', {'lat': 22.3006, 'lon': 114.1, 'radius': 1000})
+        self.assertEqual([row['username'] for row in response.data], ['sprinter', 'bystander'])
+
+
+class GPSQueryCountTests(APITestCase):
+    def setUp(self):
+        self.viewer = get_user_model().objects.create_user(username='watcher', password='pass')
+        self.client.force_authenticate(user=self.viewer)
+
+    def add_users(self, count):
+        User = get_user_model()
+        start = User.objects.count()
+        for n in range(start, start + count):
+            user = User.objects.create_user(username=f'member{n}', password='pass')
+            GPSLatest.objects.create(user=user, latitude=22.3, longitude=114.1, timestamp='2025-08-12T12:00:00Z')
+            GPSLocation.objects.create(user=self.viewer, latitude=22.3, longitude=114.1)
+
+    def test_latest_query_count_is_constant(self):
+        for count in (2, 10):
+            self.add_users(count)
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/gpslocations/latest/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_my_locations_query_count_is_constant(self):
+        for count in (2, 10):
+            self.add_users(count)
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/gpslocations/my-locations/')
+            self.assertEqual(response.status_code, 200)
+
+
+class GPSGroupLatestTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.lead = User.objects.create_user(username='lead', password='pass', user_group='blue')
+        self.mate = User.objects.create_user(username='mate', password='pass', user_group='blue')
+        self.other = User.objects.create_user(username='other', password='pass', user_group='red')
+        for user in (self.lead, self.other):
+            GPSLatest.objects.create(user=user, latitude=22.3, longitude=114.1, timestamp='2025-08-12T12:00:00Z')
+        self.client.force_authenticate(user=self.lead)
+
+    def test_group_snapshot_lists_members_only(self):
+        response = self.client.get('/api/gpslocations/group/blue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['username'] for row in response.data], ['lead'])
+
+        response = self.client.get('/api/gpslocations/latest/', {'group': 'red'})
+        self.assertEqual([row['username'] for row in response.data], ['other'])
+
+    def test_new_fix_invalidates_group_snapshot(self):
+        self.client.get('/api/gpslocations/group/blue/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/gpslocations/group/blue/')
+
+        self.client.force_authenticate(user=self.mate)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/gpslocations/', {'latitude': 22.4, 'longitude': 114.2}, format='json')
+
+        response = self.client.get('/api/gpslocations/group/blue/')
+        self.assertEqual(sorted(row['username'] for row in response.data), ['lead', 'mate'])
+
+
+class GPSIdempotentIngestTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='courier', password='pass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_retried_fix_is_stored_once(self):
+        fix = {'latitude': 22.3, 'longitude': 114.1, 'device_id': 'phone-1', 'sequence': 7}
+        first = self.client.post('/api/gpslocations/', fix, format='json')
+        retry = self.client.post('/api/gpslocations/', fix, format='json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_skips_stored_and_repeated_sequences(self):
+        self.client.post('/api/gpslocations/', {
+            'latitude': 22.3, 'longitude': 114.1, 'device_id': 'phone-1', 'sequence': 1,
+        }, format='json')
+        response = self.client.post('/api/gpslocations/bulk/', [
+            {'latitude': 22.3, 'longitude': 114.1, 'device_id': 'phone-1', 'sequence': 1},
+            {'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2},
+            {'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2},
+            {'latitude': 22.5, 'longitude': 114.3},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['accepted'], response.data['duplicates']), (2, 2))
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['duplicate', 'accepted', 'duplicate', 'accepted'],
+        )
+        self.assertIsNotNone(response.data['results'][3]['id'])
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 3)
+
+        replay = self.client.post('/api/gpslocations/bulk/', [
+            {'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2},
+        ], format='json')
+        self.assertEqual(replay.status_code, 200)
+
+    def test_late_fix_does_not_move_latest_backwards(self):
+        now = timezone.now()
+        self.client.post('/api/gpslocations/', {
+            'latitude': 22.4, 'longitude': 114.2, 'recorded_at': now.isoformat(),
+        }, format='json')
+        self.client.post('/api/gpslocations/bulk/', [
+            {'latitude': 22.3, 'longitude': 114.1, 'recorded_at': (now - timedelta(minutes=2)).isoformat()},
+            {'latitude': 22.2, 'longitude': 114.0, 'recorded_at': (now - timedelta(minutes=1)).isoformat()},
+        ], format='json')
+        latest = GPSLatest.objects.get(user=self.user)
+        self.assertEqual((latest.latitude, latest.timestamp), (22.4, now))
+
+        # Write-behind flushes from a stale worker go through the same guard
+        upsert_latest([build_latest(self.user, {
+            'latitude': 22.1, 'longitude': 114.0, 'timestamp': now - timedelta(hours=1),
+            'altitude': None, 'accuracy': None,
+        })])
+        self.assertEqual(GPSLatest.objects.get(user=self.user).latitude, 22.4)
+
+    def test_future_recorded_at_is_rejected(self):
+        response = self.client.post('/api/gpslocations/', {
+            'latitude': 22.3, 'longitude': 114.1,
+            'recorded_at': (timezone.now() + timedelta(hours=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class GPSQueuedIngestTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='starter', password='pass')
+        self.client.force_authenticate(user=self.user)
+        queue_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(queue_dir.cleanup)
+        settings_override = override_settings(GPS_INGEST_QUEUED=True, GPS_INGEST_QUEUE_DIR=queue_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_fixes_are_queued_then_drained(self):
+        single = self.client.post('/api/gpslocations/', {
+            'latitude': 22.3, 'longitude': 114.1, 'device_id': 'phone-1', 'sequence': 1,
+        }, format='json')
+        bulk = self.client.post('/api/gpslocations/bulk/', [
+            {'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2},
+            {'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2},
+            {'latitude': 'north', 'longitude': 114.2},
+        ], format='json')
+        self.assertEqual(single.status_code, 202)
+        self.assertEqual(bulk.status_code, 202)
+        self.assertEqual((bulk.data['queued'], bulk.data['rejected']), (2, 1))
+        self.assertFalse(GPSLocation.objects.exists())
+
+        received_before = timezone.now()
+        out = StringIO()
+        call_command('gps_drain', '--once', stdout=out)
+        self.assertIn('stored 2 fixes', out.getvalue())
+        locations = GPSLocation.objects.filter(user=self.user)
+        self.assertEqual(locations.count(), 2)
+        self.assertTrue(all(location.timestamp <= received_before for location in locations))
+        self.assertEqual(GPSLatest.objects.get(user=self.user).latitude, 22.4)
+
+        # A retry after the drain is absorbed by the idempotency key
+        self.client.post('/api/gpslocations/', {
+            'latitude': 22.4, 'longitude': 114.2, 'device_id': 'phone-1', 'sequence': 2,
+        }, format='json')
+        call_command('gps_drain', '--once', stdout=StringIO())
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 2)
+
+    def entries(self, sequenced):
+        return [
+            {'user': self.user.pk, 'timestamp': timezone.now().isoformat(), 'latitude': 22.3 + n / 1000,
+             'longitude': 114.1, **({'device_id': 'phone-1', 'sequence': n} if sequenced else {})}
+            for n in range(3)
+        ]
+
+    def test_redrained_batch_stores_sequenced_fixes_once(self):
+        # The COPY path on PostgreSQL, multi-row INSERT elsewhere
+        self.assertEqual(store_queued(self.entries(sequenced=True)), 3)
+        self.assertEqual(store_queued(self.entries(sequenced=True)), 0)
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY staging needs PostgreSQL')
+    def test_copy_drain_returns_inserted_rows(self):
+        entries = self.entries(sequenced=True)
+        store_queued(entries[:1])
+        self.assertEqual(store_queued(self.entries(sequenced=True)), 2)
+        self.assertEqual(
+            sorted(GPSLocation.objects.filter(user=self.user).values_list('sequence', flat=True)), [0, 1, 2]
+        )
+
+    def test_interrupted_drain_resumes_behind_the_committed_batch(self):
+        lines = [json.dumps(entry) + '\n' for entry in self.entries(sequenced=False)]
+        path = Path(settings.GPS_INGEST_QUEUE_DIR) / 'claimed-1.log'
+        path.write_text(''.join(lines))
+        # A drain stored the first two fixes and stopped before deleting the segment
+        store_queued([json.loads(line) for line in lines[:2]], path.name, len(lines[0]) + len(lines[1]))
+
+        self.assertEqual(drain_segment(path, batch_size=2), 1)
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(path.exists())
+        self.assertFalse(GPSQueueProgress.objects.exists())
+
+
+class GPSImportCommandTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = workdir.name
+
+    def write(self, name, content):
+        path = os.path.join(self.workdir, name)
+        with open(path, 'w') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_resolves_users_and_rebuilds_latest(self):
+        path = self.write('history.csv', (
+            'username,latitude,longitude,time,altitude\n'
+            'alice,22.30,114.10,2024-01-01T10:00:00Z,5\n'
+            'alice,22.31,114.11,2024-01-01T10:01:00Z,\n'
+            'bob,22.40,114.20,2024-01-01T09:00:00Z,\n'
+            'carol,22.50,114.30,2024-01-01T09:00:00Z,\n'
+            'bob,north,114.20,2024-01-01T09:01:00Z,\n'
+        ))
+        out = StringIO()
+        call_command('gps_import', path, '--chunk-size', '2', stdout=out)
+
+        self.assertIn('Imported 3 points', out.getvalue())
+        self.assertEqual(GPSLocation.objects.filter(user=self.alice).count(), 2)
+        latest = GPSLatest.objects.get(user=self.alice)
+        self.assertEqual((latest.latitude, latest.geohash), (22.31, geohash_encode(22.31, 114.11)))
+        self.assertEqual(GPSLatest.objects.get(user=self.bob).latitude, 22.40)
+        self.assertFalse(os.path.exists(path + '.offset'))
+
+        # An imported history is kept for the retention window from its import, not its fix times
+        call_command('gps_retention', days=90, stdout=StringIO())
+        self.assertEqual(GPSLocation.objects.count(), 3)
+        self.assertEqual(
+            GPSLocation.objects.filter(user=self.bob).values_list('recorded_at', flat=True).get(),
+            datetime(2024, 1, 1, 9, 0, tzinfo=dt_timezone.utc),
+        )
+
+    def test_gpx_import_resumes_from_offset(self):
+        path = self.write('ride.gpx', (
+            '<?xml version="1.0"?>'
+            '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+            '<trkpt lat="22.30" lon="114.10"><ele>5</ele><time>2024-01-01T10:00:00Z</time></trkpt>'
+            '<trkpt lat="22.31" lon="114.11"><ele>6</ele><time>2024-01-01T10:01:00Z</time></trkpt>'
+            '<trkpt lat="22.32" lon="114.12"><ele>7</ele><time>2024-01-01T10:02:00Z</time></trkpt>'
+            '</trkseg></trk></gpx>'
+        ))
+        call_command('gps_import', path, '--user', 'alice', '--offset', '1', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(GPSLocation.objects.filter(user=self.alice).values_list('altitude', flat=True)),
+            [6.0, 7.0],
+        )
+        self.assertEqual(GPSLatest.objects.get(user=self.alice).latitude, 22.32)
+
+
+class GPSSessionTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hiker', password='pass')
+        self.client.force_authenticate(user=self.user)
+        self.start = timezone.now() - timedelta(hours=2)
+
+    def test_sessions_split_on_stops_and_gaps(self):
+        # Walk ~110 m per minute, stand still for 6 minutes, then walk on after a long gap
+        walk = [self.fix(60 * i, 22.300 + 0.001 * i) for i in range(5)]
+        dwell = [self.fix(240 + 60 * i, 22.304 + 0.00001 * i) for i in range(1, 7)]
+        self.post_fixes(walk[:3])
+        self.post_fixes(walk[3:] + dwell)
+        self.post_fixes([self.fix(3600, 22.310), self.fix(3660, 22.311)])
+
+        response = self.client.get('/api/gpslocations/sessions/')
+        self.assertEqual(response.status_code, 200)
+        second, first = response.data['results']
+        self.assertTrue(first['is_closed'])
+        self.assertEqual(first['duration_seconds'], 240)
+        self.assertAlmostEqual(first['distance_m'], 444.8, delta=1)
+        self.assertEqual([round(v, 6) for v in first['bbox']], [114.1, 22.3, 114.1, 22.304])
+        self.assertFalse(second['is_closed'])
+        self.assertEqual(second['point_count'], 2)
+
+        incremental = list(GPSSession.objects.values_list('started_at', 'ended_at', 'distance_m'))
+        call_command('gps_sessions', '--user', 'hiker', stdout=StringIO())
+        self.assertEqual(list(GPSSession.objects.values_list('started_at', 'ended_at', 'distance_m')), incremental)
+
+
+class GPSDailyStatsTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='cyclist', password='pass')
+        self.client.force_authenticate(user=self.user)
+        self.day_start = timezone.localtime().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        self.start = self.day_start
+
+    def test_daily_stats_refresh_incrementally(self):
+        # 0.001 deg latitude is ~111 m; 20 s per step is ~5.6 m/s
+        self.post_fixes([self.fix(20 * i, 22.3 + 0.001 * i, altitude=10 + 2 * i) for i in range(4)])
+        call_command('gps_daily_stats', stdout=StringIO())
+        self.post_fixes([self.fix(20 * i, 22.3 + 0.001 * i, altitude=10 + 2 * i) for i in range(4, 6)])
+        call_command('gps_daily_stats', stdout=StringIO())
+
+        stats = GPSDailyStats.objects.get(user=self.user)
+        self.assertEqual(stats.point_count, 6)
+        self.assertAlmostEqual(stats.distance_m, 5 * 111.19, delta=1)
+        self.assertEqual(stats.moving_seconds, 100)
+        # Climbs under the 3 m noise threshold are held back until they add up
+        self.assertEqual(stats.elevation_gain_m, 8)
+
+        # A late fix inside the processed part of the day triggers a recompute
+        self.post_fixes([self.fix(30, 22.3015, altitude=13)])
+        call_command('gps_daily_stats', stdout=StringIO())
+        self.assertEqual(GPSDailyStats.objects.get(user=self.user).point_count, 7)
+
+        response = self.client.get('/api/gpslocations/stats/daily/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['day'], self.day_start.date().isoformat())
+        self.assertAlmostEqual(response.data[0]['average_speed_mps'], 5.56, delta=0.05)
+
+        response = self.client.get('/api/gpslocations/stats/daily/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_committed_below_the_watermark_are_counted(self):
+        def add(location_id, seconds):
+            GPSLocation.objects.create(
+                id=location_id, user=self.user, latitude=22.3 + 0.0001 * seconds, longitude=114.1,
+                recorded_at=self.day_start + timedelta(seconds=seconds),
+            )
+
+        def gaps():
+            return list(GPSRefreshGap.objects.order_by('start_id').values_list('start_id', 'end_id'))
+
+        add(1001, 0)
+        add(1005, 40)
+        call_command('gps_daily_stats', stdout=StringIO())
+        self.assertEqual(GPSDailyStats.objects.get(user=self.user).point_count, 2)
+        # Ids below the first row are one range, not a thousand rows
+        self.assertEqual(gaps(), [(1, 1000), (1002, 1004)])
+
+        # Id 1003 commits after the window holding it was folded in; the rest of its gap stays open
+        add(1003, 20)
+        add(1006, 60)
+        call_command('gps_daily_stats', stdout=StringIO())
+        stats = GPSDailyStats.objects.get(user=self.user)
+        self.assertEqual(stats.point_count, 4)
+        self.assertEqual(gaps(), [(1, 1000), (1002, 1002), (1004, 1004)])
+        self.assertAlmostEqual(stats.distance_m, 3 * 0.0020 * 111195, delta=1)
+        # Nothing is counted twice on a later run
+        call_command('gps_daily_stats', stdout=StringIO())
+        self.assertEqual(GPSDailyStats.objects.get(user=self.user).point_count, 4)
+
+
+class GPSHeatmapTileTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='mapper', password='pass')
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+
+    @override_settings(GPS_HEATMAP_MAX_ZOOM=4)
+    def test_heatmap_tiles_count_history_and_refresh(self):
+        GPSLocation.objects.bulk_create([
+            GPSLocation(user=self.user, latitude=22.3, longitude=114.1, timestamp=timezone.now())
+            for _ in range(3)
+        ])
+        call_command('gps_heatmap', stdout=StringIO())
+        tile = GPSHeatmapTile.objects.get(z=0, x=0, y=0)
+        self.assertEqual((tile.total, tile.max_count), (3, 3))
+        self.assertEqual(GPSHeatmapTile.objects.count(), 5)
+
+        x, y = (int(v) for v in mercator_tile_xy(22.3, 114.1, 4))
+        response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.bin')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Heatmap-Grid'], '64')
+        counts = array('I', response.content)
+        self.assertEqual((len(counts), sum(counts), max(counts)), (64 * 64, 3, 3))
+
+        response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.png')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        etag = response['ETag']
+        # A cached tile costs one lookup of its version
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.png', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Tags are compared whole, not as substrings of the header
+        response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.png', HTTP_IF_NONE_MATCH=f'"x{etag[1:-1]}x", W/"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.png', HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+        # New points are folded in and change the version the rendering is cached under
+        GPSLocation.objects.create(user=self.user, latitude=22.3, longitude=114.1, timestamp=timezone.now())
+        call_command('gps_heatmap', stdout=StringIO())
+        response = self.client.get(f'/api/gps/heatmap/4/{x}/{y}.png', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(GPSHeatmapTile.objects.get(z=0, x=0, y=0).total, 4)
+
+        # A row committing below the watermark after its window was folded in is still counted
+        last_id = GPSLocation.objects.order_by('-id').values_list('id', flat=True).first()
+        GPSLocation.objects.create(id=last_id + 2, user=self.user, latitude=22.3, longitude=114.1)
+        call_command('gps_heatmap', stdout=StringIO())
+        GPSLocation.objects.create(id=last_id + 1, user=self.user, latitude=22.3, longitude=114.1)
+        call_command('gps_heatmap', stdout=StringIO())
+        self.assertEqual(GPSHeatmapTile.objects.get(z=0, x=0, y=0).total, 6)
+        call_command('gps_heatmap', stdout=StringIO())
+        self.assertEqual(GPSHeatmapTile.objects.get(z=0, x=0, y=0).total, 6)
+
+        self.assertEqual(self.client.get(f'/api/gps/heatmap/4/{x + 1}/{y}.png').status_code, 204)
+        self.assertEqual(self.client.get('/api/gps/heatmap/5/0/0.png').status_code, 404)
+
+        # An empty tile is not remembered as empty once a refresh fills it
+        east_lon = 114.1 + 360 / 16
+        GPSLocation.objects.create(user=self.user, latitude=22.3, longitude=east_lon)
+        call_command('gps_heatmap', stdout=StringIO())
+        self.assertEqual(self.client.get(f'/api/gps/heatmap/4/{x + 1}/{y}.png').status_code, 200)
+
+
+class GPSVectorTileTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='tiler', password='pass')
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+
+    def test_vector_tile_layers_cache_and_invalidation(self):
+        self.post_fixes(self.track([22.3 + 0.0005 * i for i in range(5)]))
+        x, y = (int(v) for v in mercator_tile_xy(22.3, 114.1, 14))
+        url = f'/api/gps/tiles/14/{x}/{y}.mvt'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'tracks', response.content)
+        self.assertIn(b'latest', response.content)
+        self.assertIn(b'tiler', response.content)
+
+        # Cached layers cost one lookup of the track version
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        # A new fix retires the cached track layer
+        self.post_fixes(self.track([22.3025]))
+        extended = self.client.get(url).content
+        self.assertNotEqual(extended, response.content)
+
+        # So does a late fix inside the drawn session, which no session counts
+        version = track_version(self.user.pk)
+        self.post_fixes([self.fix(-25, 22.3012, 114.1005, start=timezone.now())])
+        self.assertNotEqual(track_version(self.user.pk), version)
+        self.assertNotEqual(self.client.get(url).content, extended)
+
+        # Below the track zoom only markers are drawn
+        x, y = (int(v) for v in mercator_tile_xy(22.3, 114.1, 4))
+        response = self.client.get(f'/api/gps/tiles/4/{x}/{y}.mvt')
+        self.assertNotIn(b'tracks', response.content)
+        self.assertEqual(self.client.get(f'/api/gps/tiles/4/{x + 1}/{y}.mvt').status_code, 204)
+        self.assertEqual(self.client.get('/api/gps/tiles/23/0/0.mvt').status_code, 404)
+
+    @override_settings(GPS_LATEST_WRITE_BEHIND=True, GPS_LATEST_FLUSH_INTERVAL=3600)
+    def test_latest_layer_uses_buffered_positions(self):
+        self.addCleanup(latest_buffer.flush)
+        User = get_user_model()
+        arriving, leaving = User.objects.create_user(username='arriving'), User.objects.create_user(username='leaving')
+        earlier = timezone.now() - timedelta(minutes=5)
+        GPSLatest.objects.create(user=arriving, latitude=10.0, longitude=10.0, timestamp=earlier)
+        GPSLatest.objects.create(user=leaving, latitude=22.3, longitude=114.1, timestamp=earlier)
+        latest_buffer.put(arriving, {'latitude': 22.3, 'longitude': 114.1, 'timestamp': timezone.now(), 'altitude': None, 'accuracy': None})
+        latest_buffer.put(leaving, {'latitude': 40.0, 'longitude': 0.0, 'timestamp': timezone.now(), 'altitude': None, 'accuracy': None})
+
+        x, y = (int(v) for v in mercator_tile_xy(22.3, 114.1, 14))
+        layer = latest_layer(14, x, y)
+        self.assertIn(b'arriving', layer)
+        self.assertNotIn(b'leaving', layer)
+
+    def test_clip_line_splits_on_exit(self):
+        parts = clip_line([(-50, 10), (50, 10), (150, 10), (150, 50), (50, 50)], 0, 100)
+        self.assertEqual(parts, [[(0, 10), (50, 10), (100, 10)], [(100, 50), (50, 50)]])
+
+
+class GPSGeofenceTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='walker', password='pass')
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.corral = GPSGeofence.objects.create(
+                name='Start corral', center_latitude=22.3, center_longitude=114.1, radius_m=100,
+            )
+            GPSGeofence.objects.create(
+                name='Far away', shape=GPSGeofence.SHAPE_POLYGON,
+                polygon=[[10, 10], [10, 11], [11, 11], [11, 10]],
+            )
+
+    def test_only_transitions_are_recorded(self):
+        # 0.002 deg latitude is ~220 m, outside the 100 m circle
+        self.post_fixes(self.track([22.298, 22.3, 22.3005]))
+        self.post_fixes(self.track([22.3002, 22.302]))
+
+        events = list(GPSGeofenceEvent.objects.order_by('occurred_at').values_list('fence__name', 'kind'))
+        self.assertEqual(events, [('Start corral', 'enter'), ('Start corral', 'exit')])
+        self.assertFalse(GPSGeofencePresence.objects.exists())
+
+        response = self.client.get('/api/gpslocations/geofences/events/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['kind'] for event in response.data], ['exit', 'enter'])
+
+    def test_fixes_are_evaluated_in_fix_time_order(self):
+        self.start = timezone.now()
+        # Newest first in the payload: outside, then inside, then outside again in fix time
+        self.post_fixes([self.fix(-10, 22.302), self.fix(-20, 22.3), self.fix(-30, 22.298)], on_commit=True)
+        # A delayed offline batch from before those fixes changes nothing
+        self.post_fixes([self.fix(-50, 22.3), self.fix(-40, 22.298)], on_commit=True)
+
+        events = list(GPSGeofenceEvent.objects.order_by('occurred_at').values_list('kind', 'latitude'))
+        self.assertEqual(events, [('enter', 22.3), ('exit', 22.302)])
+        self.assertFalse(GPSGeofencePresence.objects.exists())
+
+    def test_deactivated_fence_drops_presence(self):
+        self.post_fixes(self.track([22.3]))
+        self.assertTrue(GPSGeofencePresence.objects.filter(fence=self.corral).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.corral.is_active = False
+            self.corral.save()
+        self.assertFalse(GPSGeofencePresence.objects.exists())
+
+    def test_grid_index_matches_shapes(self):
+        index = GeofenceIndex(GPSGeofence.objects.all())
+        self.assertEqual(index.containing(22.3, 114.1), {self.corral.id})
+        self.assertEqual(len(index.containing(10.5, 10.5)), 1)
+        self.assertEqual(index.containing(10.5, 11.5), set())
+
+
+class GPSTrackExportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='hiker', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        start = timezone.now() - timedelta(hours=1)
+        GPSLocation.objects.bulk_create(
+            [GPSLocation(user=self.user, latitude=22.3 + 0.001 * i, longitude=114.1, altitude=10.0 + i,
+                         recorded_at=start + timedelta(seconds=10 * i)) for i in range(3)]
+            + [GPSLocation(user=self.other, latitude=1.0, longitude=2.0, recorded_at=start)]
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def download(self, export_format, **params):
+        response = self.client.get(f'/api/gpslocations/export/{export_format}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_exports_stream_only_the_users_track(self):
+        lines = self.download('csv').splitlines()
+        self.assertEqual(lines[0], 'username,time,latitude,longitude,altitude,accuracy')
+        self.assertEqual([round(float(line.split(',')[2]), 3) for line in lines[1:]], [22.3, 22.301, 22.302])
+
+        collection = json.loads(self.download('geojson'))
+        self.assertEqual(len(collection['features']), 3)
+        self.assertEqual(collection['features'][0]['geometry']['coordinates'], [114.1, 22.3, 10.0])
+
+        gpx = self.download('gpx')
+        self.assertEqual(gpx.count('<trkpt '), 3)
+        self.assertIn('<name>hiker</name>', gpx)
+
+        # The command writes the same stream
+        out = StringIO()
+        call_command('gps_export', 'hiker', '--format', 'gpx', stdout=out)
+        self.assertEqual(out.getvalue(), gpx)
+
+        response = self.client.get('/api/gpslocations/export/csv/', {'since': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(GPS_INGEST_FILTERS=[
+    'gpsinfo.services.filter_services.AccuracyFilter',
+    'gpsinfo.services.filter_services.SpeedFilter',
+    'gpsinfo.services.filter_services.KalmanSmoother',
+])
+class GPSIngestFilterTests(FixPostingMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='walker', password='pass')
+        self.client.force_authenticate(user=self.user)
+        self.start = timezone.now() - timedelta(minutes=10)
+
+    def test_noise_is_counted_not_stored(self):
+        response = self.post_fixes([
+            self.fix(0, 22.3, accuracy=10.0),
+            self.fix(10, 22.3001, accuracy=0.0),    # zero accuracy
+            self.fix(20, 22.4, accuracy=10.0),      # 11 km in 20 s
+            self.fix(30, 22.3001, accuracy=10.0),
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['filtered'], 2)
+        self.assertEqual(
+            [(result['status'], result.get('reason')) for result in response.data['results']],
+            [('accepted', None), ('filtered', 'accuracy'), ('filtered', 'speed'), ('accepted', None)],
+        )
+        self.assertEqual(GPSLocation.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(rejected_counts(), {'accuracy': 1, 'speed': 1, 'kalman': 0})
+
+        # Filter state carries over to the next batch; the smoother pulls jitter towards the track
+        response = self.post_fixes([self.fix(40, 22.4, accuracy=10.0), self.fix(45, 22.3003, accuracy=10.0)])
+        self.assertEqual(response.data['filtered'], 1)
+        stored = GPSLocation.objects.filter(user=self.user).order_by('recorded_at').last()
+        self.assertTrue(22.3001 < stored.latitude < 22.3003)
+
+        # A replayed batch is stored once and leaves the filter state where it was
+        sequenced = [
+            self.fix(seconds, 22.3004, accuracy=10.0, device_id='phone', sequence=sequence)
+            for sequence, seconds in ((1, 50), (2, 55))
+        ]
+        self.assertEqual(self.post_fixes(sequenced).data['accepted'], 2)
+        state = GPSFilterState.objects.get(user=self.user).state
+        response = self.post_fixes([dict(fix, latitude=22.3008) for fix in sequenced])
+        self.assertEqual(response.data['duplicates'], 2)
+        self.assertEqual(GPSFilterState.objects.get(user=self.user).state, state)
+
+        # A rejected single fix is answered without an error
+        response = self.client.post('/api/gpslocations/', {'latitude': 22.3, 'longitude': 114.1, 'accuracy': 500.0}, format='json')
+        self.assertEqual(response.data, {'filtered': 'accuracy'})
+
+    def test_fixes_without_device_time_are_not_judged_on_speed(self):
+        # An offline replay without device times: 11 km apart but received together
+        response = self.post_fixes([
+            {'latitude': 22.3, 'longitude': 114.1, 'accuracy': 10.0},
+            {'latitude': 22.4, 'longitude': 114.1, 'accuracy': 10.0},
+        ])
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(
+            sorted(GPSLocation.objects.filter(user=self.user).values_list('latitude', flat=True)), [22.3, 22.4]
+        )
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class GPSLiveConsumerTests(TransactionTestCase):
+    # The middleware looks users up from a worker thread, so rows must be committed
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='broadcaster', password='pass')
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        self.addCleanup(latest_buffer.flush)
+
+    async def test_missing_or_invalid_token_is_rejected(self):
+        for path in ['/ws/gpslocations/live/', '/ws/gpslocations/live/?token=not-a-jwt']:
+            communicator = WebsocketCommunicator(self.application, path)
+            connected, close_code = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertEqual(close_code, 4401)
+
+    async def test_valid_token_receives_stored_fixes(self):
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        communicator = WebsocketCommunicator(self.application, f'/ws/gpslocations/live/?token={token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        recorded_at = timezone.now() - timedelta(minutes=5)
+        response = await sync_to_async(client.post)(
+            '/api/gpslocations/', {'latitude': 22.30, 'longitude': 114.17, 'recorded_at': recorded_at.isoformat()},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+
+        fix = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(fix['latitude'], 22.30)
+        self.assertEqual(fix['longitude'], 114.17)
+        # The fix time, as the latest endpoint reports it, not the receive time
+        self.assertEqual(parse_datetime(fix['timestamp']), recorded_at)
+        await communicator.disconnect()
+
+
+class GPSPackedRendererTests(APITestCase):
+    def test_username_indexes_past_uint16(self):
+        points = [
+            {'username': f'user{n}', 'latitude': 22.3, 'longitude': 114.1, 'timestamp': '2025-08-12T12:00:00Z'}
+            for n in range(70000)
+        ]
+        body = GPSPackedRenderer().render(points)
+
+        self.assertEqual(body[:4], PACKED_MAGIC)
+        self.assertEqual(PACKED_HEADER.unpack_from(body, 4), (70000, 70000))
+        decoded, next_url = decode_packed(body)
+        self.assertIsNone(next_url)
+        self.assertEqual(len(decoded), 70000)
+        self.assertEqual(decoded[-1], {
+            'id': None, 'username': 'user69999', 'timestamp': 1755000000000,
+            'latitude': 22.3, 'longitude': 114.1, 'altitude': None, 'accuracy': None,
+        })
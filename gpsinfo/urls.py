@@ -0,0 +1,12 @@
+# gpsinfo/urls.py (map tile URLs)
+from django.urls import path
+
+from . import views
+
+app_name = 'gpsinfo'
+
+urlpatterns = [
+    path('heatmap/<int:z>/<int:x>/<int:y>.png', views.GPSHeatmapTileView.as_view(), {'fmt': 'png'}, name='heatmap-png'),
+    path('heatmap/<int:z>/<int:x>/<int:y>.bin', views.GPSHeatmapTileView.as_view(), {'fmt': 'bin'}, name='heatmap-bin'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', views.GPSVectorTileView.as_view(), name='vector-tile'),
+]
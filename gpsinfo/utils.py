@@ -0,0 +1,235 @@
+# gpsinfo/utils.py
+import heapq
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored on GPSLatest.geohash (~5 m cells)
+GEOHASH_PRECISION = 9
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in metres between two points in decimal degrees.
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_to_bbox(lat, lon, radius_m):
+    """
+    Smallest (min_lat, min_lon, max_lat, max_lon) box containing a circle.
+    The longitude span is widened to the whole world near the poles.
+    """
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat = max(-90.0, lat - d_lat)
+    max_lat = min(90.0, lat + d_lat)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 1e-12 or max_lat >= 90.0 or min_lat <= -90.0:
+        return min_lat, -180.0, max_lat, 180.0
+    d_lon = math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat))
+    if d_lon >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon = lon - d_lon
+    max_lon = lon + d_lon
+    # Wrap across the antimeridian; callers split boxes with min_lon > max_lon
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return min_lat, min_lon, max_lat, max_lon
+
+
+# Web Mercator cannot show the poles; latitudes are clamped to this
+MERCATOR_MAX_LAT = 85.0511287798
+
+
+def mercator_tile_xy(lat, lon, zoom):
+    """
+    Fractional XYZ (slippy map) tile coordinates of a point at a zoom level.
+    The integer parts are the tile, the fractions the position inside it.
+    """
+    lat = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, lat))
+    scale = 1 << zoom
+    x = (lon + 180.0) / 360.0 * scale
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * scale
+    return min(max(x, 0.0), scale - 1e-9), min(max(y, 0.0), scale - 1e-9)
+
+
+def tile_bounds(zoom, x, y):
+    """
+    (min_lat, min_lon, max_lat, max_lon) of an XYZ tile.
+    """
+    scale = 1 << zoom
+
+    def lat_at(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / scale))))
+
+    return lat_at(y + 1), x / scale * 360.0 - 180.0, lat_at(y), (x + 1) / scale * 360.0 - 180.0
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Encode a point as a base32 geohash string of the given length.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bit = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    (lat_height, lon_width) in degrees of a geohash cell at a precision.
+    """
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _split_antimeridian(min_lat, min_lon, max_lat, max_lon):
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def geohash_cover(min_lat, min_lon, max_lat, max_lon, max_cells=32):
+    """
+    Geohash prefixes whose cells together cover a bounding box.
+
+    Picks the longest prefix length that needs at most ``max_cells`` cells,
+    so a prefix-indexed geohash column narrows the scan to roughly the
+    viewport. A box with min_lon > max_lon is taken to cross the antimeridian.
+    """
+    boxes = _split_antimeridian(min_lat, min_lon, max_lat, max_lon)
+
+    def cell_count(precision):
+        lat_h, lon_w = geohash_cell_size(precision)
+        total = 0
+        for b_min_lat, b_min_lon, b_max_lat, b_max_lon in boxes:
+            rows = math.floor((b_max_lat + 90.0) / lat_h) - math.floor((b_min_lat + 90.0) / lat_h) + 1
+            cols = math.floor((b_max_lon + 180.0) / lon_w) - math.floor((b_min_lon + 180.0) / lon_w) + 1
+            total += rows * cols
+        return total
+
+    precision = 1
+    while precision < GEOHASH_PRECISION and cell_count(precision + 1) <= max_cells:
+        precision += 1
+    if cell_count(precision) > max_cells:
+        # The box spans most of the world; prefix filtering would not help
+        return []
+
+    lat_h, lon_w = geohash_cell_size(precision)
+    prefixes = set()
+    for b_min_lat, b_min_lon, b_max_lat, b_max_lon in boxes:
+        row_start = math.floor((b_min_lat + 90.0) / lat_h)
+        row_end = math.floor((b_max_lat + 90.0) / lat_h)
+        col_start = math.floor((b_min_lon + 180.0) / lon_w)
+        col_end = math.floor((b_max_lon + 180.0) / lon_w)
+        for row in range(row_start, row_end + 1):
+            cell_lat = min(89.999999, -90.0 + (row + 0.5) * lat_h)
+            for col in range(col_start, col_end + 1):
+                cell_lon = min(179.999999, -180.0 + (col + 0.5) * lon_w)
+                prefixes.add(geohash_encode(cell_lat, cell_lon, precision))
+    return sorted(prefixes)
+
+
+def _project_local(points):
+    """
+    Project (lat, lon) points onto a local equirectangular plane in metres,
+    centred on the track, which is accurate enough for simplification.
+    """
+    mean_lat = sum(lat for lat, _ in points) / len(points)
+    k_lon = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(mean_lat))
+    k_lat = math.radians(1) * EARTH_RADIUS_M
+    lon0 = points[0][1]
+    return [((lon - lon0 + 540.0) % 360.0 - 180.0) * k_lon for _, lon in points], [lat * k_lat for lat, _ in points]
+
+
+def _farthest_from_segment(xs, ys, start, end):
+    """
+    Index and distance of the point between start and end that lies
+    farthest from the segment joining them.
+    """
+    ax, ay = xs[start], ys[start]
+    dx, dy = xs[end] - ax, ys[end] - ay
+    seg_len_sq = dx * dx + dy * dy
+    best_index, best_dist_sq = None, -1.0
+    for i in range(start + 1, end):
+        px, py = xs[i] - ax, ys[i] - ay
+        if seg_len_sq > 0:
+            t = max(0.0, min(1.0, (px * dx + py * dy) / seg_len_sq))
+            px -= t * dx
+            py -= t * dy
+        dist_sq = px * px + py * py
+        if dist_sq > best_dist_sq:
+            best_index, best_dist_sq = i, dist_sq
+    return best_index, math.sqrt(best_dist_sq)
+
+
+def simplify_track(points, tolerance_m=None, max_points=None):
+    """
+    Douglas-Peucker line simplification of a track of (lat, lon) points.
+
+    Segments are refined most-significant-first from a heap, so the same pass
+    honours a distance tolerance in metres, a point budget, or both.
+    Returns the sorted indices of the points to keep; the endpoints are
+    always kept.
+    """
+    count = len(points)
+    if count <= 2 or (max_points is not None and max_points >= count and tolerance_m is None):
+        return list(range(count))
+
+    xs, ys = _project_local(points)
+    keep = {0, count - 1}
+    heap = []
+
+    def push(start, end):
+        if end - start > 1:
+            index, dist = _farthest_from_segment(xs, ys, start, end)
+            heapq.heappush(heap, (-dist, start, end, index))
+
+    push(0, count - 1)
+    while heap:
+        if max_points is not None and len(keep) >= max_points:
+            break
+        neg_dist, start, end, index = heapq.heappop(heap)
+        if tolerance_m is not None and -neg_dist <= tolerance_m:
+            break
+        keep.add(index)
+        push(start, index)
+        push(index, end)
+    return sorted(keep)
@@ -1,60 +1,528 @@
 # gpsinfo/views.py
+import zlib
+from datetime import timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from rest_framework.settings import api_settings
 from django.conf import settings
-from .models import GPSLocation, GPSLatest
-from .serializers import GPSLocationSerializer, GPSLatestSerializer
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from .models import GPSDailyStats, GPSGeofenceEvent, GPSLocation, GPSLatest, GPSSession
+from .pagination import GPSLocationCursorPagination, GPSSessionCursorPagination
+from .parsers import NDJSONParser
+from .renderers import GPSColumnarRenderer, GPSPackedRenderer, TileRenderer
+from .serializers import GPSDailyStatsSerializer, GPSGeofenceEventSerializer, GPSLocationSerializer, GPSLatestSerializer, GPSSessionSerializer
+from .services.export_services import EXPORT_FORMATS, export_track
+from .services.filter_services import filter_fixes, save_filter_state
+from .services.ingest_services import ingest_fixes, record_location, store_fix, validate_fixes
+from .services.group_services import get_group_snapshot
+from .services.heatmap_services import HEATMAP_GRID, get_heatmap_tile, heatmap_max_zoom
+from .services.latest_services import overlay_pending, overlay_pending_group
+from .services.queue_services import enqueue_fixes, queued_ingest_enabled
+from .services.spatial_services import filter_bbox, filter_radius, in_bbox
+from .services.vector_tile_services import MVT_MAX_ZOOM, get_vector_tile, mvt_options
+from .utils import haversine_m, simplify_track
+
+# Upper bound on fixes accepted by a single bulk ingest request
+BULK_INGEST_MAX_ITEMS = getattr(settings, 'GPS_BULK_INGEST_MAX_ITEMS', 5000)
+
+# Largest radius accepted by the latest/ radius filter (metres)
+MAX_QUERY_RADIUS_M = 500000
+
+# Longest span of days returned by one daily stats request
+MAX_STATS_DAYS = 366
+
+# Geofence events returned by one request
+MAX_GEOFENCE_EVENTS = 1000
+
+# Raw points read for one simplified history response
+MAX_SIMPLIFY_INPUT_POINTS = getattr(settings, 'GPS_MAX_SIMPLIFY_INPUT_POINTS', 200000)
+
+
+def parse_spatial_filter(params):
+    """
+    Read the bbox or lat/lon/radius query parameters.
+    Returns ('bbox', (min_lat, min_lon, max_lat, max_lon)),
+    ('radius', (lat, lon, radius_m)) or None. Raises ValueError on bad input.
+    """
+    if params.get('bbox'):
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in params['bbox'].split(','))
+        except ValueError:
+            raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+            raise ValueError("bbox is outside valid coordinate ranges")
+        return 'bbox', (min_lat, min_lon, max_lat, max_lon)
+
+    if params.get('radius'):
+        try:
+            lat = float(params['lat'])
+            lon = float(params['lon'])
+            radius_m = float(params['radius'])
+        except (KeyError, ValueError):
+            raise ValueError("radius queries need numeric lat, lon and radius (metres)")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_m <= MAX_QUERY_RADIUS_M):
+            raise ValueError(f"lat/lon must be valid and radius between 0 and {MAX_QUERY_RADIUS_M} metres")
+        return 'radius', (lat, lon, radius_m)
+
+    return None
+
+
+def parse_time_window(params):
+    """
+    Read the optional since/until ISO 8601 query parameters.
+    Naive values are taken as server local time. Raises ValueError on bad input.
+    """
+    window = []
+    for name in ('since', 'until'):
+        value = params.get(name)
+        if not value:
+            window.append(None)
+            continue
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"{name} must be an ISO 8601 datetime")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        window.append(parsed)
+    return tuple(window)
+
+
+def parse_day_range(params):
+    """
+    Read the since/until YYYY-MM-DD query parameters (both inclusive).
+    Defaults to the last 30 days. Raises ValueError on bad input.
+    """
+    until = timezone.localdate()
+    since = until - timedelta(days=29)
+    try:
+        if params.get('until'):
+            until = parse_date(params['until'])
+        if params.get('since'):
+            since = parse_date(params['since'])
+    except ValueError:
+        until = None
+    if since is None or until is None:
+        raise ValueError("since and until must be YYYY-MM-DD dates")
+    if since > until or (until - since).days >= MAX_STATS_DAYS:
+        raise ValueError(f"since must not be after until, and at most {MAX_STATS_DAYS} days apart")
+    return since, until
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Whether an If-None-Match header lists the entity tag (weak comparison).
+    """
+    tags = parse_etags(if_none_match)
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+def streaming_export(chunks, export_format, filename):
+    """
+    Attachment response that streams export text chunks as they are written.
+    """
+    _, content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse((chunk.encode() for chunk in chunks), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def parse_simplify_options(params):
+    """
+    Read the optional simplify=<tolerance_m> and max_points=N parameters.
+    Returns (tolerance_m, max_points), or None when neither is given.
+    Raises ValueError on bad input.
+    """
+    if not params.get('simplify') and not params.get('max_points'):
+        return None
+    tolerance_m = max_points = None
+    try:
+        if params.get('simplify'):
+            tolerance_m = float(params['simplify'])
+        if params.get('max_points'):
+            max_points = int(params['max_points'])
+    except ValueError:
+        raise ValueError("simplify must be a number of metres and max_points an integer")
+    if (tolerance_m is not None and tolerance_m < 0) or (max_points is not None and max_points < 2):
+        raise ValueError("simplify must be >= 0 and max_points >= 2")
+    return tolerance_m, max_points
+
 
 class GPSLocationViewSet(viewsets.ModelViewSet):
-    queryset = GPSLocation.objects.all()
+    queryset = GPSLocation.objects.select_related('user')
     serializer_class = GPSLocationSerializer
     permission_classes = [IsAuthenticated]
+    # Compact encodings for point lists, chosen by the Accept header
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, GPSColumnarRenderer, GPSPackedRenderer]
 
     def get_queryset(self):
         # Only show locations for the authenticated user
-        return GPSLocation.objects.filter(user=self.request.user)
+        return GPSLocation.objects.select_related('user').filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The user's filter state stays locked until the fix is stored
+        with transaction.atomic():
+            _, rejected, run = filter_fixes(request.user, [(0, serializer.validated_data)])
+            if rejected:
+                save_filter_state(run, [])
+                # Dropped as noise; not an error the client should retry
+                return Response({"filtered": rejected[0][1]}, status=status.HTTP_200_OK)
+            if queued_ingest_enabled():
+                # Stored later by the gps_drain worker
+                queued = enqueue_fixes(request.user, [serializer.validated_data])
+                save_filter_state(run, [0])
+                return Response({"queued": queued}, status=status.HTTP_202_ACCEPTED)
+            created = self.perform_create(serializer)
+            save_filter_state(run, [0] if created else [])
+        headers = self.get_success_headers(serializer.data)
+        # A retried fix (same device_id/sequence) returns the stored row
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return Response(serializer.data, status=response_status, headers=headers)
 
     def perform_create(self, serializer):
-        # Save the GPSLocation
-        gps_location = serializer.save(user=self.request.user)
-        
-        # Update or create GPSLatest
-        GPSLatest.objects.update_or_create(
-            user=self.request.user,
-            defaults={
-                'latitude': gps_location.latitude,
-                'longitude': gps_location.longitude,
-                'timestamp': gps_location.timestamp,
-                'altitude': gps_location.altitude,
-                'accuracy': gps_location.accuracy,
-            }
-        )
+        # Save the GPSLocation, unless this device sequence is already stored
+        gps_location, created = store_fix(self.request.user, serializer.validated_data)
+        serializer.instance = gps_location
+
+        # Update or create GPSLatest and push the fix to live viewers
+        if created:
+            record_location(self.request.user, gps_location)
+        return created
+
+    @action(detail=False, methods=['post'], url_path='bulk',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk_create_locations(self, request):
+        """
+        Ingest a buffered batch of GPS fixes (JSON array or NDJSON).
+        Valid fixes are written with one bulk INSERT and GPSLatest is advanced
+        once from the newest fix. Fixes carrying an already stored
+        device_id/sequence are reported as duplicates and not stored again.
+        Fixes dropped by the ingest noise filters are reported as filtered.
+        Returns an accept/reject/duplicate/filtered result per item.
+        In queued ingest mode valid fixes are only queued and 202 is returned.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"error": "Expected a list of GPS fixes"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_INGEST_MAX_ITEMS:
+            return Response(
+                {"error": f"Too many GPS fixes in one request (max {BULK_INGEST_MAX_ITEMS})"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid, results = validate_fixes(self.get_serializer(), items)
+        invalid = len(items) - len(valid)
+        # The user's filter state stays locked until the kept fixes are stored
+        queued_mode = queued_ingest_enabled()
+        with transaction.atomic():
+            valid, filtered, run = filter_fixes(request.user, valid)
+            if queued_mode:
+                queued = enqueue_fixes(request.user, [data for _, data in valid])
+                save_filter_state(run, [index for index, _ in valid])
+            else:
+                locations = ingest_fixes(request.user, valid)
+                save_filter_state(run, [index for (index, _), location in zip(valid, locations) if location is not None])
+        for index, reason in filtered:
+            results[index].update(status='filtered', reason=reason)
+
+        if queued_mode:
+            for index, _ in valid:
+                results[index]['status'] = 'queued'
+            return Response({
+                "queued": queued,
+                "filtered": len(filtered),
+                "rejected": invalid,
+                "results": results,
+            }, status=status.HTTP_202_ACCEPTED if queued or filtered else status.HTTP_400_BAD_REQUEST)
+
+        for (index, _), location in zip(valid, locations):
+            if location is None:
+                results[index]['status'] = 'duplicate'
+            else:
+                results[index]['id'] = location.id
+
+        accepted = sum(1 for location in locations if location is not None)
+        duplicates = len(locations) - accepted
+        if accepted:
+            response_status = status.HTTP_201_CREATED
+        elif duplicates or filtered:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            "accepted": accepted,
+            "duplicates": duplicates,
+            "filtered": len(filtered),
+            "rejected": invalid,
+            "results": results,
+        }, status=response_status)
 
     @action(detail=False, methods=['get'], url_path='latest')
     def get_latest_locations(self, request):
         """
         Fetch the latest GPS location for all users.
+        ?group=<user_group> narrows the result to one group (see group/<group>/).
+        Optional viewport filters:
+          ?bbox=min_lon,min_lat,max_lon,max_lat
+          ?lat=<lat>&lon=<lon>&radius=<metres>  (nearest first)
         """
         user = request.user
         if user.is_authenticated:
-            # Only show latest locations for the authenticated user
-            latest_locations = GPSLatest.objects.all()
-            if latest_locations.exists():
+            if request.query_params.get('group'):
+                return self.get_group_locations(request, group=request.query_params['group'])
+
+            # Serializers read user.username, so join the user in the same query
+            latest_locations = GPSLatest.objects.select_related('user')
+
+            try:
+                spatial_filter = parse_spatial_filter(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if spatial_filter is not None:
+                kind, args = spatial_filter
+                if kind == 'bbox':
+                    latest_locations = overlay_pending(
+                        filter_bbox(latest_locations, *args),
+                        contains=lambda lat, lon: in_bbox(lat, lon, *args),
+                    )
+                else:
+                    center_lat, center_lon, radius_m = args
+                    latest_locations = overlay_pending(
+                        filter_radius(latest_locations, *args),
+                        contains=lambda lat, lon: haversine_m(center_lat, center_lon, lat, lon) <= radius_m,
+                    )
+                    # Buffered positions can change the distance order
+                    latest_locations.sort(key=lambda row: haversine_m(center_lat, center_lon, row.latitude, row.longitude))
+                # An empty viewport is a normal answer, not a missing resource
+                serializer = GPSLatestSerializer(latest_locations, many=True)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            latest_locations = overlay_pending(latest_locations, include_new=True)
+            if latest_locations:
                 serializer = GPSLatestSerializer(latest_locations, many=True)
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response({"message": "No location data available"}, status=status.HTTP_404_NOT_FOUND)
         return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
 
+    @action(detail=False, methods=['get'], url_path=r'group/(?P<group>[^/]+)')
+    def get_group_locations(self, request, group=None):
+        """
+        Fetch the latest GPS location of every member of a user group.
+        Served from a cached per-group snapshot that new fixes invalidate.
+        """
+        user = request.user
+        if user.is_authenticated:
+            snapshot = overlay_pending_group(get_group_snapshot(group), group)
+            return Response(snapshot, status=status.HTTP_200_OK)
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
     @action(detail=False, methods=['get'], url_path='my-locations')
     def get_my_locations(self, request):
         """
-        Fetch all GPS locations for the authenticated user.
+        Fetch the authenticated user's GPS history, one keyset page at a time.
+        Optional ?since= (exclusive) and ?until= (inclusive) ISO 8601 bounds,
+        ?order=asc|desc, ?limit=<page size>; follow "next" for more rows.
+        With ?simplify=<tolerance_m> and/or ?max_points=N the whole window is
+        returned unpaginated as a simplified track instead.
         """
         user = request.user
         if user.is_authenticated:
-            locations = GPSLocation.objects.filter(user=user).order_by('-timestamp')
-            serializer = GPSLocationSerializer(locations, many=True)
+            try:
+                since, until = parse_time_window(request.query_params)
+                simplify_options = parse_simplify_options(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            locations = GPSLocation.objects.select_related('user').filter(user=user)
+            if since is not None:
+                locations = locations.filter(timestamp__gt=since)
+            if until is not None:
+                locations = locations.filter(timestamp__lte=until)
+
+            if simplify_options is not None:
+                return self._simplified_history(locations, *simplify_options)
+
+            paginator = GPSLocationCursorPagination()
+            page = paginator.paginate_queryset(locations, request, view=self)
+            serializer = GPSLocationSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['get'], url_path='sessions')
+    def get_my_sessions(self, request):
+        """
+        List the authenticated user's trips/activities, newest first, with
+        precomputed start/end, bounding box, distance and duration.
+        Optional ?since= / ?until= ISO 8601 bounds on the start time.
+        """
+        user = request.user
+        if user.is_authenticated:
+            try:
+                since, until = parse_time_window(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            sessions = GPSSession.objects.filter(user=user)
+            if since is not None:
+                sessions = sessions.filter(started_at__gt=since)
+            if until is not None:
+                sessions = sessions.filter(started_at__lte=until)
+
+            paginator = GPSSessionCursorPagination()
+            page = paginator.paginate_queryset(sessions, request, view=self)
+            serializer = GPSSessionSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['get'], url_path='stats/daily')
+    def get_daily_stats(self, request):
+        """
+        Per-day distance, moving time, average and max speed and elevation
+        gain for the authenticated user, oldest day first.
+        Optional ?since= / ?until= YYYY-MM-DD (inclusive, default last 30 days).
+        Days are refreshed by the gps_daily_stats job, not on request.
+        """
+        user = request.user
+        if user.is_authenticated:
+            try:
+                since, until = parse_day_range(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            days = GPSDailyStats.objects.filter(user=user, day__gte=since, day__lte=until).order_by('day')
+            serializer = GPSDailyStatsSerializer(days, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['get'], url_path='geofences/events')
+    def get_geofence_events(self, request):
+        """
+        The authenticated user's geofence entries and exits, newest first.
+        Optional ?since= / ?until= ISO 8601 bounds on the crossing time.
+        """
+        user = request.user
+        if user.is_authenticated:
+            try:
+                since, until = parse_time_window(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            events = GPSGeofenceEvent.objects.select_related('fence').filter(user=user)
+            if since is not None:
+                events = events.filter(occurred_at__gt=since)
+            if until is not None:
+                events = events.filter(occurred_at__lte=until)
+            serializer = GPSGeofenceEventSerializer(events[:MAX_GEOFENCE_EVENTS], many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<export_format>gpx|csv|geojson)')
+    def export_my_track(self, request, export_format):
+        """
+        Download the authenticated user's whole track as GPX, CSV or GeoJSON,
+        oldest fix first, streamed as it is read.
+        Optional ?since= / ?until= ISO 8601 bounds (inclusive) on the fix time.
+        """
+        user = request.user
+        if user.is_authenticated:
+            try:
+                since, until = parse_time_window(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            chunks = export_track(export_format, [user.pk], since, until)
+            return streaming_export(chunks, export_format, f'{user.username}-track')
+        return Response({"error": "User not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    def _simplified_history(self, locations, tolerance_m, max_points):
+        """
+        Serialize only the points of a line-simplified track, oldest first.
+        Coordinates are streamed for the simplification and full rows are
+        loaded just for the points that are kept.
+        """
+        rows = list(
+            locations.order_by('timestamp', 'id')
+            .values_list('id', 'latitude', 'longitude')[:MAX_SIMPLIFY_INPUT_POINTS + 1]
+        )
+        truncated = len(rows) > MAX_SIMPLIFY_INPUT_POINTS
+        rows = rows[:MAX_SIMPLIFY_INPUT_POINTS]
+
+        kept_indices = simplify_track([(lat, lon) for _, lat, lon in rows], tolerance_m, max_points)
+        kept_ids = [rows[i][0] for i in kept_indices]
+        kept = GPSLocation.objects.select_related('user').in_bulk(kept_ids)
+        serializer = GPSLocationSerializer([kept[pk] for pk in kept_ids], many=True)
+        return Response({
+            "raw_count": len(rows),
+            "count": len(kept_ids),
+            "truncated": truncated,
+            "results": serializer.data,
+        }, status=status.HTTP_200_OK)
+
+
+class GPSHeatmapTileView(APIView):
+    """
+    Heatmap tile at /api/gps/heatmap/{z}/{x}/{y}.png (or .bin) built from
+    the whole GPS history. PNG tiles are rendered on a log scale; .bin
+    tiles are the raw HEATMAP_GRID x HEATMAP_GRID little-endian uint32
+    counts, row-major from the north-west corner, sent deflated when the
+    client accepts it. Tiles without points return 204.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, TileRenderer]
+
+    def get(self, request, z, x, y, fmt):
+        if z > heatmap_max_zoom() or x >= 1 << z or y >= 1 << z:
+            return Response({"error": "Tile out of range"}, status=status.HTTP_404_NOT_FOUND)
+
+        tile = get_heatmap_tile(fmt, z, x, y)
+        if tile['etag'] is None:
+            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+        if etag_matches(tile['etag'], request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif fmt == 'png':
+            response = HttpResponse(tile['body'], content_type='image/png')
+        else:
+            deflate = 'deflate' in request.headers.get('Accept-Encoding', '')
+            body = tile['body'] if deflate else zlib.decompress(tile['body'])
+            response = HttpResponse(body, content_type='application/octet-stream')
+            if deflate:
+                response['Content-Encoding'] = 'deflate'
+            response['X-Heatmap-Grid'] = str(HEATMAP_GRID)
+            response['Vary'] = 'Accept-Encoding'
+        response['ETag'] = tile['etag']
+        response['Cache-Control'] = 'private, max-age=60'
+        return response
+
+
+class GPSVectorTileView(APIView):
+    """
+    Mapbox Vector Tile at /api/gps/tiles/{z}/{x}/{y}.mvt with two layers:
+    'tracks' (the authenticated user's sessions as linestrings, from
+    GPS_MVT_TRACK_MIN_ZOOM up) and 'latest' (everyone's latest position).
+    Tiles without features return 204.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, TileRenderer]
+
+    def get(self, request, z, x, y):
+        if z > MVT_MAX_ZOOM or x >= 1 << z or y >= 1 << z:
+            return Response({"error": "Tile out of range"}, status=status.HTTP_404_NOT_FOUND)
+
+        body = get_vector_tile(request.user.pk, z, x, y)
+        if not body:
+            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+        response = HttpResponse(body, content_type='application/vnd.mapbox-vector-tile')
+        response['Cache-Control'] = f'private, max-age={mvt_options()[2]}'
+        return response
@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rbackend.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing consumers that touch the ORM
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from gpsinfo.middleware import JWTAuthMiddleware
+from events.routing import websocket_urlpatterns as event_websocket_urlpatterns
+from gpsinfo.routing import websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Mobile clients send no Origin header, so access is gated by the JWT alone
+    'websocket': JWTAuthMiddleware(URLRouter(websocket_urlpatterns + event_websocket_urlpatterns)),
+})
@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from django.contrib.messages import constants as messages
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -121,6 +121,69 @@ CHANNEL_LAYERS = {
     },
 }
 
+# One cache shared by every worker process and management command. Geofence and race timing
+# state, cache invalidation and the ingest filter counters rely on all processes seeing the
+# same entries, which a per-process LocMemCache (Django's default) does not provide.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_REDIS_URL', default='redis://127.0.0.1:6379/1'),
+    },
+}
+
+
+# GPS info configuration
+GPS_BULK_INGEST_MAX_ITEMS = 5000
+# Raw GPS points older than this are rolled up per minute by `manage.py gps_retention`
+GPS_RAW_RETENTION_DAYS = config('GPS_RAW_RETENTION_DAYS', default=90, cast=int)
+# Buffer GPSLatest per user and flush it in batches instead of upserting on every fix
+GPS_LATEST_WRITE_BEHIND = config('GPS_LATEST_WRITE_BEHIND', default=False, cast=bool)
+GPS_LATEST_FLUSH_INTERVAL = 1.0  # seconds
+# Seconds a cached group snapshot may live; new fixes from members expire it sooner
+GPS_GROUP_SNAPSHOT_TTL = 30
+# Append incoming fixes to a local log and answer 202; `manage.py gps_drain` stores them
+GPS_INGEST_QUEUED = config('GPS_INGEST_QUEUED', default=False, cast=bool)
+GPS_INGEST_QUEUE_DIR = config('GPS_INGEST_QUEUE_DIR', default=str(BASE_DIR / 'var' / 'gps_ingest_queue'))
+# Noise filters (dotted paths) incoming fixes pass in order before they are stored; rejected fixes
+# are only counted. Off unless set, e.g. GPS_INGEST_FILTERS=gpsinfo.services.filter_services.AccuracyFilter,
+# gpsinfo.services.filter_services.SpeedFilter,gpsinfo.services.filter_services.KalmanSmoother
+GPS_INGEST_FILTERS = config('GPS_INGEST_FILTERS', default='', cast=Csv())
+# Worst accepted accuracy (metres), fastest plausible movement, and the smoother's process noise.
+# KalmanSmoother stores the smoothed position in place of the reported one; the raw fix is not kept.
+GPS_FILTER_MAX_ACCURACY_M = 100
+GPS_FILTER_MAX_SPEED_MPS = 100
+GPS_FILTER_KALMAN_Q_MPS = 3
+# Sessions split on this long a gap between fixes, or on a stop of DWELL_SECONDS within DWELL_RADIUS_M
+GPS_SESSION_GAP_SECONDS = 600
+GPS_SESSION_DWELL_RADIUS_M = 50
+GPS_SESSION_DWELL_SECONDS = 300
+# Daily stats (`manage.py gps_daily_stats`): moving above this speed, ignoring longer gaps,
+# faster jumps and climbs below the noise threshold
+GPS_STATS_MOVING_SPEED_MPS = 0.5
+GPS_STATS_MAX_SEGMENT_SECONDS = 300
+GPS_STATS_MAX_SPEED_MPS = 100
+GPS_STATS_ELEVATION_THRESHOLD_M = 3
+# Heatmap tiles (`manage.py gps_heatmap`) are counted for zooms 0..MAX_ZOOM and cached once rendered
+GPS_HEATMAP_MAX_ZOOM = 16
+GPS_HEATMAP_CACHE_SECONDS = 86400
+# Vector tiles: track layers from this zoom up, cached until the user's next fix;
+# the shared latest-position layer is cached for LATEST_TTL seconds
+GPS_MVT_TRACK_MIN_ZOOM = 8
+GPS_MVT_CACHE_SECONDS = 3600
+GPS_MVT_LATEST_TTL = 5
+
+# Event timing configuration
+# Participants of ongoing events are reloaded this often (seconds)
+EVENT_TIMING_REGISTRY_TTL = 10
+# Timing results are written to EventUser in batches this often (0 writes each batch at once)
+EVENT_TIMING_FLUSH_INTERVAL = 1.0
+# The finish line only counts this long after the start (loop courses share one gate)
+EVENT_TIMING_MIN_SECONDS = 60
+# Fixes farther than this from the course do not count towards leaderboard progress
+EVENT_ROUTE_MAX_OFFSET_M = 200
+# Course climbs smaller than this are treated as GPX elevation noise (metres)
+EVENT_ROUTE_ELEVATION_THRESHOLD_M = 3
+
 
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
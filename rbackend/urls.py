@@ -30,8 +30,11 @@ urlpatterns = [
     # API routes (consistent with existing pattern)
     path('api/events/', include('events.api.urls', namespace='events-api')),
         
+    # Map tiles built from GPS history
+    path('api/gps/', include('gpsinfo.urls', namespace='gpsinfo')),
+
     # REST API - For future integrations with React.
-    # path('api/', include(router.urls)),
+    path('api/', include(router.urls)),
     # path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     # path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     